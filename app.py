@@ -3,22 +3,18 @@ from datetime import datetime, timedelta, timezone
 
 from dashboard.data import (
     get_connection,
-    fetch_cities,
-    fetch_freshness,
-    fetch_latest,
-    fetch_history,
-    fetch_forecast,
-    fetch_model_metrics,
-    fetch_multi_city_data,
+    fetch_page_data,
+    fetch_city_figures,
+    fetch_multi_city_figure,
+    fetch_revision_figure,
+    fetch_model_performance_figure,
+    fetch_backtest_skill,
+    fetch_location_index,
+    fetch_variables,
 )
+from etl.data_access import split_latest
 from dashboard.components import render_city_selector, render_horizon_toggle, render_metric_cards
-from dashboard.charts import (
-    plot_temperature_forecast,
-    plot_humidity_chart,
-    plot_precipitation_chart,
-    plot_multi_city_comparison,
-    plot_model_performance,
-)
+from dashboard.charts import plot_skill_over_time
 
 st.set_page_config(
     page_title="Weather Forecast Platform",
@@ -31,9 +27,17 @@ st.caption("Real-time weather data + LSTM-powered forecasts")
 
 conn = get_connection()
 
+now = datetime.now(timezone.utc)
+start = (now - timedelta(days=7)).strftime("%Y-%m-%d")
+# Hour precision keeps the history cache key stable between reruns
+end = now.strftime("%Y-%m-%d %H:00:00")
+
+# One query for everything below that reads current values; views are split in memory
+page = fetch_page_data(conn, start)
+
 # Sidebar
 st.sidebar.header("Controls")
-cities = fetch_cities(conn)
+cities = page["cities"]
 if not cities:
     st.error("No weather data found. Run the pipeline first: `python pipeline.py`")
     st.stop()
@@ -42,59 +46,58 @@ city = render_city_selector(cities)
 horizon = render_horizon_toggle()
 
 if st.sidebar.button("Refresh Data"):
-    st.cache_data.clear()
+    # Cached results are keyed on per-city data versions, so a rerun picks up reloads
     st.rerun()
 
+with st.sidebar.expander("Nearest city"):
+    point_lat = st.number_input("Latitude", -90.0, 90.0, 0.0, format="%.4f")
+    point_lon = st.number_input("Longitude", -180.0, 180.0, 0.0, format="%.4f")
+    nearest = fetch_location_index(conn).nearest(point_lat, point_lon)
+    if nearest is not None:
+        st.write(f"{nearest[0]} ({nearest[1]:.1f} km away)")
+
 st.sidebar.divider()
 st.sidebar.markdown("**Data Sources**")
 st.sidebar.markdown("Weather: [Open-Meteo](https://open-meteo.com)")
 st.sidebar.markdown("Forecasts: LSTM (PyTorch)")
 
 # Row 1: Metric cards
-freshness = fetch_freshness(conn)
-current = fetch_latest(conn, city)
+freshness = page["freshness"]
+current = split_latest(page, city)
 render_metric_cards(current, freshness, city)
 
 st.divider()
 
-# Row 2: Temperature chart with forecast
-now = datetime.now(timezone.utc)
-start = (now - timedelta(days=7)).strftime("%Y-%m-%d")
-end = now.strftime("%Y-%m-%d %H:%M:%S")
-
-actual_df = fetch_history(conn, city, start, end)
-forecast_df = fetch_forecast(conn, city, horizon)
+# Row 2: Temperature chart with forecast (figures are built once per data version)
+figures = fetch_city_figures(conn, page, city, horizon, start, end)
 
-st.plotly_chart(
-    plot_temperature_forecast(actual_df, forecast_df, city),
-    use_container_width=True,
-)
+st.plotly_chart(figures["temperature"], use_container_width=True)
 
 # Row 3: Humidity & Precipitation side by side
 col1, col2 = st.columns(2)
 with col1:
-    st.plotly_chart(plot_humidity_chart(actual_df, city), use_container_width=True)
+    st.plotly_chart(figures["humidity"], use_container_width=True)
 with col2:
-    st.plotly_chart(plot_precipitation_chart(actual_df, city), use_container_width=True)
+    st.plotly_chart(figures["precipitation"], use_container_width=True)
+
+# Issued values per hour, recorded when settings.versioned_storage is on
+revision_end = (now + timedelta(days=7)).strftime("%Y-%m-%d %H:00:00")
+revision_fig = fetch_revision_figure(conn, city, start, revision_end)
+if revision_fig is not None:
+    with st.expander("Forecast revisions"):
+        st.plotly_chart(revision_fig, use_container_width=True)
 
 st.divider()
 
 # Row 4: Multi-city comparison
 st.subheader("Multi-City Comparison")
-metric = st.selectbox(
-    "Metric",
-    ["temperature_2m", "relativehumidity_2m", "precipitation"],
-    format_func=lambda x: {
-        "temperature_2m": "Temperature",
-        "relativehumidity_2m": "Humidity",
-        "precipitation": "Precipitation",
-    }[x],
-)
-multi_df = fetch_multi_city_data(conn, cities)
-if not multi_df.empty:
-    st.plotly_chart(
-        plot_multi_city_comparison(multi_df, metric), use_container_width=True
-    )
+# Every variable column in the warehouse, labelled from the registry in config.yaml
+labels = {v["name"]: v["label"] for v in fetch_variables()}
+metric = st.selectbox("Metric", page["variables"], format_func=lambda x: labels.get(x, x))
+since = (now - timedelta(days=7)).strftime("%Y-%m-%d %H:00:00")
+multi_fig = fetch_multi_city_figure(conn, page, metric, since)
+if multi_fig is not None:
+    st.plotly_chart(multi_fig, use_container_width=True)
 else:
     st.info("Not enough multi-city data for comparison.")
 
@@ -102,5 +105,9 @@ st.divider()
 
 # Row 5: Model performance
 st.subheader("Model Performance")
-metrics_df = fetch_model_metrics(conn)
-st.plotly_chart(plot_model_performance(metrics_df), use_container_width=True)
+st.plotly_chart(fetch_model_performance_figure(conn), use_container_width=True)
+
+skill_df = fetch_backtest_skill(conn, city, horizon)
+st.plotly_chart(
+    plot_skill_over_time(skill_df, city, horizon), use_container_width=True
+)
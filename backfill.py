@@ -13,9 +13,12 @@ from datetime import datetime, timedelta, timezone
 
 from etl.config import load_config
 from etl.extract import extract_historical_data
-from etl.transform import transform_weather_data, load_raw_json
+from etl.dqc import dqc_options, record_dq_results
+from etl.transform import transform_and_validate, load_raw_json
 from etl.load import connect_duckdb, upsert_weather_data
 from etl.logger import get_logger
+from etl.metrics import complete_run, span, start_run
+from etl.variables import load_variables
 
 logger = get_logger()
 
@@ -27,8 +30,10 @@ def backfill(start_date: str, end_date: str):
     locations = config.get("locations", [])
     raw_path = config["paths"]["raw_path"]
     duckdb_path = config["paths"]["duckdb_path"]
+    variables = load_variables(config)
 
     conn = connect_duckdb(duckdb_path)
+    run = start_run("backfill")
 
     start = datetime.strptime(start_date, "%Y-%m-%d")
     end = datetime.strptime(end_date, "%Y-%m-%d")
@@ -50,26 +55,35 @@ def backfill(start_date: str, end_date: str):
             logger.info(f"  Fetching {city}: {s} to {e}")
 
             try:
-                raw_file = extract_historical_data(
-                    latitude=lat,
-                    longitude=lon,
-                    start_date=s,
-                    end_date=e,
-                    raw_path=raw_path,
-                    city=city,
-                )
-
-                raw_json = load_raw_json(raw_file)
-                df = transform_weather_data(
-                    raw_json=raw_json,
-                    latitude=lat,
-                    longitude=lon,
-                    city=city,
-                    dqc_enabled=True,
-                    is_historical=True,
-                )
-
-                upsert_weather_data(conn, df)
+                with span(run, "extract", city):
+                    raw_file = extract_historical_data(
+                        latitude=lat,
+                        longitude=lon,
+                        start_date=s,
+                        end_date=e,
+                        raw_path=raw_path,
+                        city=city,
+                    )
+
+                with span(run, "transform", city) as transform_span:
+                    raw_json = load_raw_json(raw_file)
+                    transform_span["rows_in"] = len(raw_json.get("hourly", {}).get("time", []))
+                    df, quarantined, dq_metrics = transform_and_validate(
+                        raw_json=raw_json,
+                        latitude=lat,
+                        longitude=lon,
+                        city=city,
+                        variables=variables,
+                        is_historical=True,
+                        **dqc_options(config),
+                    )
+                    transform_span["rows_out"] = len(df)
+                    if record_dq_results(conn, city, quarantined, dq_metrics, variables=variables):
+                        logger.warning(f"  Quarantined {len(quarantined)} rows for {city} ({s} to {e})")
+
+                with span(run, "load", city, rows_in=len(df)) as load_span:
+                    upsert_weather_data(conn, df, variables)
+                    load_span["rows_out"] = len(df)
                 total_rows += len(df)
                 logger.info(f"  Loaded {len(df)} rows for {city} ({s} to {e})")
 
@@ -80,6 +94,7 @@ def backfill(start_date: str, end_date: str):
 
         logger.info(f"=== {city} backfill complete: {total_rows} total rows ===")
 
+    complete_run(conn, run, config)
     logger.info("Backfill finished for all cities.")
 
 
@@ -0,0 +1,64 @@
+"""Rolling-origin backtest of trained LSTM models for all configured cities.
+
+Usage:
+    python backtest_models.py
+    python backtest_models.py --stride 6 --workers 4 --start 2024-01-01
+
+Replays forecasts from every `stride` hours after each model's training and
+validation data (meta["fit_end"]), scores them against weather_hourly and stores the results in
+forecast_backtests for the dashboard's skill-over-time chart. Residual
+quantiles per city and lead hour are then rebuilt into forecast_intervals.
+"""
+
+import argparse
+import time
+
+from etl.config import load_config
+from etl.load import connect_duckdb, create_weather_table
+from etl.logger import get_logger
+from forecast.backtest import create_backtest_table, run_backtests
+from forecast.uncertainty import compute_interval_table
+
+logger = get_logger()
+
+
+def main(stride: int, workers: int, start_date: str, end_date: str):
+    config = load_config()
+    duckdb_path = config["paths"]["duckdb_path"]
+    backtest_cfg = config.get("backtest", {})
+    cities = [loc["name"] for loc in config.get("locations", [])]
+
+    conn = connect_duckdb(duckdb_path)
+    create_weather_table(conn)
+    create_backtest_table(conn)
+
+    t0 = time.time()
+    rows = run_backtests(
+        conn,
+        cities=cities,
+        horizons=[24, 168],
+        stride=stride or backtest_cfg.get("stride_hours", 24),
+        batch_size=backtest_cfg.get("batch_size", 1024),
+        max_workers=workers or backtest_cfg.get("workers"),
+        start_date=start_date,
+        end_date=end_date,
+        start_method=backtest_cfg.get("start_method", "spawn"),
+    )
+    logger.info(f"Backtest complete: {rows} rows in {time.time() - t0:.3f} seconds")
+
+    compute_interval_table(
+        conn,
+        lower=backtest_cfg.get("interval_lower", 0.05),
+        upper=backtest_cfg.get("interval_upper", 0.95),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest trained forecast models")
+    parser.add_argument("--stride", type=int, default=None, help="Hours between origins")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel worker processes")
+    parser.add_argument("--start", default=None, help="Start date (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="End date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    main(args.stride, args.workers, args.start, args.end)
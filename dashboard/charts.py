@@ -1,6 +1,9 @@
 import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
+from typing import Optional
+
+from etl.variables import DEFAULT_VARIABLES, variable_label
 
 
 COLOR_ACTUAL = "#2196F3"
@@ -24,46 +27,46 @@ def plot_temperature_forecast(
         )
 
     if not forecast_df.empty:
+        has_band = {"temperature_2m_lower", "temperature_2m_upper"} <= set(forecast_df.columns)
+        band_cols = ["temperature_2m_lower", "temperature_2m_upper"] if has_band else []
+
         # Bridge the visual gap: prepend the last actual point so the forecast
         # line connects seamlessly to the actual line (forecast starts at
         # last_actual + 1h, leaving a one-step break without this fix).
-        plot_df = forecast_df[["timestamp", "temperature_2m"]].copy()
+        plot_df = forecast_df[["timestamp", "temperature_2m"] + band_cols].copy()
         if not actual_df.empty:
             last_actual_ts = actual_df["timestamp"].iloc[-1]
             first_forecast_ts = plot_df["timestamp"].iloc[0]
             if first_forecast_ts > last_actual_ts:
+                last_actual = actual_df["temperature_2m"].iloc[-1]
                 bridge = pd.DataFrame(
-                    {
-                        "timestamp": [last_actual_ts],
-                        "temperature_2m": [actual_df["temperature_2m"].iloc[-1]],
-                    }
+                    {col: [last_actual] for col in ["temperature_2m"] + band_cols}
                 )
+                bridge.insert(0, "timestamp", [last_actual_ts])
                 plot_df = pd.concat([bridge, plot_df], ignore_index=True)
 
-        # Confidence band (simple +/- based on typical MAE)
-        upper = plot_df["temperature_2m"] + 5
-        lower = plot_df["temperature_2m"] - 5
-
-        fig.add_trace(
-            go.Scatter(
-                x=plot_df["timestamp"],
-                y=upper,
-                mode="lines",
-                line=dict(width=0),
-                showlegend=False,
+        # Prediction interval from backtest/verification residual quantiles
+        if has_band:
+            fig.add_trace(
+                go.Scatter(
+                    x=plot_df["timestamp"],
+                    y=plot_df["temperature_2m_upper"],
+                    mode="lines",
+                    line=dict(width=0),
+                    showlegend=False,
+                )
             )
-        )
-        fig.add_trace(
-            go.Scatter(
-                x=plot_df["timestamp"],
-                y=lower,
-                mode="lines",
-                line=dict(width=0),
-                fill="tonexty",
-                fillcolor=COLOR_BAND,
-                showlegend=False,
+            fig.add_trace(
+                go.Scatter(
+                    x=plot_df["timestamp"],
+                    y=plot_df["temperature_2m_lower"],
+                    mode="lines",
+                    line=dict(width=0),
+                    fill="tonexty",
+                    fillcolor=COLOR_BAND,
+                    name="Prediction interval",
+                )
             )
-        )
         fig.add_trace(
             go.Scatter(
                 x=plot_df["timestamp"],
@@ -128,23 +131,19 @@ def plot_precipitation_chart(df: pd.DataFrame, city: str) -> go.Figure:
     return fig
 
 
-def plot_multi_city_comparison(df: pd.DataFrame, metric: str) -> go.Figure:
-    labels = {
-        "temperature_2m": "Temperature (C)",
-        "relativehumidity_2m": "Humidity (%)",
-        "precipitation": "Precipitation (mm)",
-    }
+def plot_multi_city_comparison(df: pd.DataFrame, metric: str, label: Optional[str] = None) -> go.Figure:
+    label = label or variable_label(DEFAULT_VARIABLES, metric)
     fig = px.line(
         df,
         x="timestamp",
         y=metric,
         color="city",
-        title=f"Multi-City Comparison: {labels.get(metric, metric)}",
+        title=f"Multi-City Comparison: {label}",
         template="plotly_white",
         height=400,
     )
     fig.update_layout(
-        yaxis_title=labels.get(metric, metric),
+        yaxis_title=label,
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
     )
     return fig
@@ -156,9 +155,12 @@ def plot_model_performance(metrics_df: pd.DataFrame) -> go.Figure:
         fig.update_layout(title="No model metrics available")
         return fig
 
+    # Live skill is kept per model version; a retrained model gets its own bars
     fig = go.Figure()
     for _, row in metrics_df.iterrows():
         label = f"{row['city']} ({row['horizon']}h)"
+        if pd.notna(row.get("model_version")):
+            label = f"{label} {row['model_version']}"
         fig.add_trace(
             go.Bar(
                 name=f"{label} MAE",
@@ -175,3 +177,56 @@ def plot_model_performance(metrics_df: pd.DataFrame) -> go.Figure:
         yaxis_title="Mean Absolute Error",
     )
     return fig
+
+
+def plot_skill_over_time(skill_df: pd.DataFrame, city: str, horizon: int) -> go.Figure:
+    fig = go.Figure()
+    if skill_df.empty:
+        fig.update_layout(title="No backtest results available")
+        return fig
+
+    series = {
+        "mae_temp": ("Temperature (C)", COLOR_FORECAST),
+        "mae_humidity": ("Humidity (%)", "#4CAF50"),
+        "mae_precip": ("Precipitation (mm)", "#5C6BC0"),
+    }
+    for col, (name, color) in series.items():
+        fig.add_trace(
+            go.Scatter(
+                x=skill_df["week"],
+                y=skill_df[col],
+                name=name,
+                line=dict(color=color, width=2),
+            )
+        )
+
+    fig.update_layout(
+        title=f"Backtest Skill Over Time - {city} ({horizon}h)",
+        xaxis_title="Forecast origin (week)",
+        yaxis_title="Mean Absolute Error",
+        template="plotly_white",
+        height=400,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+    )
+    return fig
+
+
+def plot_revision_history(revisions_df: pd.DataFrame, city: str) -> go.Figure:
+    if revisions_df.empty:
+        fig = go.Figure()
+        fig.update_layout(title="No forecast revisions recorded")
+        return fig
+
+    # One line per issue, so later revisions of the same hours can be compared
+    df = revisions_df.assign(issue=revisions_df["issued_at"].dt.strftime("%Y-%m-%d %H:%M"))
+    fig = px.line(
+        df,
+        x="timestamp",
+        y="temperature_2m",
+        color="issue",
+        title=f"Temperature Forecast Revisions - {city}",
+        template="plotly_white",
+        height=400,
+    )
+    fig.update_layout(yaxis_title="Temperature (C)", legend_title="Issued at")
+    return fig
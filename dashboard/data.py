@@ -1,45 +1,102 @@
+import os
+from typing import Optional
+
 import streamlit as st
 import duckdb
 import pandas as pd
 
 from etl.data_access import (
-    get_available_cities,
-    get_data_freshness,
-    get_latest_weather,
-    get_weather_history,
+    get_backtest_skill,
+    get_data_versions,
+    get_live_skill,
+    get_page_data,
+    get_revision_history,
+    split_history,
+    split_multi_city,
+)
+from dashboard.charts import (
+    plot_humidity_chart,
+    plot_model_performance,
+    plot_multi_city_comparison,
+    plot_precipitation_chart,
+    plot_revision_history,
+    plot_temperature_forecast,
 )
-from forecast.predict import generate_forecast
+from etl.config import load_config
+from etl.locations import build_location_index
+from etl.query_service import RemoteConnection
+from etl.snapshot import read_current_snapshot
+from etl.variables import configured_variables, variable_label
+from forecast.predict import generate_forecast, latest_checkpoint_mtime, model_checkpoint_mtime
+
+
+@st.cache_resource(max_entries=2)
+def _open_database(path: str):
+    return duckdb.connect(path, read_only=True)
 
 
 @st.cache_resource
-def get_connection(db_path: str = "data/warehouse/weather.duckdb"):
-    return duckdb.connect(db_path, read_only=True)
+def _remote_connection(url: str):
+    return RemoteConnection(url)
 
 
-@st.cache_data(ttl=300)
-def fetch_cities(_conn) -> list[str]:
-    return get_available_cities(_conn)
+@st.cache_resource
+def fetch_paths() -> dict:
+    """The `paths` section of config.yaml (empty without one)."""
+    try:
+        return load_config().get("paths", {})
+    except FileNotFoundError:
+        return {}
+
+
+def get_connection(db_path: Optional[str] = None, snapshot_dir: Optional[str] = None):
+    """
+    Read-only connection to the newest snapshot published by the ETL (see
+    etl.snapshot), so the dashboard never holds a lock on the writer's file.
+    Without any snapshot, opens `db_path` directly. Both default to
+    `paths.snapshot_path` and `paths.duckdb_path` from config.yaml.
+
+    With WEATHER_QUERY_URL set, queries go to the shared query service
+    (etl.query_service) instead, which pools connections and caches results
+    for every dashboard process until the next snapshot.
+    """
+    query_url = os.environ.get("WEATHER_QUERY_URL")
+    if query_url:
+        return _remote_connection(query_url)
+
+    paths = fetch_paths()
+    db_path = db_path or paths.get("duckdb_path", "data/warehouse/weather.duckdb")
+    snapshot_dir = snapshot_dir or paths.get("snapshot_path", "data/warehouse/snapshots")
+    current = read_current_snapshot(snapshot_dir)
+    if current is None:
+        return _open_database(db_path)
+    return _open_database(os.path.join(snapshot_dir, current["file"]))
 
 
-@st.cache_data(ttl=300)
-def fetch_freshness(_conn) -> dict:
-    return get_data_freshness(_conn)
+@st.cache_resource
+def fetch_variables() -> list:
+    """The hourly variable registry from config.yaml (the defaults without one)."""
+    return configured_variables()
 
 
-@st.cache_data(ttl=300)
-def fetch_latest(_conn, city: str) -> pd.DataFrame:
-    return get_latest_weather(_conn, city)
+# The fetch_* results below are cached on the loader's per-city data version
+# instead of a timer: an entry stays valid until its city is reloaded, and a
+# reload of one city leaves every other city's entries in place.
 
+def fetch_data_versions(_conn) -> dict:
+    # Deliberately uncached: one small keyed read per rerun
+    return get_data_versions(_conn)
 
-@st.cache_data(ttl=300)
-def fetch_history(
-    _conn, city: str, start_date: str, end_date: str
-) -> pd.DataFrame:
-    return get_weather_history(_conn, city, start_date, end_date)
 
+def _versions_key(_conn, cities=None) -> tuple:
+    versions = fetch_data_versions(_conn)
+    if cities is not None:
+        return tuple((city, versions.get(city)) for city in cities)
+    return tuple(sorted(versions.items()))
 
-@st.cache_data(ttl=600)
-def fetch_forecast(_conn, city: str, horizon: int) -> pd.DataFrame:
+
+@st.cache_data(max_entries=256)
+def _cached_forecast(_conn, city: str, horizon: int, version, model) -> pd.DataFrame:
     try:
         return generate_forecast(city, _conn, horizon)
     except (FileNotFoundError, ValueError) as e:
@@ -47,26 +104,136 @@ def fetch_forecast(_conn, city: str, horizon: int) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-@st.cache_data(ttl=300)
-def fetch_model_metrics(_conn) -> pd.DataFrame:
+def fetch_forecast(_conn, city: str, horizon: int) -> pd.DataFrame:
+    # Keyed on the checkpoint's mtime too, so retraining replaces the forecast
+    return _cached_forecast(
+        _conn, city, horizon, fetch_data_versions(_conn).get(city), model_checkpoint_mtime(city, horizon)
+    )
+
+
+@st.cache_data(max_entries=16)
+def _cached_page_data(_conn, window_start: str, versions: tuple) -> dict:
+    return get_page_data(_conn, window_start)
+
+
+def fetch_page_data(_conn, window_start: str) -> dict:
+    """
+    The page's cities, freshness, latest rows and every city's rows since
+    `window_start`, from one query (etl.data_access.get_page_data). The
+    payload spans all cities, so it is keyed on every city's version;
+    switching the selected city is then served from memory.
+    """
+    return _cached_page_data(_conn, window_start, _versions_key(_conn))
+
+
+@st.cache_data(max_entries=16)
+def _cached_model_metrics(_conn, versions: tuple, models) -> pd.DataFrame:
+    # Prefer live skill verified by the loader; fall back to training metrics
+    try:
+        live = get_live_skill(_conn)
+        if not live.empty:
+            return live
+    except Exception:
+        pass
     try:
         return _conn.execute("SELECT * FROM model_metrics ORDER BY city, horizon").fetchdf()
     except Exception:
         return pd.DataFrame()
 
 
+def fetch_model_metrics(_conn) -> pd.DataFrame:
+    # forecast_skill is updated by the loader, so any city's reload can change
+    # it; model_metrics is rewritten by training, so any retrain can too
+    return _cached_model_metrics(_conn, _versions_key(_conn), latest_checkpoint_mtime())
+
+
 @st.cache_data(ttl=300)
-def fetch_multi_city_data(_conn, cities: list[str], days: int = 7) -> pd.DataFrame:
-    if not cities:
+def fetch_backtest_skill(_conn, city: str, horizon: int) -> pd.DataFrame:
+    try:
+        return get_backtest_skill(_conn, city, horizon)
+    except Exception:
+        return pd.DataFrame()
+
+
+@st.cache_data(max_entries=256)
+def _cached_revision_history(_conn, city: str, start_date: str, end_date: str, version) -> pd.DataFrame:
+    try:
+        return get_revision_history(_conn, city, start_date, end_date)
+    except Exception:
+        # No weather_revisions without settings.versioned_storage
         return pd.DataFrame()
-    placeholders = ", ".join(["?"] * len(cities))
-    return _conn.execute(
-        f"""
-        SELECT timestamp, temperature_2m, relativehumidity_2m, precipitation, city
-        FROM weather_hourly
-        WHERE city IN ({placeholders})
-          AND timestamp >= CURRENT_TIMESTAMP - INTERVAL '{days} days'
-        ORDER BY timestamp
-        """,
-        cities,
-    ).fetchdf()
+
+
+def fetch_revision_figure(_conn, city: str, start_date: str, end_date: str):
+    """Every issued temperature for the city's hours in the window, or None
+    when versioned storage has recorded no revisions."""
+    revisions = _cached_revision_history(
+        _conn, city, start_date, end_date, fetch_data_versions(_conn).get(city)
+    )
+    if revisions.empty:
+        return None
+    return plot_revision_history(revisions, city)
+
+
+# Built figures for the common views, shared by every session in the process.
+# st.cache_resource hands back the same object instead of unpickling a copy,
+# and st.plotly_chart only reads it, so each view's figure is built once per
+# data and model version rather than once per viewer per rerun.
+
+@st.cache_resource(max_entries=128)
+def _cached_city_figures(
+    city: str, horizon: int, start_date: str, end_date: str, version, model, _page: dict, _forecast_df: pd.DataFrame
+) -> dict:
+    actual_df = split_history(_page, city, start_date, end_date)
+    return {
+        "temperature": plot_temperature_forecast(actual_df, _forecast_df, city),
+        "humidity": plot_humidity_chart(actual_df, city),
+        "precipitation": plot_precipitation_chart(actual_df, city),
+    }
+
+
+def fetch_city_figures(_conn, page: dict, city: str, horizon: int, start_date: str, end_date: str) -> dict:
+    """Temperature/forecast, humidity and precipitation figures for a city."""
+    version = fetch_data_versions(_conn).get(city)
+    # The forecast is not hashed, so the key carries its checkpoint's mtime
+    model = model_checkpoint_mtime(city, horizon)
+    forecast_df = fetch_forecast(_conn, city, horizon)
+    return _cached_city_figures(city, horizon, start_date, end_date, version, model, page, forecast_df)
+
+
+@st.cache_resource(max_entries=16)
+def _cached_multi_city_figure(metric: str, label: str, since: str, versions: tuple, _page: dict):
+    cities = [city for city, _ in versions]
+    multi_df = split_multi_city(_page, cities, since)
+    if multi_df.empty:
+        return None
+    return plot_multi_city_comparison(multi_df, metric, label)
+
+
+def fetch_multi_city_figure(_conn, page: dict, metric: str, since: str):
+    """Multi-city comparison figure, or None when there is nothing to compare."""
+    versions = _versions_key(_conn, page["cities"])
+    label = variable_label(fetch_variables(), metric)
+    return _cached_multi_city_figure(metric, label, since, versions, page)
+
+
+@st.cache_resource(max_entries=16)
+def _cached_model_performance_figure(versions: tuple, models, _metrics_df: pd.DataFrame):
+    return plot_model_performance(_metrics_df)
+
+
+def fetch_model_performance_figure(_conn):
+    # Keyed like fetch_model_metrics, whose result is passed unhashed
+    models = latest_checkpoint_mtime()
+    return _cached_model_performance_figure(_versions_key(_conn), models, fetch_model_metrics(_conn))
+
+
+@st.cache_resource(max_entries=4)
+def _cached_location_index(versions: tuple, _conn):
+    return build_location_index(_conn)
+
+
+def fetch_location_index(_conn):
+    """Spatial index over every city's configured and grid coordinates, for
+    nearest-city (LocationIndex.nearest) and bounding-box (within_bbox) lookups."""
+    return _cached_location_index(_versions_key(_conn), _conn)
@@ -0,0 +1,187 @@
+import json
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import duckdb
+import numpy as np
+
+from etl.data_access import get_data_versions, record_batches
+from etl.feature_store import FEATURE_COLUMNS, get_scaling_params, scaled_series_query
+from etl.logger import get_logger
+
+logger = get_logger()
+
+MANIFEST_FILE = "manifest.json"
+
+# Rows per Arrow batch streamed from DuckDB into the memory-mapped file
+EXPORT_BATCH_ROWS = 100_000
+
+
+def _city_slug(city: str) -> str:
+    return city.replace(" ", "_").lower()
+
+
+def read_manifest(corpus_dir: str) -> dict:
+    path = os.path.join(corpus_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_manifest(corpus_dir: str, manifest: dict):
+    tmp_path = os.path.join(corpus_dir, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(corpus_dir, MANIFEST_FILE))
+
+
+def export_city_corpus(
+    conn: duckdb.DuckDBPyConnection,
+    city: str,
+    corpus_dir: str,
+    features: List[str] = FEATURE_COLUMNS,
+    max_gap_hours: int = 0,
+    data_version: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Write a city's normalized series to `<city>.npy` (float32, rows x features)
+    and its timestamps to `<city>_timestamps.npy`. Short gaps are filled as
+    described in etl.feature_store.scaled_series_query.
+
+    Rows are streamed from weather_hourly_scaled straight into the
+    memory-mapped output, so the full history is never held in memory. Files
+    are written under a temporary name and swapped in, so readers that still
+    have the previous export mapped are unaffected.
+
+    `data_version` (the city's etl.load data version at export time) is
+    recorded in the manifest entry as its high-water mark.
+
+    Returns the manifest entry, or None when the city has no rows.
+    """
+    query = scaled_series_query(features, max_gap_hours)
+    n_rows = conn.execute(f"SELECT COUNT(*) FROM ({query})", [city]).fetchone()[0]
+    if n_rows == 0:
+        return None
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    slug = _city_slug(city)
+    values_path = os.path.join(corpus_dir, f"{slug}.npy")
+    ts_path = os.path.join(corpus_dir, f"{slug}_timestamps.npy")
+
+    values = np.lib.format.open_memmap(
+        f"{values_path}.tmp", mode="w+", dtype=np.float32, shape=(n_rows, len(features))
+    )
+    timestamps = np.lib.format.open_memmap(
+        f"{ts_path}.tmp", mode="w+", dtype="datetime64[us]", shape=(n_rows,)
+    )
+
+    data_min, data_max = get_scaling_params(conn, city, features)
+    reader = record_batches(conn, query, [city], EXPORT_BATCH_ROWS)
+
+    offset = 0
+    for batch in reader:
+        end = offset + batch.num_rows
+        timestamps[offset:end] = batch.column("timestamp").to_numpy(zero_copy_only=False)
+        for i, feat in enumerate(features):
+            values[offset:end, i] = batch.column(feat).to_numpy(zero_copy_only=False)
+        offset = end
+
+    values.flush()
+    timestamps.flush()
+    del values, timestamps
+    os.replace(f"{values_path}.tmp", values_path)
+    os.replace(f"{ts_path}.tmp", ts_path)
+
+    return {
+        "values": os.path.basename(values_path),
+        "timestamps": os.path.basename(ts_path),
+        "rows": int(n_rows),
+        "features": list(features),
+        "max_gap_hours": int(max_gap_hours),
+        # Ranges the series was normalized with; models trained on it store these
+        "scale_min": data_min.tolist(),
+        "scale_max": data_max.tolist(),
+        "data_version": data_version,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def _is_current(entry: Optional[dict], version: Optional[int], features: List[str],
+                max_gap_hours: int, min_interval_minutes: float) -> bool:
+    """Whether a city's manifest entry can be kept instead of re-exported."""
+    if entry is None or entry["features"] != list(features):
+        return False
+    if entry.get("max_gap_hours", 0) != max_gap_hours:
+        return False
+    if version is not None and entry.get("data_version") == version:
+        return True
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(entry["exported_at"])
+    return age.total_seconds() < min_interval_minutes * 60
+
+
+def export_corpus(
+    conn: duckdb.DuckDBPyConnection,
+    corpus_dir: str,
+    cities: Optional[List[str]] = None,
+    max_gap_hours: int = 0,
+    min_interval_minutes: float = 0,
+) -> dict:
+    """
+    Export the normalized series of each city (all cities in weather_hourly
+    by default) and update the corpus manifest.
+
+    A city is skipped while its data version still matches the manifest's
+    high-water mark, and, with `min_interval_minutes`, until its last export
+    is at least that old, so a run that loaded a few hours does not rewrite
+    every city's full history.
+
+    Returns the full manifest.
+    """
+    if cities is None:
+        cities = [
+            row[0]
+            for row in conn.execute(
+                "SELECT DISTINCT city FROM weather_hourly WHERE city IS NOT NULL ORDER BY city"
+            ).fetchall()
+        ]
+
+    manifest = read_manifest(corpus_dir)
+    versions = get_data_versions(conn)
+    exported = 0
+    for city in cities:
+        version = versions.get(city)
+        if _is_current(manifest.get(city), version, FEATURE_COLUMNS, max_gap_hours, min_interval_minutes):
+            continue
+        entry = export_city_corpus(
+            conn, city, corpus_dir, max_gap_hours=max_gap_hours, data_version=version
+        )
+        if entry is not None:
+            manifest[city] = entry
+            exported += 1
+
+    if exported:
+        _write_manifest(corpus_dir, manifest)
+    logger.info(f"Exported corpus for {exported} of {len(cities)} cities; others are current")
+    return manifest
+
+
+def load_city_corpus(
+    city: str, corpus_dir: str, mmap_mode: str = "r"
+) -> Tuple[np.ndarray, np.ndarray, dict]:
+    """
+    Memory-map a city's exported series.
+
+    Returns (timestamps, values, manifest entry). `values` is an np.memmap, so
+    processes reading the same corpus share the OS page cache instead of each
+    holding a private copy. Use mmap_mode="c" when a writable (copy-on-write)
+    array is needed, e.g. for torch.from_numpy.
+    """
+    entry = read_manifest(corpus_dir).get(city)
+    if entry is None:
+        raise FileNotFoundError(f"No exported corpus for {city} in {corpus_dir}")
+
+    values = np.load(os.path.join(corpus_dir, entry["values"]), mmap_mode=mmap_mode)
+    timestamps = np.load(os.path.join(corpus_dir, entry["timestamps"]), mmap_mode="r")
+    return timestamps, values, entry
@@ -3,6 +3,18 @@ import pandas as pd
 from typing import List, Optional
 
 
+def current_values_source(conn: duckdb.DuckDBPyConnection) -> str:
+    """
+    The relation holding each hour's current values: weather_hourly_current
+    (weather_hourly with revised hours taken from weather_hourly_latest) when
+    versioned storage is on, otherwise weather_hourly.
+    """
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'weather_hourly_current'"
+    ).fetchone()[0]
+    return "weather_hourly_current" if exists else "weather_hourly"
+
+
 def get_weather_history(
     conn: duckdb.DuckDBPyConnection,
     city: str,
@@ -10,10 +22,10 @@ def get_weather_history(
     end_date: str,
 ) -> pd.DataFrame:
     return conn.execute(
-        """
+        f"""
         SELECT timestamp, temperature_2m, relativehumidity_2m, precipitation,
                city, latitude, longitude
-        FROM weather_hourly
+        FROM {current_values_source(conn)}
         WHERE city = ? AND timestamp >= ? AND timestamp <= ?
         ORDER BY timestamp
         """,
@@ -25,10 +37,10 @@ def get_latest_weather(
     conn: duckdb.DuckDBPyConnection, city: str
 ) -> pd.DataFrame:
     return conn.execute(
-        """
+        f"""
         SELECT timestamp, temperature_2m, relativehumidity_2m, precipitation,
                city, latitude, longitude
-        FROM weather_hourly
+        FROM {current_values_source(conn)}
         WHERE city = ?
         ORDER BY timestamp DESC
         LIMIT 1
@@ -37,6 +49,42 @@ def get_latest_weather(
     ).fetchdf()
 
 
+def get_revision_history(
+    conn: duckdb.DuckDBPyConnection,
+    city: str,
+    start_date: str,
+    end_date: str,
+) -> pd.DataFrame:
+    """Every issued value for the city's hours in [start_date, end_date],
+    oldest issue first, with lead_hours = hours from issue to valid time
+    (negative once the hour had already passed)."""
+    return conn.execute(
+        """
+        SELECT r.timestamp, r.issued_at,
+               date_diff('hour', r.issued_at, r.timestamp) AS lead_hours,
+               r.temperature_2m, r.relativehumidity_2m, r.precipitation,
+               l.city, l.latitude, l.longitude
+        FROM weather_revisions r
+        JOIN locations l ON l.location_id = r.location_id
+        WHERE l.city = ? AND r.timestamp >= ? AND r.timestamp <= ?
+        ORDER BY r.timestamp, r.issued_at
+        """,
+        [city, start_date, end_date],
+    ).fetchdf()
+
+
+def record_batches(
+    conn: duckdb.DuckDBPyConnection, query: str, params: list, batch_rows: int
+):
+    """Run a query and return a pyarrow RecordBatchReader over its result,
+    so callers can consume it in bounded-size chunks."""
+    result = conn.execute(query, params)
+    # to_arrow_reader replaces fetch_record_batch in newer DuckDB releases
+    if hasattr(result, "to_arrow_reader"):
+        return result.to_arrow_reader(batch_rows)
+    return result.fetch_record_batch(batch_rows)
+
+
 def get_available_cities(conn: duckdb.DuckDBPyConnection) -> List[str]:
     rows = conn.execute(
         "SELECT DISTINCT city FROM weather_hourly WHERE city IS NOT NULL ORDER BY city"
@@ -44,6 +92,16 @@ def get_available_cities(conn: duckdb.DuckDBPyConnection) -> List[str]:
     return [row[0] for row in rows]
 
 
+def get_data_versions(conn: duckdb.DuckDBPyConnection) -> dict:
+    """Per-city data version stamped by the loader; empty before the first load."""
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'data_versions'"
+    ).fetchone()[0]
+    if not exists:
+        return {}
+    return dict(conn.execute("SELECT city, version FROM data_versions").fetchall())
+
+
 def get_data_freshness(conn: duckdb.DuckDBPyConnection) -> dict:
     rows = conn.execute(
         """
@@ -63,6 +121,92 @@ def get_data_freshness(conn: duckdb.DuckDBPyConnection) -> dict:
     return result
 
 
+# weather_hourly columns that are not hourly variables; every other column is
+# one (see etl.variables), so the page picks up newly registered variables
+_KEY_COLUMNS = "city, timestamp, latitude, longitude, load_date, location_id"
+
+
+def get_page_data(
+    conn: duckdb.DuckDBPyConnection, window_start
+) -> dict:
+    """
+    Everything the dashboard page reads from the current values (see
+    current_values_source), in one query.
+
+    A tagged UNION ALL of a per-city summary (one hash aggregate giving the
+    city list, freshness and each city's latest row via arg_max) and every
+    city's rows from `window_start` on (a timestamp-pruned range scan). The
+    page's history and multi-city views are split from `rows` in memory; see
+    split_history and split_multi_city.
+
+    Returns dict with cities, variables (the variable columns present),
+    freshness, latest (one row per city) and rows.
+    """
+    source = current_values_source(conn)
+    result = conn.execute(
+        f"""
+        SELECT 'summary' AS tag,
+               city,
+               MAX(timestamp) AS timestamp,
+               arg_max(COLUMNS(* EXCLUDE ({_KEY_COLUMNS})), timestamp),
+               arg_max(latitude, timestamp) AS latitude,
+               arg_max(longitude, timestamp) AS longitude,
+               MAX(load_date) AS last_load
+        FROM {source}
+        WHERE city IS NOT NULL
+        GROUP BY city
+        UNION ALL
+        SELECT 'row', city, timestamp, COLUMNS(* EXCLUDE ({_KEY_COLUMNS})),
+               latitude, longitude, NULL
+        FROM {source}
+        WHERE city IS NOT NULL AND timestamp >= ?
+        """,
+        [window_start],
+    ).fetchdf()
+
+    variables = [
+        c for c in result.columns
+        if c not in ("tag", "city", "timestamp", "latitude", "longitude", "last_load")
+    ]
+    columns = ["timestamp", *variables, "city", "latitude", "longitude"]
+    is_summary = (result["tag"] == "summary").to_numpy()
+    summary = result[is_summary].sort_values("city").reset_index(drop=True)
+    rows = result.loc[~is_summary, columns].sort_values("timestamp").reset_index(drop=True)
+
+    return {
+        "cities": summary["city"].tolist(),
+        "variables": variables,
+        "freshness": {
+            row.city: {"latest_timestamp": row.timestamp, "last_load": row.last_load}
+            for row in summary.itertuples()
+        },
+        "latest": summary[columns],
+        "rows": rows,
+    }
+
+
+def split_latest(page: dict, city: str) -> pd.DataFrame:
+    latest = page["latest"]
+    return latest[latest["city"] == city].reset_index(drop=True)
+
+
+def split_history(page: dict, city: str, start_date, end_date) -> pd.DataFrame:
+    """Same rows as get_weather_history, from a page payload."""
+    rows = page["rows"]
+    mask = (
+        (rows["city"] == city)
+        & (rows["timestamp"] >= pd.Timestamp(start_date))
+        & (rows["timestamp"] <= pd.Timestamp(end_date))
+    )
+    return rows[mask].reset_index(drop=True)
+
+
+def split_multi_city(page: dict, cities: List[str], since) -> pd.DataFrame:
+    rows = page["rows"]
+    mask = rows["city"].isin(cities) & (rows["timestamp"] >= pd.Timestamp(since))
+    return rows.loc[mask, ["timestamp", *page["variables"], "city"]].reset_index(drop=True)
+
+
 def get_recent_hours(
     conn: duckdb.DuckDBPyConnection, city: str, hours: int
 ) -> pd.DataFrame:
@@ -76,3 +220,64 @@ def get_recent_hours(
         """,
         [city, hours],
     ).fetchdf().sort_values("timestamp").reset_index(drop=True)
+
+
+def get_recent_hours_multi(
+    conn: duckdb.DuckDBPyConnection, cities: List[str], hours: int
+) -> pd.DataFrame:
+    """Most recent `hours` rows for each city, in one query."""
+    placeholders = ", ".join(["?"] * len(cities))
+    return conn.execute(
+        f"""
+        SELECT city, timestamp, temperature_2m, relativehumidity_2m, precipitation
+        FROM weather_hourly
+        WHERE city IN ({placeholders})
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY city ORDER BY timestamp DESC) <= ?
+        ORDER BY city, timestamp
+        """,
+        [*cities, hours],
+    ).fetchdf()
+
+
+def get_backtest_skill(
+    conn: duckdb.DuckDBPyConnection, city: str, horizon: int
+) -> pd.DataFrame:
+    """Weekly mean absolute error of backtested forecasts for a city."""
+    return conn.execute(
+        """
+        SELECT date_trunc('week', origin_timestamp) AS week,
+               AVG(ABS(pred_temperature_2m - actual_temperature_2m)) AS mae_temp,
+               AVG(ABS(pred_relativehumidity_2m - actual_relativehumidity_2m)) AS mae_humidity,
+               AVG(ABS(pred_precipitation - actual_precipitation)) AS mae_precip,
+               COUNT(*) AS n_forecasts
+        FROM forecast_backtests
+        WHERE city = ? AND horizon_hours = ?
+        GROUP BY 1
+        ORDER BY 1
+        """,
+        [city, horizon],
+    ).fetchdf()
+
+
+def get_live_skill(conn: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+    """Mean absolute error of issued forecasts verified against actuals.
+
+    Reads the precomputed forecast_skill sums maintained by the loader.
+    """
+    return conn.execute(
+        """
+        SELECT city,
+               horizon_hours AS horizon,
+               model_version,
+               SUM(n) AS n,
+               SUM(sum_abs_temperature_2m) / SUM(n) AS mae_temp,
+               SQRT(SUM(sum_sq_temperature_2m) / SUM(n)) AS rmse_temp,
+               SUM(sum_abs_relativehumidity_2m) / SUM(n) AS mae_humidity,
+               SQRT(SUM(sum_sq_relativehumidity_2m) / SUM(n)) AS rmse_humidity,
+               SUM(sum_abs_precipitation) / SUM(n) AS mae_precip,
+               SQRT(SUM(sum_sq_precipitation) / SUM(n)) AS rmse_precip
+        FROM forecast_skill
+        GROUP BY city, horizon_hours, model_version
+        ORDER BY city, horizon_hours, model_version
+        """
+    ).fetchdf()
@@ -0,0 +1,215 @@
+import duckdb
+import numpy as np
+import pandas as pd # type: ignore
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from etl.variables import add_variable_columns, configured_variables, range_violations, table_columns, variable_names
+
+# What a failing rule does: "error" quarantines the rows it fails,
+# "warn" only counts them in dq_metrics, "off" skips the rule
+DEFAULT_SEVERITY = {
+    "null_timestamp": "error",
+    "duplicate_timestamp": "error",
+    "out_of_range": "error",
+    "missing_value": "error",
+    "hour_gap": "warn",
+    "too_few_hours": "warn",
+    "stale": "error",
+}
+
+SEVERITIES = ("error", "warn", "off")
+
+
+def dqc_options(config: Optional[dict] = None) -> dict:
+    """Keyword arguments for evaluate_rules / transform_and_validate from config.yaml."""
+    config = config or {}
+    settings = config.get("settings", {})
+    dqc_cfg = config.get("dqc", {})
+    return {
+        "dqc_enabled": settings.get("dqc_enabled", True),
+        "expected_hours": settings.get("hours_to_fetch", 168),
+        "max_staleness_hours": dqc_cfg.get("max_staleness_hours", 6),
+        "severity": dqc_cfg.get("severity"),
+    }
+
+
+def _rule_family(rule: str) -> str:
+    # Per-variable rules are named "<family>:<variable>"
+    return rule.split(":", 1)[0]
+
+
+def evaluate_rules(
+    df: pd.DataFrame,
+    variables: Optional[List[dict]] = None,
+    expected_hours: int = 168,
+    max_staleness_hours: float = 6,
+    is_historical: bool = False,
+    severity: Optional[Dict[str, str]] = None,
+    now: Optional[datetime] = None,
+) -> pd.DataFrame:
+    """
+    Evaluate every enabled rule over a transformed batch in one vectorized
+    pass. Returns a boolean frame aligned with `df`, one column per rule,
+    True where the row fails it.
+
+    Row rules flag individual hours: null_timestamp, duplicate_timestamp
+    (every repeat after the first), out_of_range:<variable> and
+    missing_value:<variable> (from the variable registry) and hour_gap (the
+    hour after a gap). Batch rules flag every row when the batch as a whole
+    fails: too_few_hours (fewer distinct hours than `expected_hours`) and
+    stale (latest hour older than `max_staleness_hours`). Archive pulls
+    (`is_historical`) skip both batch rules, so any length is accepted.
+    """
+    variables = variables or configured_variables()
+    severity = {**DEFAULT_SEVERITY, **(severity or {})}
+    for rule, level in severity.items():
+        if level not in SEVERITIES:
+            raise ValueError(f"Unknown severity {level!r} for DQ rule {rule}")
+
+    n = len(df)
+    names = variable_names(variables)
+    timestamps = df["timestamp"]
+    has_timestamp = timestamps.notna().to_numpy()
+    masks: Dict[str, np.ndarray] = {}
+
+    if severity["null_timestamp"] != "off":
+        masks["null_timestamp"] = ~has_timestamp
+    if severity["duplicate_timestamp"] != "off":
+        masks["duplicate_timestamp"] = (timestamps.duplicated(keep="first") & timestamps.notna()).to_numpy()
+    if severity["out_of_range"] != "off":
+        for name, failed in range_violations(df, variables).items():
+            masks[f"out_of_range:{name}"] = failed.to_numpy()
+    if severity["missing_value"] != "off":
+        missing = df[names].isna().to_numpy()
+        for i, name in enumerate(names):
+            masks[f"missing_value:{name}"] = missing[:, i]
+
+    # Gaps and batch rules work on the sorted distinct hours
+    hours = np.sort(timestamps[has_timestamp].to_numpy(dtype="datetime64[ns]"))
+    distinct_hours = hours[np.concatenate(([True], hours[1:] != hours[:-1]))] if len(hours) else hours
+    if severity["hour_gap"] != "off":
+        gap_after = distinct_hours[1:][np.diff(distinct_hours) > np.timedelta64(1, "h")]
+        masks["hour_gap"] = timestamps.isin(gap_after).to_numpy()
+    if not is_historical and severity["too_few_hours"] != "off":
+        masks["too_few_hours"] = np.full(n, len(distinct_hours) < expected_hours)
+    if not is_historical and severity["stale"] != "off":
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        max_age = np.timedelta64(int(max_staleness_hours * 3600), "s")
+        is_stale = not len(distinct_hours) or np.datetime64(now) - distinct_hours[-1] > max_age
+        masks["stale"] = np.full(n, is_stale)
+
+    return pd.DataFrame(masks, index=df.index, dtype=bool)
+
+
+def apply_rules(
+    df: pd.DataFrame, masks: pd.DataFrame, severity: Optional[Dict[str, str]] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Split a batch by its rule masks.
+
+    Returns (valid, quarantined, metrics): the rows failing no error-level
+    rule; the rows failing at least one, with a `reasons` list of every rule
+    they fail; and one row per rule with its severity, rows_checked and
+    rows_failed.
+    """
+    severity = {**DEFAULT_SEVERITY, **(severity or {})}
+    rules = list(masks.columns)
+    failed = masks.to_numpy(dtype=bool)
+    is_error = np.array([severity[_rule_family(rule)] == "error" for rule in rules], dtype=bool)
+    bad = failed[:, is_error].any(axis=1) if rules else np.zeros(len(df), dtype=bool)
+
+    quarantined = df.loc[bad].reset_index(drop=True)
+    quarantined["reasons"] = [
+        [rules[j] for j in np.flatnonzero(row)] for row in failed[bad]
+    ]
+    metrics = pd.DataFrame(
+        {
+            "rule": rules,
+            "severity": [severity[_rule_family(rule)] for rule in rules],
+            "rows_checked": len(df),
+            "rows_failed": failed.sum(axis=0).astype("int64"),
+        }
+    )
+    return df.loc[~bad].reset_index(drop=True), quarantined, metrics
+
+
+def create_dq_tables(conn: duckdb.DuckDBPyConnection, variables: Optional[List[dict]] = None):
+
+    variables = variables or configured_variables()
+    variable_defs = ",\n            ".join(f"{name} DOUBLE" for name in variable_names(variables))
+    # Rows held back by an error-level rule, with every rule they failed
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS dq_quarantine (
+            checked_at TIMESTAMP,
+            city VARCHAR,
+            latitude DOUBLE,
+            longitude DOUBLE,
+            timestamp TIMESTAMP,
+            {variable_defs},
+            reasons VARCHAR[]
+        )
+        """
+    )
+    # Per batch and rule: how many rows were checked and how many failed
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dq_metrics (
+            checked_at TIMESTAMP,
+            city VARCHAR,
+            rule VARCHAR,
+            severity VARCHAR,
+            rows_checked BIGINT,
+            rows_failed BIGINT
+        )
+        """
+    )
+    add_variable_columns(conn, "dq_quarantine", variables)
+
+
+def record_dq_results(
+    conn: duckdb.DuckDBPyConnection,
+    city: str,
+    quarantined: pd.DataFrame,
+    metrics: pd.DataFrame,
+    checked_at: Optional[datetime] = None,
+    variables: Optional[List[dict]] = None,
+) -> int:
+    """
+    Append a batch's quarantined rows to dq_quarantine and its per-rule
+    counts to dq_metrics. Returns the number of rows quarantined.
+    """
+    create_dq_tables(conn, variables)
+    if checked_at is None:
+        checked_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    if not metrics.empty:
+        conn.register("dq_batch_metrics", metrics)
+        conn.execute(
+            """
+            INSERT INTO dq_metrics
+            SELECT CAST(? AS TIMESTAMP), ?, rule, severity, rows_checked, rows_failed
+            FROM dq_batch_metrics
+            """,
+            [checked_at, city],
+        )
+        conn.unregister("dq_batch_metrics")
+
+    if quarantined.empty:
+        return 0
+    columns = [
+        c for c in table_columns(conn, "dq_quarantine")
+        if c in quarantined.columns and c not in ("checked_at", "city")
+    ]
+    conn.register("dq_batch_rows", quarantined)
+    conn.execute(
+        f"""
+        INSERT INTO dq_quarantine (checked_at, city, {", ".join(columns)})
+        SELECT CAST(? AS TIMESTAMP), ?, {", ".join(columns)}
+        FROM dq_batch_rows
+        """,
+        [checked_at, city],
+    )
+    conn.unregister("dq_batch_rows")
+    return len(quarantined)
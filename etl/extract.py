@@ -1,16 +1,43 @@
-import os 
+import os
 import json
+import asyncio
+import functools
+import hashlib
+import random
+import time
 import requests # type: ignore
-from datetime import datetime
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter # type: ignore
+from typing import List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+from etl.logger import get_logger
+from etl.metrics import span
+from etl.variables import variable_names
 
-def build_weather_url(latitude: float, longitude: float):
+logger = get_logger()
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Longest Retry-After honored by default; a server asking for more is clamped
+MAX_RETRY_AFTER_SECONDS = 600.0
+
+# Payload keys that change on every response and are ignored when hashing
+VOLATILE_KEYS = {"generationtime_ms"}
+
+
+def build_weather_url(latitude: float, longitude: float, hourly: Optional[List[str]] = None):
     """_summary_
 
     Args:
         latitude (float): _description_
         longitude (float): _description_
+        hourly (Optional[List[str]]): Hourly variables to request (the
+            variables configured in config.yaml by default, see
+            etl.variables.configured_variables)
 
     Returns:
         _type_: _description_
@@ -19,37 +46,232 @@ def build_weather_url(latitude: float, longitude: float):
     params = (
         f"?latitude={latitude}"
         f"&longitude={longitude}"
-        f"&hourly=temperature_2m,relativehumidity_2m,precipitation"
+        f"&hourly={','.join(hourly or variable_names())}"
     )
 
-    return base_url + params 
+    return base_url + params
 
-def extract_weather_data(latitude: float, longitude: float, raw_path: str, city: Optional[str] = None) -> str:
-    """_summary_
+def create_session(pool_size: int = 8) -> requests.Session:
+    """Session with a keep-alive connection pool sized for `pool_size`
+    concurrent requests, so repeated calls reuse TCP/TLS connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-    Args:
-        latitude (float): _description_
-        longitude (float): _description_
-        raw_path (str): _description_
-        city (Optional[str]): City name for labeling the file
+def retry_delay(
+    attempt: int,
+    response=None,
+    backoff: float = 1.0,
+    max_backoff: float = 60.0,
+    max_retry_after: float = MAX_RETRY_AFTER_SECONDS,
+) -> float:
+    """Seconds to wait before retry `attempt` (0-based).
 
-    Raises:
-        Exception: _description_
+    Honors a Retry-After header (seconds or HTTP date) when the response has
+    one, up to `max_retry_after` (longer requests are clamped and logged);
+    otherwise uses exponential backoff with full jitter, capped at
+    `max_backoff`.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            try:
+                wait = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                wait = None
+        if wait is not None:
+            if wait > max_retry_after:
+                logger.warning(
+                    f"Retry-After of {wait:.0f}s exceeds the {max_retry_after:.0f}s limit; "
+                    f"retrying after {max_retry_after:.0f}s"
+                )
+            return min(max(wait, 0.0), max_retry_after)
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
 
-    Returns:
-        str: _description_
+async def fetch_response(
+    session: requests.Session,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    retries: int = 4,
+    backoff: float = 1.0,
+    timeout: float = 10,
+    executor: Optional[ThreadPoolExecutor] = None,
+    headers: Optional[dict] = None,
+    stats: Optional[dict] = None,
+    max_retry_after: float = MAX_RETRY_AFTER_SECONDS,
+):
+    """GET `url`, retrying 429/5xx and connection errors.
+
+    The blocking request runs on `executor` (the loop's default when None)
+    while holding `semaphore`, which caps concurrent requests; backoff sleeps
+    happen outside it. Returns the 200 (or 304 for conditional requests)
+    response and raises for anything else. Response body sizes, retries
+    included, are added to `stats["bytes_downloaded"]` when given. Retry
+    waits follow retry_delay, honoring Retry-After up to `max_retry_after`.
     """
-    url = build_weather_url(latitude,longitude)
-    print(f"Requesting Weather Data from: {url}")
+    loop = asyncio.get_running_loop()
+    get = functools.partial(session.get, url, timeout=timeout, headers=headers)
+    for attempt in range(retries + 1):
+        response = None
+        async with semaphore:
+            try:
+                response = await loop.run_in_executor(executor, get)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+
+        if response is not None:
+            if stats is not None:
+                stats["bytes_downloaded"] = (stats.get("bytes_downloaded") or 0) + len(response.content)
+            if response.status_code in (200, 304):
+                return response
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                raise Exception(f"API request failed: {response.status_code} - {response.text}")
+
+        await asyncio.sleep(retry_delay(attempt, response, backoff, max_retry_after=max_retry_after))
+
+async def fetch_json(
+    session: requests.Session,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    retries: int = 4,
+    backoff: float = 1.0,
+    timeout: float = 10,
+    executor: Optional[ThreadPoolExecutor] = None,
+    stats: Optional[dict] = None,
+    max_retry_after: float = MAX_RETRY_AFTER_SECONDS,
+) -> dict:
+    """GET `url` with retries (see fetch_response) and return its JSON."""
+    response = await fetch_response(
+        session, url, semaphore, retries, backoff, timeout, executor,
+        stats=stats, max_retry_after=max_retry_after,
+    )
+    return response.json()
+
+def normalize_url(url: str) -> str:
+    """Cache key form of a URL: lower-cased scheme/host, sorted query, no fragment."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ""))
+
+def payload_hash(data: dict) -> str:
+    """Content hash of a payload, ignoring VOLATILE_KEYS."""
+    stable = {k: v for k, v in data.items() if k not in VOLATILE_KEYS}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True).encode()).hexdigest()
+
+def _cache_path(cache_dir: str, url: str) -> str:
+    key = hashlib.sha256(normalize_url(url).encode()).hexdigest()[:32]
+    return os.path.join(cache_dir, f"{key}.json")
+
+def read_cache_entry(cache_dir: str, url: str) -> Optional[dict]:
+    path = _cache_path(cache_dir, url)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A corrupt entry is just a cache miss
+        return None
+
+def write_cache_entry(cache_dir: str, url: str, entry: dict):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(cache_dir, url)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+def prune_response_cache(cache_dir: str, max_age_seconds: float = 7 * 24 * 3600, max_entries: int = 1000) -> int:
+    """Evict entries older than `max_age_seconds`, then the least recently
+    written beyond `max_entries`. Returns the number of entries removed."""
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    now = time.time()
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".json"):
+            path = os.path.join(cache_dir, name)
+            entries.append((os.path.getmtime(path), path))
+    entries.sort(reverse=True)
+
+    removed = 0
+    for i, (mtime, path) in enumerate(entries):
+        if now - mtime > max_age_seconds or i >= max_entries:
+            os.remove(path)
+            removed += 1
+    return removed
+
+async def fetch_cached_json(
+    session: requests.Session,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    cache_dir: str,
+    ttl: float = 900,
+    retries: int = 4,
+    backoff: float = 1.0,
+    timeout: float = 10,
+    executor: Optional[ThreadPoolExecutor] = None,
+    stats: Optional[dict] = None,
+    max_retry_after: float = MAX_RETRY_AFTER_SECONDS,
+) -> Tuple[dict, bool]:
+    """Fetch JSON through the on-disk response cache.
+
+    Entries younger than `ttl` seconds are served without a request. Older
+    entries are revalidated with If-None-Match/If-Modified-Since when the
+    server sent an ETag/Last-Modified, and a 304 reuses the cached body.
+
+    Returns (data, unchanged), where unchanged means the payload's content
+    hash matches the one last marked as loaded (see mark_url_loaded).
+    """
+    entry = read_cache_entry(cache_dir, url)
+    now = time.time()
 
-    response = requests.get(url, timeout=10)
+    if entry is None or now - entry["fetched_at"] >= ttl:
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
 
-    # Basic validation of response
-    if response.status_code != 200: 
-        raise Exception(f"API request failed: {response.status_code} - {response.text}")
-    
-    data = response.json()
+        response = await fetch_response(
+            session, url, semaphore, retries, backoff, timeout, executor, headers or None, stats,
+            max_retry_after,
+        )
+        if response.status_code == 304 and entry is not None:
+            entry["fetched_at"] = now
+        else:
+            data = response.json()
+            entry = {
+                "url": normalize_url(url),
+                "fetched_at": now,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_hash": payload_hash(data),
+                "loaded_hash": entry.get("loaded_hash") if entry else None,
+                "body": data,
+            }
+        write_cache_entry(cache_dir, url, entry)
 
+    return entry["body"], entry["content_hash"] == entry.get("loaded_hash")
+
+def mark_url_loaded(cache_dir: str, url: str):
+    """Record that the cached payload for `url` has been loaded, so the same
+    content is reported as unchanged next time."""
+    entry = read_cache_entry(cache_dir, url)
+    if entry is not None:
+        entry["loaded_hash"] = entry["content_hash"]
+        write_cache_entry(cache_dir, url, entry)
+
+def mark_location_loaded(cache_dir: str, latitude: float, longitude: float, hourly: Optional[List[str]] = None):
+    mark_url_loaded(cache_dir, build_weather_url(latitude, longitude, hourly))
+
+def save_raw_json(data: dict, raw_path: str, city: Optional[str] = None) -> str:
     # Ensure raw directory exists
     os.makedirs(raw_path, exist_ok=True)
 
@@ -59,9 +281,128 @@ def extract_weather_data(latitude: float, longitude: float, raw_path: str, city:
     filename = f"weather_raw_{city_suffix}{timestamp}.json"
     file_path = os.path.join(raw_path, filename)
 
-    # Save JSON data to file 
+    # Save JSON data to file
     with open(file_path, "w") as f:
         json.dump(data, f, indent=2)
-    
+
     print(f"Raw Data save to: {file_path}")
     return file_path
+
+async def extract_location_async(
+    location: dict,
+    raw_path: str,
+    session: requests.Session,
+    semaphore: asyncio.Semaphore,
+    executor: Optional[ThreadPoolExecutor] = None,
+    retries: int = 4,
+    backoff: float = 1.0,
+    timeout: float = 10,
+    cache_dir: Optional[str] = None,
+    cache_ttl: float = 900,
+    hourly: Optional[List[str]] = None,
+    stats: Optional[dict] = None,
+    max_retry_after: float = MAX_RETRY_AFTER_SECONDS,
+) -> Optional[str]:
+    """Fetch and save raw JSON for one location over a shared session.
+
+    Returns the raw file path, or None when `cache_dir` is set and the
+    payload is unchanged since it was last marked loaded. Downloaded bytes
+    are counted into `stats` (see fetch_response).
+    """
+    url = build_weather_url(location["latitude"], location["longitude"], hourly)
+    print(f"Requesting Weather Data from: {url}")
+    if not cache_dir:
+        data = await fetch_json(
+            session, url, semaphore, retries, backoff, timeout, executor, stats, max_retry_after
+        )
+        return save_raw_json(data, raw_path, location.get("name"))
+
+    data, unchanged = await fetch_cached_json(
+        session, url, semaphore, cache_dir, cache_ttl, retries, backoff, timeout, executor, stats,
+        max_retry_after,
+    )
+    if unchanged:
+        print(f"Payload unchanged since last load: {url}")
+        return None
+    return save_raw_json(data, raw_path, location.get("name"))
+
+async def extract_locations_async(
+    locations: List[dict],
+    raw_path: str,
+    concurrency: int = 8,
+    retries: int = 4,
+    backoff: float = 1.0,
+    timeout: float = 10,
+    session: Optional[requests.Session] = None,
+    cache_dir: Optional[str] = None,
+    cache_ttl: float = 900,
+    cache_max_age: float = 7 * 24 * 3600,
+    cache_max_entries: int = 1000,
+    hourly: Optional[List[str]] = None,
+    run: Optional[dict] = None,
+    max_retry_after: float = MAX_RETRY_AFTER_SECONDS,
+) -> List[Union[str, None, Exception]]:
+    """Fetch and save raw JSON for many locations concurrently.
+
+    Each location is a dict with latitude, longitude and optional name. All
+    requests share one pooled session and at most `concurrency` are in
+    flight. Returns, in location order, the raw file path or the exception
+    that location failed with, so one failure does not abort the rest.
+
+    With `cache_dir`, responses go through the on-disk cache (see
+    fetch_cached_json) and a location whose payload is unchanged since it
+    was last marked loaded returns None, with no raw file written.
+
+    With `run` (see etl.metrics.start_run), each location's fetch is
+    recorded as an "extract" span with its downloaded bytes.
+    """
+    if cache_dir:
+        prune_response_cache(cache_dir, cache_max_age, cache_max_entries)
+
+    own_session = session is None
+    session = session or create_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def extract_one(location: dict) -> Optional[str]:
+        with span(run, "extract", location.get("name"), bytes_downloaded=0) as record:
+            return await extract_location_async(
+                location, raw_path, session, semaphore, executor,
+                retries, backoff, timeout, cache_dir, cache_ttl, hourly, record,
+                max_retry_after,
+            )
+
+    try:
+        return await asyncio.gather(
+            *(extract_one(location) for location in locations),
+            return_exceptions=True,
+        )
+    finally:
+        executor.shutdown(wait=False)
+        if own_session:
+            session.close()
+
+def extract_weather_locations(locations: List[dict], raw_path: str, **kwargs) -> List[Union[str, None, Exception]]:
+    """Synchronous entry point for extract_locations_async."""
+    return asyncio.run(extract_locations_async(locations, raw_path, **kwargs))
+
+def extract_weather_data(latitude: float, longitude: float, raw_path: str, city: Optional[str] = None) -> str:
+    """_summary_
+
+    Args:
+        latitude (float): _description_
+        longitude (float): _description_
+        raw_path (str): _description_
+        city (Optional[str]): City name for labeling the file
+
+    Raises:
+        Exception: _description_
+
+    Returns:
+        str: _description_
+    """
+    location = {"latitude": latitude, "longitude": longitude, "name": city}
+    result = extract_weather_locations([location], raw_path, concurrency=1)[0]
+    if isinstance(result, BaseException):
+        raise result
+    return result
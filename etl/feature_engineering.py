@@ -0,0 +1,161 @@
+import duckdb
+import numpy as np
+from typing import List, Tuple
+
+from etl.feature_store import FEATURE_COLUMNS
+
+
+def _lag(column: str, hours: int) -> str:
+    # Exact-hour lag: NULL when that hour is missing, even across gaps
+    return (
+        f"MAX({column}) OVER (PARTITION BY city ORDER BY timestamp "
+        f"RANGE BETWEEN INTERVAL {hours} HOUR PRECEDING AND INTERVAL {hours} HOUR PRECEDING)"
+    )
+
+
+# Magnus-formula dew point (°C); humidity is floored at 1% to keep LN finite
+_DEW_GAMMA = "(17.27 * temperature_2m / (237.7 + temperature_2m) + LN(GREATEST(relativehumidity_2m, 1) / 100))"
+
+# Name -> SQL expression over weather_hourly; `last_24h` is a named window
+ENGINEERED_FEATURES = {
+    "temperature_2m_lag_1h": _lag("temperature_2m", 1),
+    "temperature_2m_lag_24h": _lag("temperature_2m", 24),
+    "relativehumidity_2m_lag_24h": _lag("relativehumidity_2m", 24),
+    "temperature_2m_mean_24h": "AVG(temperature_2m) OVER last_24h",
+    "relativehumidity_2m_mean_24h": "AVG(relativehumidity_2m) OVER last_24h",
+    "precipitation_sum_24h": "SUM(precipitation) OVER last_24h",
+    "dew_point_2m": f"237.7 * {_DEW_GAMMA} / (17.27 - {_DEW_GAMMA})",
+    "hour_sin": "SIN(2 * PI() * HOUR(timestamp) / 24)",
+    "hour_cos": "COS(2 * PI() * HOUR(timestamp) / 24)",
+    "doy_sin": "SIN(2 * PI() * DAYOFYEAR(timestamp) / 365.25)",
+    "doy_cos": "COS(2 * PI() * DAYOFYEAR(timestamp) / 365.25)",
+}
+
+# Rows whose features depend on a newly loaded hour lie at most this far after it
+LOOKBEHIND_HOURS = 24
+
+_WINDOW = (
+    "WINDOW last_24h AS (PARTITION BY city ORDER BY timestamp "
+    "RANGE BETWEEN INTERVAL 23 HOUR PRECEDING AND CURRENT ROW)"
+)
+
+
+def _feature_select(source: str) -> str:
+    engineered = ",\n               ".join(
+        f"CAST({expr} AS DOUBLE) AS {name}" for name, expr in ENGINEERED_FEATURES.items()
+    )
+    return f"""
+        SELECT city, timestamp,
+               {", ".join(FEATURE_COLUMNS)},
+               {engineered}
+        FROM {source}
+        {_WINDOW}
+    """
+
+
+def create_feature_table(conn: duckdb.DuckDBPyConnection):
+    """
+    Create weather_features keyed by (city, timestamp). When first created on
+    a warehouse that already has data, it is filled from weather_hourly.
+    """
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'weather_features'"
+    ).fetchone()[0]
+    if exists:
+        return
+
+    columns = ",\n            ".join(
+        [f"{col} DOUBLE" for col in FEATURE_COLUMNS]
+        + [f"{name} DOUBLE" for name in ENGINEERED_FEATURES]
+    )
+    conn.execute(f"""
+        CREATE TABLE weather_features (
+            city VARCHAR,
+            timestamp TIMESTAMP,
+            {columns},
+            PRIMARY KEY (city, timestamp)
+        )
+    """)
+    rebuild_weather_features(conn)
+
+
+def rebuild_weather_features(conn: duckdb.DuckDBPyConnection):
+    """
+    Recompute weather_features for every city from weather_hourly.
+    """
+    conn.execute("DELETE FROM weather_features")
+    conn.execute(f"""
+        INSERT INTO weather_features
+        SELECT * FROM ({_feature_select("weather_hourly WHERE city IS NOT NULL")})
+    """)
+
+
+def refresh_weather_features(conn: duckdb.DuckDBPyConnection, new_rows: str = "new_rows") -> int:
+    """
+    Incrementally refresh weather_features after a load.
+
+    For each city in `new_rows`, only rows from its earliest new timestamp
+    onwards are recomputed, reading LOOKBEHIND_HOURS of earlier history so
+    lags and rolling windows see their full context.
+
+    Returns the number of feature rows written.
+    """
+    create_feature_table(conn)
+
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE feature_refresh AS
+        SELECT city, MIN(timestamp) AS since
+        FROM {new_rows}
+        WHERE city IS NOT NULL
+        GROUP BY city
+    """)
+    conn.execute("""
+        DELETE FROM weather_features
+        WHERE EXISTS (
+            SELECT 1 FROM feature_refresh r
+            WHERE r.city = weather_features.city AND weather_features.timestamp >= r.since
+        )
+    """)
+    source = f"""(
+            SELECT h.*
+            FROM weather_hourly h
+            JOIN feature_refresh r
+              ON h.city = r.city
+             AND h.timestamp >= r.since - INTERVAL {LOOKBEHIND_HOURS} HOUR
+        )"""
+    written = conn.execute(f"""
+        INSERT INTO weather_features
+        SELECT f.*
+        FROM ({_feature_select(source)}) f
+        JOIN feature_refresh r ON f.city = r.city AND f.timestamp >= r.since
+    """).fetchone()[0]
+    conn.execute("DROP TABLE feature_refresh")
+    return written
+
+
+def get_feature_history(
+    conn: duckdb.DuckDBPyConnection, city: str, features: List[str], limit: int = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    A city's (timestamps, float32 values) for the selected features, ordered
+    by timestamp. With `limit`, only the most recent `limit` rows are read.
+    Missing lag/rolling values are NaN.
+    """
+    unknown = [f for f in features if f not in FEATURE_COLUMNS and f not in ENGINEERED_FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown features: {', '.join(unknown)}")
+
+    query = f"""
+        SELECT timestamp, {", ".join(features)}
+        FROM weather_features
+        WHERE city = ?
+        ORDER BY timestamp DESC
+        {"LIMIT ?" if limit else ""}
+    """
+    params = [city, limit] if limit else [city]
+    cols = conn.execute(f"SELECT * FROM ({query}) ORDER BY timestamp", params).fetchnumpy()
+    # Lags at the start of history or after gaps come back as masked NULLs
+    values = np.column_stack(
+        [np.ma.filled(np.ma.asarray(cols[f], dtype=np.float32), np.nan) for f in features]
+    ).reshape(-1, len(features))
+    return np.asarray(cols["timestamp"]), values
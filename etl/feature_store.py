@@ -0,0 +1,298 @@
+import duckdb
+import numpy as np
+from typing import List, Tuple
+
+# Numeric weather_hourly columns tracked in feature_stats
+FEATURE_COLUMNS = ["temperature_2m", "relativehumidity_2m", "precipitation"]
+
+
+def _scaled_expr(feature: str, alias: str) -> str:
+    # Same convention as MinMaxScaler: a constant feature keeps unit scale
+    return (
+        f"CAST(CASE WHEN {alias}.max_value > {alias}.min_value "
+        f"THEN (h.{feature} - {alias}.min_value) / ({alias}.max_value - {alias}.min_value) "
+        f"ELSE h.{feature} - {alias}.min_value END AS FLOAT) AS {feature}"
+    )
+
+
+def create_feature_store(conn: duckdb.DuckDBPyConnection):
+    """
+    Create the feature_stats table and the weather_hourly_scaled view.
+
+    feature_stats holds mergeable per-city aggregates (count, min, max, sum,
+    sum of squares) so the loader can fold each batch in without rescanning
+    history. When the table is first created on a warehouse that already has
+    data, it is seeded from weather_hourly.
+    """
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'feature_stats'"
+    ).fetchone()[0]
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS feature_stats (
+            city VARCHAR,
+            feature VARCHAR,
+            n BIGINT,
+            min_value DOUBLE,
+            max_value DOUBLE,
+            sum_value DOUBLE,
+            sum_sq DOUBLE,
+            PRIMARY KEY (city, feature)
+        )
+    """)
+
+    joins = "\n".join(
+        f"JOIN feature_stats s{i} ON s{i}.city = h.city AND s{i}.feature = '{feat}'"
+        for i, feat in enumerate(FEATURE_COLUMNS)
+    )
+    columns = ",\n               ".join(
+        _scaled_expr(feat, f"s{i}") for i, feat in enumerate(FEATURE_COLUMNS)
+    )
+    conn.execute(f"""
+        CREATE OR REPLACE VIEW weather_hourly_scaled AS
+        SELECT h.city, h.timestamp,
+               {columns}
+        FROM weather_hourly h
+        {joins}
+    """)
+
+    conn.execute("""
+        CREATE OR REPLACE VIEW feature_stats_summary AS
+        SELECT city, feature, n, min_value, max_value,
+               sum_value / n AS mean_value,
+               SQRT(GREATEST(sum_sq / n - (sum_value / n) * (sum_value / n), 0)) AS std_value
+        FROM feature_stats
+    """)
+
+    if not exists:
+        update_feature_stats(conn, "weather_hourly")
+
+
+def update_feature_stats(conn: duckdb.DuckDBPyConnection, new_rows: str = "new_rows"):
+    """
+    Merge the aggregates of a batch of rows into feature_stats.
+    """
+    batch = " UNION ALL ".join(
+        f"""
+        SELECT city, '{feat}' AS feature, COUNT({feat}) AS n,
+               MIN({feat}) AS min_value, MAX({feat}) AS max_value,
+               SUM({feat}) AS sum_value, SUM({feat} * {feat}) AS sum_sq
+        FROM {new_rows}
+        WHERE city IS NOT NULL AND {feat} IS NOT NULL
+        GROUP BY city
+        """
+        for feat in FEATURE_COLUMNS
+    )
+    conn.execute(f"""
+        INSERT INTO feature_stats
+        SELECT * FROM ({batch})
+        ON CONFLICT (city, feature) DO UPDATE SET
+            n = feature_stats.n + EXCLUDED.n,
+            min_value = LEAST(feature_stats.min_value, EXCLUDED.min_value),
+            max_value = GREATEST(feature_stats.max_value, EXCLUDED.max_value),
+            sum_value = feature_stats.sum_value + EXCLUDED.sum_value,
+            sum_sq = feature_stats.sum_sq + EXCLUDED.sum_sq
+    """)
+
+
+def retract_feature_stats(conn: duckdb.DuckDBPyConnection, old_rows: str = "old_rows"):
+    """
+    Take the count, sum and sum of squares of rows about to be overwritten
+    back out of feature_stats. Minimum and maximum cannot be retracted, so
+    they keep covering the replaced values.
+    """
+    batch = " UNION ALL ".join(
+        f"""
+        SELECT city, '{feat}' AS feature, COUNT({feat}) AS n,
+               SUM({feat}) AS sum_value, SUM({feat} * {feat}) AS sum_sq
+        FROM {old_rows}
+        WHERE city IS NOT NULL AND {feat} IS NOT NULL
+        GROUP BY city
+        """
+        for feat in FEATURE_COLUMNS
+    )
+    conn.execute(f"""
+        UPDATE feature_stats SET
+            n = feature_stats.n - o.n,
+            sum_value = feature_stats.sum_value - o.sum_value,
+            sum_sq = feature_stats.sum_sq - o.sum_sq
+        FROM ({batch}) o
+        WHERE feature_stats.city = o.city AND feature_stats.feature = o.feature
+    """)
+
+
+def rebuild_feature_stats(conn: duckdb.DuckDBPyConnection):
+    """
+    Recompute feature_stats from scratch (e.g. after backfill_city assigns
+    cities to rows that were loaded without one).
+    """
+    create_feature_store(conn)
+    conn.execute("DELETE FROM feature_stats")
+    update_feature_stats(conn, "weather_hourly")
+
+
+def get_scaling_params(
+    conn: duckdb.DuckDBPyConnection,
+    city: str,
+    features: List[str] = FEATURE_COLUMNS,
+    end=None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-feature (min, max) arrays for a city, in `features` order.
+
+    With `end`, the ranges cover only rows before that timestamp (a model's
+    training split) and are computed from weather_hourly rather than the
+    full-history feature_stats.
+    """
+    if end is None:
+        rows = dict(
+            (feature, (lo, hi))
+            for feature, lo, hi in conn.execute(
+                "SELECT feature, min_value, max_value FROM feature_stats WHERE city = ?",
+                [city],
+            ).fetchall()
+        )
+    else:
+        ranges = conn.execute(
+            f"""
+            SELECT {", ".join(f"MIN({f}), MAX({f})" for f in features)}
+            FROM weather_hourly
+            WHERE city = ? AND timestamp < ?
+            """,
+            [city, end],
+        ).fetchone()
+        rows = {
+            f: (ranges[2 * i], ranges[2 * i + 1])
+            for i, f in enumerate(features)
+            if ranges[2 * i] is not None
+        }
+    missing = [f for f in features if f not in rows]
+    if missing:
+        raise ValueError(f"No feature statistics for {city}: {', '.join(missing)}")
+    data_min = np.array([rows[f][0] for f in features], dtype=np.float32)
+    data_max = np.array([rows[f][1] for f in features], dtype=np.float32)
+    return data_min, data_max
+
+
+def record_model_scaling(
+    conn: duckdb.DuckDBPyConnection,
+    model_version: str,
+    city: str,
+    features: List[str],
+    data_min,
+    data_max,
+):
+    """
+    Store the normalization ranges a model version was trained with, one
+    row per feature, next to the full-history feature_stats.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS model_scaling (
+            model_version VARCHAR,
+            city VARCHAR,
+            feature VARCHAR,
+            min_value DOUBLE,
+            max_value DOUBLE,
+            PRIMARY KEY (model_version, city, feature)
+        )
+    """)
+    conn.executemany(
+        "INSERT OR REPLACE INTO model_scaling VALUES (?, ?, ?, ?, ?)",
+        [
+            [model_version, city, feature, float(lo), float(hi)]
+            for feature, lo, hi in zip(features, data_min, data_max)
+        ],
+    )
+
+
+def scaled_series_query(
+    features: List[str] = FEATURE_COLUMNS,
+    max_gap_hours: int = 0,
+    source: str = "weather_hourly_scaled",
+) -> str:
+    """
+    SQL (one `city` parameter) for a city's normalized series ordered by
+    timestamp. With `source` "weather_hourly" the same series is returned
+    unnormalized.
+
+    With max_gap_hours > 0, duplicate timestamps are averaged and runs of at
+    most that many missing hours are filled by linear interpolation between
+    the surrounding observations. Longer gaps are left as gaps.
+    """
+    if max_gap_hours <= 0:
+        return f"""
+            SELECT timestamp, {", ".join(features)}
+            FROM {source}
+            WHERE city = ?
+            ORDER BY timestamp
+        """
+
+    averaged = ", ".join(f"AVG({f}) AS {f}" for f in features)
+    neighbours = ",\n                   ".join(
+        f"LAST_VALUE({f} IGNORE NULLS) OVER back AS {f}_prev, "
+        f"FIRST_VALUE({f} IGNORE NULLS) OVER fwd AS {f}_next"
+        for f in features
+    )
+    filled = ",\n               ".join(
+        f"CAST(CASE WHEN obs_ts IS NOT NULL THEN {f} "
+        f"ELSE {f}_prev + ({f}_next - {f}_prev) * frac END AS FLOAT) AS {f}"
+        for f in features
+    )
+    return f"""
+        WITH obs AS (
+            SELECT timestamp, {averaged}
+            FROM {source}
+            WHERE city = ?
+            GROUP BY timestamp
+        ),
+        grid AS (
+            SELECT UNNEST(generate_series(MIN(timestamp), MAX(timestamp), INTERVAL 1 HOUR)) AS timestamp
+            FROM obs
+        ),
+        neighbours AS (
+            SELECT g.timestamp, o.timestamp AS obs_ts, o.* EXCLUDE (timestamp),
+                   MAX(o.timestamp) OVER back AS prev_ts,
+                   MIN(o.timestamp) OVER fwd AS next_ts,
+                   {neighbours}
+            FROM grid g
+            LEFT JOIN obs o ON o.timestamp = g.timestamp
+            WINDOW back AS (ORDER BY g.timestamp ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW),
+                   fwd AS (ORDER BY g.timestamp ROWS BETWEEN CURRENT ROW AND UNBOUNDED FOLLOWING)
+        ),
+        weighted AS (
+            SELECT *,
+                   date_diff('second', prev_ts, timestamp)
+                   / date_diff('second', prev_ts, next_ts) AS frac
+            FROM neighbours
+            WHERE obs_ts IS NOT NULL
+               OR date_diff('hour', prev_ts, next_ts) <= {int(max_gap_hours) + 1}
+        )
+        SELECT timestamp,
+               {filled}
+        FROM weighted
+        ORDER BY timestamp
+    """
+
+
+def get_scaled_series(
+    conn: duckdb.DuckDBPyConnection,
+    city: str,
+    features: List[str] = FEATURE_COLUMNS,
+    max_gap_hours: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    A city's min/max-normalized history as (timestamps, float32 values);
+    missing values are NaN.
+
+    Values come straight from the weather_hourly_scaled view as NumPy
+    columns, with no pandas or sklearn step in between. See
+    scaled_series_query for `max_gap_hours`.
+    """
+    cols = conn.execute(
+        scaled_series_query(features, max_gap_hours), [city]
+    ).fetchnumpy()
+    # NULLs come back masked; keep them as NaN rather than the mask's fill value
+    values = np.column_stack(
+        [np.ma.filled(np.ma.asarray(cols[f], dtype=np.float32), np.nan) for f in features]
+    )
+    return np.asarray(cols["timestamp"]), values.reshape(-1, len(features))
@@ -0,0 +1,126 @@
+import duckdb
+import numpy as np
+import pandas as pd # type: ignore
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from etl.feature_store import FEATURE_COLUMNS
+from etl.load import create_weather_table
+
+
+def create_payload_ledger(conn: duckdb.DuckDBPyConnection):
+    """
+    Create payload_ledger: the fingerprint of the last payload loaded per city.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS payload_ledger (
+            city VARCHAR PRIMARY KEY,
+            payload_hash VARCHAR,
+            generation_time_ms DOUBLE,
+            first_timestamp TIMESTAMP,
+            last_timestamp TIMESTAMP,
+            rows_loaded BIGINT,
+            loaded_at TIMESTAMP
+        )
+        """
+    )
+
+
+def record_payload(
+    conn: duckdb.DuckDBPyConnection,
+    city: str,
+    fingerprint: str,
+    df: pd.DataFrame,
+    rows_loaded: int,
+    generation_time_ms: Optional[float] = None,
+):
+    """
+    Store the fingerprint of the payload just processed for a city (its
+    etl.extract.payload_hash, the same hash the response cache compares).
+    """
+    create_payload_ledger(conn)
+    conn.execute(
+        """
+        INSERT INTO payload_ledger VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (city) DO UPDATE SET
+            payload_hash = EXCLUDED.payload_hash,
+            generation_time_ms = EXCLUDED.generation_time_ms,
+            first_timestamp = EXCLUDED.first_timestamp,
+            last_timestamp = EXCLUDED.last_timestamp,
+            rows_loaded = EXCLUDED.rows_loaded,
+            loaded_at = EXCLUDED.loaded_at
+        """,
+        [
+            city,
+            fingerprint,
+            generation_time_ms,
+            df["timestamp"].min() if not df.empty else None,
+            df["timestamp"].max() if not df.empty else None,
+            rows_loaded,
+            datetime.now(timezone.utc).replace(tzinfo=None),
+        ],
+    )
+
+
+def last_payload_hash(conn: duckdb.DuckDBPyConnection, city: str) -> Optional[str]:
+    """
+    Fingerprint of the last payload recorded for a city, or None if none has
+    been loaded. The pipeline compares it before transforming a new payload.
+    """
+    create_payload_ledger(conn)
+    row = conn.execute("SELECT payload_hash FROM payload_ledger WHERE city = ?", [city]).fetchone()
+    return row[0] if row else None
+
+
+def diff_against_warehouse(
+    conn: duckdb.DuckDBPyConnection, df: pd.DataFrame, columns: Optional[List[str]] = None
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Split a transformed batch for one location against what weather_hourly
+    already holds for the same hours.
+
+    Returns (changed_rows, revised) where changed_rows are the hours not yet
+    in the warehouse plus already-loaded hours whose values differ in any of
+    `columns` (FEATURE_COLUMNS by default), and revised counts the latter.
+    Unchanged hours are dropped, so only changed_rows need to reach Parquet
+    and the loader (upsert_weather_data with revise=True).
+    """
+    if df.empty:
+        return df, 0
+
+    create_weather_table(conn)
+    columns = columns or FEATURE_COLUMNS
+    first = df.iloc[0]
+    location = conn.execute(
+        """
+        SELECT location_id FROM locations
+        WHERE city IS NOT DISTINCT FROM ? AND latitude = ? AND longitude = ?
+        """,
+        [first["city"], first["latitude"], first["longitude"]],
+    ).fetchone()
+    if location is None:
+        return df, 0
+
+    # Keyed on the fact table's (location_id, timestamp) primary key
+    existing = conn.execute(
+        f"""
+        SELECT timestamp, {", ".join(columns)}
+        FROM weather_hourly_facts
+        WHERE location_id = ? AND timestamp BETWEEN ? AND ?
+        """,
+        [location[0], df["timestamp"].min(), df["timestamp"].max()],
+    ).fetchdf()
+    if existing.empty:
+        return df, 0
+
+    existing = existing.set_index("timestamp")
+    loaded = df["timestamp"].isin(existing.index).to_numpy()
+
+    batch_values = df.loc[loaded, columns].to_numpy(dtype=float)
+    loaded_values = existing.loc[df.loc[loaded, "timestamp"], columns].to_numpy(dtype=float)
+    differs = ~np.isclose(batch_values, loaded_values, equal_nan=True).all(axis=1)
+
+    changed = ~loaded
+    changed[loaded] = differs
+    return df.loc[changed].reset_index(drop=True), int(differs.sum())
@@ -1,72 +1,720 @@
 import duckdb
 import pandas as pd # type: ignore
 import os 
-from typing import List, Dict
+from datetime import datetime, timezone
+from typing import List, Dict, Optional
+
+from etl.feature_engineering import refresh_weather_features
+from etl.feature_store import create_feature_store, retract_feature_stats, update_feature_stats
+from etl.locations import (
+    DEFAULT_TOLERANCE_KM,
+    build_location_index,
+    canonical_locations,
+    create_locations_table,
+    ensure_locations,
+    record_location_aliases,
+    register_locations,
+    resolve_cities,
+)
+from etl.variables import add_variable_columns, configured_variables, table_columns, variable_names
 
 def connect_duckdb(db_path: str = "data/warehouse/weather.duckdb") -> duckdb.DuckDBPyConnection:
 
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     return duckdb.connect(db_path)
 
-def create_weather_table(conn: duckdb.DuckDBPyConnection):
-
-    query = """
-    CREATE TABLE IF NOT EXISTS weather_hourly (
-        city VARCHAR,
-        timestamp TIMESTAMP,
-        temperature_2m DOUBLE,
-        relativehumidity_2m DOUBLE,
-        precipitation DOUBLE,
-        latitude DOUBLE,
-        longitude DOUBLE,
-        load_date DATE
-        ); 
-        """
-    conn.execute(query)
-    columns = {row[1] for row in conn.execute("PRAGMA table_info('weather_hourly')").fetchall()}
+# weather_hourly_facts columns that are not hourly variables
+FACT_KEY_COLUMNS = ["location_id", "timestamp", "load_date"]
+
+def create_weather_table(conn: duckdb.DuckDBPyConnection, variables: Optional[List[dict]] = None):
+    """
+    Create the hourly fact table keyed on (location_id, timestamp) and the
+    `weather_hourly` view that joins it with the locations dimension, so
+    readers still see city, latitude and longitude on every row.
+
+    The fact table has one column per registered variable (see
+    etl.variables); variables added to the registry are added as columns
+    and the view is regenerated. A `weather_hourly` base table from before
+    the dimension is migrated in place (see migrate_weather_hourly).
+    """
+    variables = variables or configured_variables()
+    create_locations_table(conn)
+    existing = conn.execute(
+        "SELECT table_type FROM information_schema.tables WHERE table_name = 'weather_hourly'"
+    ).fetchone()
+
+    variable_defs = ",\n            ".join(f"{name} DOUBLE" for name in variable_names(variables))
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS weather_hourly_facts (
+            location_id INTEGER,
+            timestamp TIMESTAMP,
+            {variable_defs},
+            load_date DATE,
+            PRIMARY KEY (location_id, timestamp)
+        )
+        """
+    )
+    added = add_variable_columns(conn, "weather_hourly_facts", variables)
+    if existing is not None and existing[0] == "BASE TABLE":
+        migrate_weather_hourly(conn)
+
+    if added or existing is None or existing[0] == "BASE TABLE":
+        values = "".join(f"f.{name}, " for name in fact_value_columns(conn))
+        conn.execute(
+            f"""
+            CREATE OR REPLACE VIEW weather_hourly AS
+            SELECT l.city, f.timestamp, {values}
+                   l.latitude, l.longitude, f.load_date, f.location_id
+            FROM weather_hourly_facts f
+            JOIN locations l ON l.location_id = f.location_id
+            """
+        )
+
+def fact_value_columns(conn: duckdb.DuckDBPyConnection) -> List[str]:
+    """Variable columns of weather_hourly_facts, in table order."""
+    return [c for c in table_columns(conn, "weather_hourly_facts") if c not in FACT_KEY_COLUMNS]
+
+def migrate_weather_hourly(conn: duckdb.DuckDBPyConnection):
+    """
+    Move rows of a pre-dimension `weather_hourly` table into
+    weather_hourly_facts and drop the table.
+
+    Each distinct (city, latitude, longitude) becomes a location; duplicate
+    (location, hour) rows keep the first one loaded, as the loader always did.
+    Rerunning after an interrupted migration is safe.
+    """
+    columns = table_columns(conn, "weather_hourly")
     if "city" not in columns:
         conn.execute("ALTER TABLE weather_hourly ADD COLUMN city VARCHAR")
 
-def upsert_weather_data(conn: duckdb.DuckDBPyConnection, df: pd.DataFrame):
+    ensure_locations(
+        conn, conn.execute("SELECT DISTINCT city, latitude, longitude FROM weather_hourly").fetchdf()
+    )
 
-    # CREATE TABLE
-    create_weather_table(conn)
+    values = [c for c in fact_value_columns(conn) if c in columns]
+    conn.execute(
+        f"""
+        INSERT INTO weather_hourly_facts (location_id, timestamp, {", ".join(values)}, load_date)
+        SELECT l.location_id, w.timestamp, {", ".join(f"w.{c}" for c in values)}, w.load_date
+        FROM weather_hourly w
+        JOIN locations l
+          ON l.city IS NOT DISTINCT FROM w.city
+         AND l.latitude IS NOT DISTINCT FROM w.latitude
+         AND l.longitude IS NOT DISTINCT FROM w.longitude
+        WHERE w.timestamp IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY l.location_id, w.timestamp ORDER BY w.rowid) = 1
+        ON CONFLICT DO NOTHING
+        """
+    )
+    conn.execute("DROP TABLE weather_hourly")
+
+def create_data_versions_table(conn: duckdb.DuckDBPyConnection):
+
+    # Monotonic per-city counter, bumped whenever a city's rows change
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            city VARCHAR PRIMARY KEY,
+            version BIGINT,
+            updated_at TIMESTAMP
+        )
+        """
+    )
+
+def bump_data_versions(conn: duckdb.DuckDBPyConnection, new_rows: str = "new_rows"):
+    """
+    Increment the data version of every city in `new_rows`, so readers that
+    cache per-city results know exactly which entries are stale.
+    """
+    create_data_versions_table(conn)
+    conn.execute(f"""
+        INSERT INTO data_versions
+        SELECT DISTINCT city, 1, CAST(now() AS TIMESTAMP)
+        FROM {new_rows}
+        WHERE city IS NOT NULL
+        ON CONFLICT (city) DO UPDATE SET
+            version = data_versions.version + 1,
+            updated_at = EXCLUDED.updated_at
+    """)
+
+FORECAST_KEY_COLUMNS = ["city", "forecast_timestamp", "target_timestamp", "model_version"]
+
+def create_model_tables(conn: duckdb.DuckDBPyConnection):
+
+    # One row per (issue, target hour, model); reissuing the same forecast is a no-op
+    existing = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'weather_forecasts'"
+    ).fetchone()[0]
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS weather_forecasts (
+            city VARCHAR,
+            forecast_timestamp TIMESTAMP,
+            target_timestamp TIMESTAMP,
+            horizon_hours INTEGER,
+            temperature_2m DOUBLE,
+            relativehumidity_2m DOUBLE,
+            precipitation DOUBLE,
+            model_version VARCHAR,
+            PRIMARY KEY ({", ".join(FORECAST_KEY_COLUMNS)})
+        )
+        """
+    )
+    if existing:
+        migrate_weather_forecasts(conn)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS model_metrics (
+            city VARCHAR,
+            horizon INTEGER,
+            trained_at TIMESTAMP,
+            mae_temp DOUBLE,
+            rmse_temp DOUBLE,
+            mae_humidity DOUBLE,
+            rmse_humidity DOUBLE,
+            mae_precip DOUBLE,
+            rmse_precip DOUBLE
+        )
+        """
+    )
+
+def migrate_weather_forecasts(conn: duckdb.DuckDBPyConnection):
+    """
+    Add the primary key to a weather_forecasts table created without one.
+
+    Repeated issues of the same forecast keep the first one stored; rows
+    with a NULL key could never be matched to a model and are dropped.
+    """
+    has_key = conn.execute(
+        """
+        SELECT COUNT(*) FROM duckdb_constraints()
+        WHERE table_name = 'weather_forecasts' AND constraint_type = 'PRIMARY KEY'
+        """
+    ).fetchone()[0]
+    if has_key:
+        return
+
+    key = ", ".join(FORECAST_KEY_COLUMNS)
+    conn.execute(
+        f"""
+        DELETE FROM weather_forecasts
+        WHERE {" OR ".join(f"{c} IS NULL" for c in FORECAST_KEY_COLUMNS)}
+           OR rowid NOT IN (SELECT MIN(rowid) FROM weather_forecasts GROUP BY {key})
+        """
+    )
+    conn.execute(f"ALTER TABLE weather_forecasts ADD PRIMARY KEY ({key})")
+
+def create_verification_tables(conn: duckdb.DuckDBPyConnection):
+
+    create_model_tables(conn)
+    # One row per (issued forecast, target hour) once the actual has arrived
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS forecast_verification (
+            city VARCHAR,
+            model_version VARCHAR,
+            horizon_hours INTEGER,
+            lead_hours INTEGER,
+            forecast_timestamp TIMESTAMP,
+            target_timestamp TIMESTAMP,
+            error_temperature_2m DOUBLE,
+            error_relativehumidity_2m DOUBLE,
+            error_precipitation DOUBLE
+        )
+        """
+    )
+    # Mergeable running sums so skill is a lookup, not a scan of verification rows
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS forecast_skill (
+            city VARCHAR,
+            model_version VARCHAR,
+            horizon_hours INTEGER,
+            lead_hours INTEGER,
+            n BIGINT,
+            sum_abs_temperature_2m DOUBLE,
+            sum_sq_temperature_2m DOUBLE,
+            sum_abs_relativehumidity_2m DOUBLE,
+            sum_sq_relativehumidity_2m DOUBLE,
+            sum_abs_precipitation DOUBLE,
+            sum_sq_precipitation DOUBLE,
+            PRIMARY KEY (city, model_version, horizon_hours, lead_hours)
+        )
+        """
+    )
+
+def update_forecast_verification(conn: duckdb.DuckDBPyConnection, new_rows: str = "new_rows") -> int:
+    """
+    Score issued forecasts against newly arrived actuals.
+
+    Only the rows in `new_rows` (the batch just written to weather_hourly,
+    including revised hours whose old scores were retracted) are joined against weather_forecasts, so the cost scales with the batch,
+    not with the size of either table.
+    """
+    create_verification_tables(conn)
+
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE verified_batch AS
+        SELECT f.city,
+               f.model_version,
+               f.horizon_hours,
+               CAST(date_diff('hour', f.forecast_timestamp, f.target_timestamp) AS INTEGER) AS lead_hours,
+               f.forecast_timestamp,
+               f.target_timestamp,
+               f.temperature_2m - n.temperature_2m AS error_temperature_2m,
+               f.relativehumidity_2m - n.relativehumidity_2m AS error_relativehumidity_2m,
+               f.precipitation - n.precipitation AS error_precipitation
+        FROM {new_rows} n
+        JOIN weather_forecasts f
+          ON f.city = n.city AND f.target_timestamp = n.timestamp
+    """)
+
+    verified = conn.execute("INSERT INTO forecast_verification SELECT * FROM verified_batch").fetchone()[0]
+
+    conn.execute("""
+        INSERT INTO forecast_skill
+        SELECT city, model_version, horizon_hours, lead_hours,
+               COUNT(*),
+               SUM(ABS(error_temperature_2m)), SUM(error_temperature_2m * error_temperature_2m),
+               SUM(ABS(error_relativehumidity_2m)), SUM(error_relativehumidity_2m * error_relativehumidity_2m),
+               SUM(ABS(error_precipitation)), SUM(error_precipitation * error_precipitation)
+        FROM verified_batch
+        GROUP BY city, model_version, horizon_hours, lead_hours
+        ON CONFLICT (city, model_version, horizon_hours, lead_hours) DO UPDATE SET
+            n = forecast_skill.n + EXCLUDED.n,
+            sum_abs_temperature_2m = forecast_skill.sum_abs_temperature_2m + EXCLUDED.sum_abs_temperature_2m,
+            sum_sq_temperature_2m = forecast_skill.sum_sq_temperature_2m + EXCLUDED.sum_sq_temperature_2m,
+            sum_abs_relativehumidity_2m = forecast_skill.sum_abs_relativehumidity_2m + EXCLUDED.sum_abs_relativehumidity_2m,
+            sum_sq_relativehumidity_2m = forecast_skill.sum_sq_relativehumidity_2m + EXCLUDED.sum_sq_relativehumidity_2m,
+            sum_abs_precipitation = forecast_skill.sum_abs_precipitation + EXCLUDED.sum_abs_precipitation,
+            sum_sq_precipitation = forecast_skill.sum_sq_precipitation + EXCLUDED.sum_sq_precipitation
+    """)
+    conn.execute("DROP TABLE verified_batch")
+
+    return verified
+
+def retract_forecast_verification(conn: duckdb.DuckDBPyConnection, revised_rows: str = "revised_rows") -> int:
+    """
+    Take the scores of hours whose actuals are about to be overwritten out of
+    forecast_verification and the forecast_skill sums, so that
+    update_forecast_verification scores them again against the revised values.
+    """
+    create_verification_tables(conn)
+    conn.execute(f"""
+        UPDATE forecast_skill SET
+            n = forecast_skill.n - o.n,
+            sum_abs_temperature_2m = forecast_skill.sum_abs_temperature_2m - o.sum_abs_temperature_2m,
+            sum_sq_temperature_2m = forecast_skill.sum_sq_temperature_2m - o.sum_sq_temperature_2m,
+            sum_abs_relativehumidity_2m = forecast_skill.sum_abs_relativehumidity_2m - o.sum_abs_relativehumidity_2m,
+            sum_sq_relativehumidity_2m = forecast_skill.sum_sq_relativehumidity_2m - o.sum_sq_relativehumidity_2m,
+            sum_abs_precipitation = forecast_skill.sum_abs_precipitation - o.sum_abs_precipitation,
+            sum_sq_precipitation = forecast_skill.sum_sq_precipitation - o.sum_sq_precipitation
+        FROM (
+            SELECT v.city, v.model_version, v.horizon_hours, v.lead_hours,
+                   COUNT(*) AS n,
+                   COALESCE(SUM(ABS(error_temperature_2m)), 0) AS sum_abs_temperature_2m,
+                   COALESCE(SUM(error_temperature_2m * error_temperature_2m), 0) AS sum_sq_temperature_2m,
+                   COALESCE(SUM(ABS(error_relativehumidity_2m)), 0) AS sum_abs_relativehumidity_2m,
+                   COALESCE(SUM(error_relativehumidity_2m * error_relativehumidity_2m), 0) AS sum_sq_relativehumidity_2m,
+                   COALESCE(SUM(ABS(error_precipitation)), 0) AS sum_abs_precipitation,
+                   COALESCE(SUM(error_precipitation * error_precipitation), 0) AS sum_sq_precipitation
+            FROM forecast_verification v
+            JOIN {revised_rows} r ON v.city = r.city AND v.target_timestamp = r.timestamp
+            GROUP BY v.city, v.model_version, v.horizon_hours, v.lead_hours
+        ) o
+        WHERE forecast_skill.city = o.city AND forecast_skill.model_version = o.model_version
+          AND forecast_skill.horizon_hours = o.horizon_hours AND forecast_skill.lead_hours = o.lead_hours
+    """)
+    return conn.execute(f"""
+        DELETE FROM forecast_verification v
+        USING {revised_rows} r
+        WHERE v.city = r.city AND v.target_timestamp = r.timestamp
+    """).fetchone()[0]
+
+# Columns of the revision tables that are not hourly variables
+REVISION_KEY_COLUMNS = ["location_id", "timestamp", "issued_at", "revision_count"]
+
+def create_revision_tables(conn: duckdb.DuckDBPyConnection, variables: Optional[List[dict]] = None):
+    """
+    Create the revision tables, keyed on location_id like weather_hourly_facts,
+    and the `weather_hourly_current` view that readers of current values use.
+
+    Revision tables from before the location key (keyed on city, latitude and
+    longitude) are migrated in place.
+    """
+    variables = variables or configured_variables()
+    create_weather_table(conn, variables)
+    legacy = "city" in table_columns(conn, "weather_revisions")
+    if legacy:
+        conn.execute("ALTER TABLE weather_revisions RENAME TO weather_revisions_legacy")
+        conn.execute("DROP TABLE weather_hourly_latest")
+
+    variable_defs = ",\n            ".join(f"{name} DOUBLE" for name in variable_names(variables))
+    # Append-only: one row per issued value of an hour that differs from the previous issue
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS weather_revisions (
+            location_id INTEGER,
+            timestamp TIMESTAMP,
+            issued_at TIMESTAMP,
+            {variable_defs}
+        )
+        """
+    )
+    # Latest revision per hour, kept current by the loader so reads stay keyed lookups
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS weather_hourly_latest (
+            location_id INTEGER,
+            timestamp TIMESTAMP,
+            issued_at TIMESTAMP,
+            {variable_defs},
+            revision_count INTEGER,
+            PRIMARY KEY (location_id, timestamp)
+        )
+        """
+    )
+    add_variable_columns(conn, "weather_revisions", variables)
+    add_variable_columns(conn, "weather_hourly_latest", variables)
+    if legacy:
+        migrate_weather_revisions(conn)
+
+    # weather_hourly with each hour's values taken from its latest revision, if any
+    revised = set(table_columns(conn, "weather_hourly_latest"))
+    values = "".join(
+        f"CASE WHEN r.location_id IS NULL THEN h.{c} ELSE r.{c} END AS {c}, " if c in revised else f"h.{c}, "
+        for c in fact_value_columns(conn)
+    )
+    conn.execute(
+        f"""
+        CREATE OR REPLACE VIEW weather_hourly_current AS
+        SELECT h.city, h.timestamp, {values}
+               h.latitude, h.longitude, h.load_date, h.location_id
+        FROM weather_hourly h
+        LEFT JOIN weather_hourly_latest r
+          ON r.location_id = h.location_id AND r.timestamp = h.timestamp
+        """
+    )
+
+def migrate_weather_revisions(conn: duckdb.DuckDBPyConnection):
+    """
+    Move revisions keyed on (city, latitude, longitude) into the location-keyed
+    weather_revisions and rebuild weather_hourly_latest from them.
+    """
+    ensure_locations(
+        conn,
+        conn.execute(
+            "SELECT DISTINCT city, latitude, longitude FROM weather_revisions_legacy"
+        ).fetchdf(),
+    )
+    values = [c for c in table_columns(conn, "weather_revisions") if c not in REVISION_KEY_COLUMNS]
+    legacy = set(table_columns(conn, "weather_revisions_legacy"))
+    source = ", ".join(f"w.{c}" if c in legacy else "NULL" for c in values)
+    columns = ", ".join(values)
+    conn.execute(
+        f"""
+        INSERT INTO weather_revisions (location_id, timestamp, issued_at, {columns})
+        SELECT l.location_id, w.timestamp, w.issued_at, {source}
+        FROM weather_revisions_legacy w
+        JOIN locations l
+          ON l.city IS NOT DISTINCT FROM w.city
+         AND l.latitude IS NOT DISTINCT FROM w.latitude
+         AND l.longitude IS NOT DISTINCT FROM w.longitude
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO weather_hourly_latest (location_id, timestamp, issued_at, {columns}, revision_count)
+        SELECT location_id, timestamp, arg_max(issued_at, issued_at),
+               {", ".join(f"arg_max({c}, issued_at)" for c in values)}, COUNT(*)
+        FROM weather_revisions
+        GROUP BY location_id, timestamp
+        """
+    )
+    conn.execute("DROP TABLE weather_revisions_legacy")
+
+def append_weather_revisions(
+    conn: duckdb.DuckDBPyConnection,
+    df: pd.DataFrame,
+    issued_at: Optional[datetime] = None,
+    variables: Optional[List[dict]] = None,
+) -> int:
+    """
+    Record the values a payload issued at `issued_at` (now by default) gives
+    for each hour in `df`.
+
+    Only hours that are new or whose values differ from their latest revision
+    are appended to weather_revisions, so re-issuing an unchanged forecast
+    costs nothing. weather_hourly_latest is updated from the same rows unless
+    it already holds a later issue. Rows without a city are skipped.
+
+    Returns the number of revisions appended.
+    """
+    create_revision_tables(conn, variables)
+    if issued_at is None:
+        issued_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    names = [c for c in table_columns(conn, "weather_revisions") if c in df.columns and c not in REVISION_KEY_COLUMNS]
+    columns = ", ".join(names)
+    changed = "\n           OR ".join(f"b.{c} IS DISTINCT FROM r.{c}" for c in names)
+
+    conn.register("revision_df", df)
+    ensure_locations(
+        conn,
+        conn.execute(
+            "SELECT DISTINCT CAST(city AS VARCHAR) AS city, latitude, longitude FROM revision_df WHERE city IS NOT NULL"
+        ).fetchdf(),
+    )
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE revision_batch AS
+        SELECT b.location_id, b.timestamp, CAST(? AS TIMESTAMP) AS issued_at,
+               {", ".join(f"b.{c}" for c in names)}
+        FROM (
+            SELECT l.location_id, d.*
+            FROM revision_df d
+            JOIN locations l
+              ON l.city = CAST(d.city AS VARCHAR)
+             AND l.latitude IS NOT DISTINCT FROM d.latitude
+             AND l.longitude IS NOT DISTINCT FROM d.longitude
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY l.location_id, d.timestamp) = 1
+        ) b
+        LEFT JOIN weather_hourly_latest r
+          ON r.location_id = b.location_id AND r.timestamp = b.timestamp
+        WHERE r.timestamp IS NULL
+           OR {changed}
+    """, [issued_at])
+    conn.unregister("revision_df")
+
+    appended = conn.execute(f"""
+        INSERT INTO weather_revisions (location_id, timestamp, issued_at, {columns})
+        SELECT location_id, timestamp, issued_at, {columns} FROM revision_batch
+    """).fetchone()[0]
+    updates = "".join(f"{c} = EXCLUDED.{c},\n            " for c in names)
+    conn.execute(f"""
+        INSERT INTO weather_hourly_latest
+            (location_id, timestamp, issued_at, {columns}, revision_count)
+        SELECT location_id, timestamp, issued_at, {columns}, 1 FROM revision_batch
+        ON CONFLICT (location_id, timestamp) DO UPDATE SET
+            issued_at = EXCLUDED.issued_at,
+            {updates}revision_count = weather_hourly_latest.revision_count + 1
+        WHERE EXCLUDED.issued_at >= weather_hourly_latest.issued_at
+    """)
+    conn.execute("DROP TABLE revision_batch")
+
+    return appended
+
+def upsert_weather_data(
+    conn: duckdb.DuckDBPyConnection,
+    df: pd.DataFrame,
+    variables: Optional[List[dict]] = None,
+    revise: bool = False,
+):
+    """
+    Load a batch into weather_hourly_facts, deduplicated on (location_id, timestamp).
+
+    Rows without a city take the nearest known location's within
+    DEFAULT_TOLERANCE_KM (see etl.locations.resolve_cities) and load under
+    that city's canonical location; the rest stay unattributed until
+    backfill_city. By default the first value loaded for an hour wins. With `revise`, hours
+    already loaded whose values differ are overwritten with the batch's
+    values; feature statistics, engineered features and data versions follow
+    the revision, while forecasts are only scored against newly arrived hours.
+    """
+
+    # CREATE TABLE (adding columns for newly registered variables)
+    create_weather_table(conn, variables)
+    create_feature_store(conn)
+    # Every variable column the batch carries; the others load as NULL
+    values = [c for c in fact_value_columns(conn) if c in df.columns]
+    columns = ", ".join(values)
+
+    # RESOLVING ROWS WITHOUT A CITY THROUGH THE SPATIAL INDEX
+    # (onto the city's canonical location, keeping their point as its alias)
+    unattributed = df["city"].isna() & df["latitude"].notna() & df["longitude"].notna()
+    if unattributed.any():
+        index = build_location_index(conn)
+        if len(index):
+            df = df.assign(city=df["city"].where(~unattributed, resolve_cities(index, df[unattributed])))
+            resolved = unattributed & df["city"].notna()
+            if resolved.any():
+                record_location_aliases(conn, df[resolved])
+                canonical = canonical_locations(conn).set_index("city")
+                df = df.assign(
+                    latitude=df["latitude"].where(~resolved, df["city"].map(canonical["latitude"])),
+                    longitude=df["longitude"].where(~resolved, df["city"].map(canonical["longitude"])),
+                )
 
     # REGISTER the pandas dataframe  as DuckDB table
     conn.register("df", df)
 
-    # REMOVING DUPLICATES DATA
+    # RESOLVING THE BATCH'S COORDINATES TO LOCATION IDS
+    # (a batch whose city is all None registers the column as an integer)
+    ensure_locations(
+        conn, conn.execute("SELECT DISTINCT CAST(city AS VARCHAR) AS city, latitude, longitude FROM df").fetchdf()
+    )
+    conn.execute(f"""
+                CREATE OR REPLACE TEMP TABLE batch_rows AS
+                SELECT d.timestamp, {", ".join(f"d.{c}" for c in values)},
+                       l.city, l.latitude, l.longitude, d.load_date, l.location_id
+                FROM df d
+                JOIN locations l
+                  ON l.city IS NOT DISTINCT FROM CAST(d.city AS VARCHAR)
+                 AND l.latitude IS NOT DISTINCT FROM d.latitude
+                 AND l.longitude IS NOT DISTINCT FROM d.longitude
+                WHERE d.timestamp IS NOT NULL
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY l.location_id, d.timestamp) = 1
+                 """)
+    conn.unregister("df")
+
+    # REMOVING DUPLICATES DATA (hours already loaded for the location)
     conn.execute("""
-                INSERT INTO weather_hourly (timestamp, temperature_2m, relativehumidity_2m, precipitation, city, latitude, longitude, load_date)
-                SELECT timestamp, temperature_2m, relativehumidity_2m, precipitation, city, latitude, longitude, load_date
-                FROM df
-                WHERE (timestamp, latitude, longitude, city) NOT IN (
-                    SELECT timestamp, latitude, longitude, city
-                    FROM weather_hourly
-        );
+                CREATE OR REPLACE TEMP TABLE new_rows AS
+                SELECT * FROM batch_rows b
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM weather_hourly_facts f
+                    WHERE f.location_id = b.location_id AND f.timestamp = b.timestamp
+                  )
                  """)
     # INSERTING NEW DATA
-    # conn.execute("INSERT INTO weather_hourly SELECT * FROM df")
+    conn.execute(f"""
+                INSERT INTO weather_hourly_facts (location_id, timestamp, {columns}, load_date)
+                SELECT location_id, timestamp, {columns}, load_date
+                FROM new_rows
+                 """)
+
+    # OVERWRITING REVISED HOURS (their old values leave the feature statistics first)
+    if revise and values:
+        changed = " OR ".join(f"b.{c} IS DISTINCT FROM f.{c}" for c in values)
+        conn.execute(f"""
+                CREATE OR REPLACE TEMP TABLE revised_rows AS
+                SELECT b.* FROM batch_rows b
+                JOIN weather_hourly_facts f
+                  ON f.location_id = b.location_id AND f.timestamp = b.timestamp
+                WHERE {changed}
+                 """)
+        conn.execute(f"""
+                CREATE OR REPLACE TEMP TABLE old_rows AS
+                SELECT r.city, {", ".join(f"f.{c}" for c in values)}
+                FROM revised_rows r
+                JOIN weather_hourly_facts f
+                  ON f.location_id = r.location_id AND f.timestamp = r.timestamp
+                 """)
+        retract_feature_stats(conn, "old_rows")
+        retract_forecast_verification(conn, "revised_rows")
+        conn.execute(f"""
+                UPDATE weather_hourly_facts
+                SET {", ".join(f"{c} = r.{c}" for c in values)}, load_date = r.load_date
+                FROM revised_rows r
+                WHERE weather_hourly_facts.location_id = r.location_id
+                  AND weather_hourly_facts.timestamp = r.timestamp
+                 """)
+        conn.execute("INSERT INTO new_rows SELECT * FROM revised_rows")
+        conn.execute("DROP TABLE old_rows")
+        conn.execute("DROP TABLE revised_rows")
+
+    # VERIFYING FORECASTS AGAINST THE NEWLY ARRIVED AND REVISED HOURS
+    update_forecast_verification(conn, "new_rows")
 
+    # FOLDING THE BATCH INTO THE FEATURE STATISTICS AND ENGINEERED FEATURES
+    update_feature_stats(conn, "new_rows")
+    refresh_weather_features(conn, "new_rows")
+    bump_data_versions(conn, "new_rows")
+    conn.execute("DROP TABLE new_rows")
+    conn.execute("DROP TABLE batch_rows")
 
     print("Upsert completed. Data loaded")
 
 
-def backfill_city(conn: duckdb.DuckDBPyConnection, locations: List[Dict]):
+def backfill_city(
+    conn: duckdb.DuckDBPyConnection, locations: List[Dict], max_km: float = DEFAULT_TOLERANCE_KM
+) -> int:
     """
-    Backfill missing city values based on exact latitude/longitude matches.
+    Backfill missing city values by resolving each location without a city
+    to the nearest known location (configured or API grid coordinates, see
+    etl.locations) within `max_km`.
+
+    Only the locations dimension changes: a resolved location's hours are
+    merged into its city's canonical location (hours already there are
+    kept) and its coordinates are kept there as an alias, so a city never
+    ends up with two locations for the same hours.
+
+    Returns the number of hourly rows that gained a city.
     """
-    for loc in locations:
-        city = loc.get("name")
-        lat = loc.get("latitude")
-        lon = loc.get("longitude")
-        if city is None or lat is None or lon is None:
-            continue
-        conn.execute(
-            """
-            UPDATE weather_hourly
-            SET city = ?
-            WHERE city IS NULL AND latitude = ? AND longitude = ?
-            """,
-            [city, lat, lon]
-        )
+    create_weather_table(conn)
+    unresolved = conn.execute(
+        """
+        SELECT location_id, latitude, longitude
+        FROM locations
+        WHERE city IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+        """
+    ).fetchdf()
+    register_locations(conn, locations)
+    if unresolved.empty:
+        return 0
+
+    index = build_location_index(conn)
+    unresolved["city"] = resolve_cities(index, unresolved, max_km)
+    resolved = unresolved.dropna(subset=["city"])
+    if resolved.empty:
+        return 0
+
+    record_location_aliases(conn, resolved)
+    conn.register("resolved_locations", resolved)
+    conn.register("canonical_locations", canonical_locations(conn))
+    conn.execute(
+        """
+        CREATE OR REPLACE TEMP TABLE location_merges AS
+        SELECT r.location_id AS from_id, r.city, c.location_id AS to_id
+        FROM resolved_locations r
+        LEFT JOIN canonical_locations c ON c.city = r.city
+        """
+    )
+    conn.unregister("canonical_locations")
+    conn.unregister("resolved_locations")
+    conn.execute(
+        """
+        CREATE OR REPLACE TEMP TABLE backfilled_cities AS
+        SELECT m.city, COUNT(*) AS n_rows
+        FROM location_merges m
+        JOIN weather_hourly_facts f ON f.location_id = m.from_id
+        GROUP BY m.city
+        """
+    )
+    updated = conn.execute("SELECT COALESCE(SUM(n_rows), 0) FROM backfilled_cities").fetchone()[0]
+
+    conn.execute(
+        """
+        UPDATE locations
+        SET city = m.city, updated_at = CAST(now() AS TIMESTAMP)
+        FROM location_merges m
+        WHERE locations.location_id = m.from_id AND m.to_id IS NULL
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO weather_hourly_facts
+        SELECT f.* REPLACE (m.to_id AS location_id)
+        FROM weather_hourly_facts f
+        JOIN location_merges m ON f.location_id = m.from_id
+        WHERE m.to_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+        """
+    )
+    conn.execute(
+        """
+        DELETE FROM weather_hourly_facts
+        WHERE location_id IN (SELECT from_id FROM location_merges WHERE to_id IS NOT NULL)
+        """
+    )
+    conn.execute(
+        """
+        DELETE FROM locations
+        WHERE location_id IN (SELECT from_id FROM location_merges WHERE to_id IS NOT NULL)
+        """
+    )
+
+    if updated:
+        bump_data_versions(conn, "backfilled_cities")
+    conn.execute("DROP TABLE backfilled_cities")
+    conn.execute("DROP TABLE location_merges")
+    return updated
@@ -0,0 +1,285 @@
+import duckdb
+import numpy as np
+import pandas as pd # type: ignore
+from datetime import datetime, timezone
+from scipy.spatial import cKDTree # type: ignore
+from typing import Dict, List, Optional, Tuple
+
+# Open-Meteo snaps requests to its model grid; resolved points further than
+# this from every known location are left unattributed
+DEFAULT_TOLERANCE_KM = 25.0
+
+EARTH_RADIUS_KM = 6371.0088
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(latitude: float, longitude: float, precision: int = 6) -> str:
+    """Standard base32 geohash; precision 6 cells are roughly 1.2 x 0.6 km."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        ch <<= 1
+        if value >= mid:
+            ch |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def _unit_vectors(latitude, longitude) -> np.ndarray:
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+
+class LocationIndex:
+    """
+    In-memory spatial index over named points.
+
+    Nearest-point queries use a k-d tree over unit vectors on the sphere
+    (chord distance orders points like great-circle distance, with no
+    antimeridian or pole special cases). Bounding-box queries binary-search
+    a latitude-sorted copy and filter longitude on that slice. Several
+    points may share a name, e.g. a city's configured and grid coordinates.
+    """
+
+    def __init__(self, names: List[str], latitudes, longitudes):
+        self.names = np.asarray(names, dtype=object)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self._tree = cKDTree(_unit_vectors(self.latitudes, self.longitudes)) if len(self.names) else None
+        self._lat_order = np.argsort(self.latitudes, kind="stable")
+        self._sorted_lat = self.latitudes[self._lat_order]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def nearest(
+        self, latitude: float, longitude: float, max_km: Optional[float] = None
+    ) -> Optional[Tuple[str, float]]:
+        """(name, distance_km) of the closest point, or None if the index is
+        empty or nothing lies within `max_km`."""
+        if self._tree is None:
+            return None
+        chord, i = self._tree.query(_unit_vectors(latitude, longitude)[0])
+        distance = float(_chord_to_km(chord))
+        if max_km is not None and distance > max_km:
+            return None
+        return self.names[i], distance
+
+    def nearest_many(self, latitudes, longitudes, max_km: Optional[float] = None) -> List[Optional[str]]:
+        """Vectorized nearest(): one name (or None) per query point."""
+        if self._tree is None:
+            return [None] * len(latitudes)
+        chord, idx = self._tree.query(_unit_vectors(latitudes, longitudes))
+        distance = _chord_to_km(chord)
+        return [
+            None if max_km is not None and d > max_km else self.names[i]
+            for d, i in zip(distance, idx)
+        ]
+
+    def within_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[str]:
+        """Distinct names with a point inside the box. min_lon > max_lon means
+        the box crosses the antimeridian."""
+        lo = np.searchsorted(self._sorted_lat, min_lat, side="left")
+        hi = np.searchsorted(self._sorted_lat, max_lat, side="right")
+        candidates = self._lat_order[lo:hi]
+        lon = self.longitudes[candidates]
+        if min_lon <= max_lon:
+            inside = (lon >= min_lon) & (lon <= max_lon)
+        else:
+            inside = (lon >= min_lon) | (lon <= max_lon)
+        return list(dict.fromkeys(self.names[candidates[inside]]))
+
+
+def create_locations_table(conn: duckdb.DuckDBPyConnection):
+    """
+    Create `locations`, the location dimension of weather_hourly: a compact
+    integer location_id per distinct (city, latitude, longitude) loaded, and
+    for configured cities the grid point Open-Meteo actually served, each
+    with a geohash key. Coordinates not yet attributed to a city are a
+    location with a NULL city until backfill_city resolves them.
+    """
+    columns = {
+        row[0] for row in conn.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = 'locations'"
+        ).fetchall()
+    }
+    if columns and "location_id" not in columns:
+        # Earlier layout keyed on city; carry its rows over under new ids
+        conn.execute("ALTER TABLE locations RENAME TO locations_by_city")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS locations (
+            location_id INTEGER PRIMARY KEY,
+            city VARCHAR,
+            latitude DOUBLE,
+            longitude DOUBLE,
+            geohash VARCHAR,
+            grid_latitude DOUBLE,
+            grid_longitude DOUBLE,
+            grid_geohash VARCHAR,
+            updated_at TIMESTAMP
+        )
+        """
+    )
+    if columns and "location_id" not in columns:
+        conn.execute(
+            """
+            INSERT INTO locations
+            SELECT ROW_NUMBER() OVER (ORDER BY city), city, latitude, longitude, geohash,
+                   grid_latitude, grid_longitude, grid_geohash, updated_at
+            FROM locations_by_city
+            """
+        )
+        conn.execute("DROP TABLE locations_by_city")
+
+
+def ensure_locations(conn: duckdb.DuckDBPyConnection, points: pd.DataFrame):
+    """
+    Give every distinct (city, latitude, longitude) row of `points` a
+    location_id. NULLs match NULLs, so unattributed coordinates get one id.
+    """
+    create_locations_table(conn)
+    points = points[["city", "latitude", "longitude"]].drop_duplicates().reset_index(drop=True)
+    if points.empty:
+        return
+    points = points.assign(
+        geohash=[
+            geohash(lat, lon) if pd.notna(lat) and pd.notna(lon) else None
+            for lat, lon in zip(points["latitude"], points["longitude"])
+        ]
+    )
+
+    conn.register("location_points", points)
+    conn.execute(
+        """
+        INSERT INTO locations (location_id, city, latitude, longitude, geohash, updated_at)
+        SELECT (SELECT COALESCE(MAX(location_id), 0) FROM locations) + ROW_NUMBER() OVER (),
+               p.city, p.latitude, p.longitude, p.geohash, CAST(now() AS TIMESTAMP)
+        FROM location_points p
+        WHERE NOT EXISTS (
+            SELECT 1 FROM locations l
+            WHERE l.city IS NOT DISTINCT FROM p.city
+              AND l.latitude IS NOT DISTINCT FROM p.latitude
+              AND l.longitude IS NOT DISTINCT FROM p.longitude
+        )
+        """
+    )
+    conn.unregister("location_points")
+
+
+def register_locations(conn: duckdb.DuckDBPyConnection, locations: List[Dict]):
+    """Make sure the configured coordinates of each named location are known."""
+    points = pd.DataFrame(
+        [
+            {"city": loc["name"], "latitude": loc["latitude"], "longitude": loc["longitude"]}
+            for loc in locations
+            if loc.get("name") is not None and loc.get("latitude") is not None and loc.get("longitude") is not None
+        ],
+        columns=["city", "latitude", "longitude"],
+    )
+    ensure_locations(conn, points)
+
+
+def record_grid_point(conn: duckdb.DuckDBPyConnection, city: str, raw_json: dict):
+    """Store the grid coordinates an API payload reports for `city`."""
+    lat, lon = raw_json.get("latitude"), raw_json.get("longitude")
+    if lat is None or lon is None:
+        return
+    create_locations_table(conn)
+    conn.execute(
+        """
+        UPDATE locations
+        SET grid_latitude = ?, grid_longitude = ?, grid_geohash = ?, updated_at = ?
+        WHERE city = ?
+        """,
+        [lat, lon, geohash(lat, lon), datetime.now(timezone.utc).replace(tzinfo=None), city],
+    )
+
+
+def canonical_locations(conn: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+    """
+    Each city's canonical location (city, location_id, latitude, longitude):
+    the first one registered for it, normally its configured coordinates.
+    Points resolved to a city by proximity belong to this location.
+    """
+    create_locations_table(conn)
+    return conn.execute(
+        """
+        SELECT city, location_id, latitude, longitude FROM locations
+        WHERE city IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY city ORDER BY location_id) = 1
+        """
+    ).fetchdf()
+
+
+def record_location_aliases(conn: duckdb.DuckDBPyConnection, points: pd.DataFrame):
+    """
+    Keep the coordinates of (city, latitude, longitude) points resolved to a
+    city as the grid point of its canonical location, so they stay indexed.
+    A grid point the API already reported (record_grid_point) is kept.
+    """
+    create_locations_table(conn)
+    points = points[["city", "latitude", "longitude"]].drop_duplicates("city").reset_index(drop=True)
+    if points.empty:
+        return
+    points = points.assign(
+        geohash=[geohash(lat, lon) for lat, lon in zip(points["latitude"], points["longitude"])]
+    )
+
+    conn.register("alias_points", points)
+    conn.execute(
+        """
+        UPDATE locations
+        SET grid_latitude = p.latitude, grid_longitude = p.longitude,
+            grid_geohash = p.geohash, updated_at = CAST(now() AS TIMESTAMP)
+        FROM alias_points p
+        WHERE locations.city = p.city AND locations.grid_latitude IS NULL
+          AND locations.location_id = (
+              SELECT MIN(location_id) FROM locations l WHERE l.city = p.city
+          )
+        """
+    )
+    conn.unregister("alias_points")
+
+
+def build_location_index(conn: duckdb.DuckDBPyConnection) -> LocationIndex:
+    """Index both the configured and grid coordinates of every city."""
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'locations'"
+    ).fetchone()[0]
+    if not exists:
+        return LocationIndex([], [], [])
+    points = conn.execute(
+        """
+        SELECT city, latitude, longitude FROM locations
+        WHERE city IS NOT NULL AND latitude IS NOT NULL
+        UNION ALL
+        SELECT city, grid_latitude, grid_longitude FROM locations
+        WHERE city IS NOT NULL AND grid_latitude IS NOT NULL
+        """
+    ).fetchdf()
+    return LocationIndex(points["city"].tolist(), points["latitude"], points["longitude"])
+
+
+def resolve_cities(
+    index: LocationIndex, points: pd.DataFrame, max_km: float = DEFAULT_TOLERANCE_KM
+) -> pd.Series:
+    """City for each (latitude, longitude) row of `points`, None when no
+    known location is within `max_km`."""
+    names = index.nearest_many(points["latitude"].to_numpy(), points["longitude"].to_numpy(), max_km)
+    return pd.Series(names, index=points.index, dtype=object)
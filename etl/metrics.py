@@ -0,0 +1,320 @@
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import duckdb
+import pandas as pd # type: ignore
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage; peak RSS is then left NULL
+    resource = None
+
+from etl.logger import get_logger
+
+logger = get_logger()
+
+METRIC_PREFIX = "weather_etl"
+
+# Location outcome counts a scheduler cycle sets on its run (NULL for other runs)
+RUN_COUNTS = ("locations", "loaded", "unchanged", "failed")
+
+# Span fields summed per (stage, city) for the exposition file: field -> (metric, unit, help)
+_STAGE_METRICS = {
+    "wall_seconds": ("stage_wall_seconds", "seconds", "Wall time spent in the stage during the last run."),
+    "cpu_seconds": ("stage_cpu_seconds", "seconds", "Process CPU time spent during the stage in the last run."),
+    "rows_in": ("stage_rows_in", None, "Rows the stage received in the last run."),
+    "rows_out": ("stage_rows_out", None, "Rows the stage produced in the last run."),
+    "bytes_downloaded": ("stage_downloaded_bytes", "bytes", "Response bytes downloaded by the stage in the last run."),
+}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """High-water resident set size of this process so far, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+def start_run(kind: str) -> dict:
+    """A new run ("pipeline", "scheduler" or "backfill") that spans are collected into."""
+    return {
+        "run_id": uuid.uuid4().hex,
+        "kind": kind,
+        "started_at": _utcnow(),
+        "clock_start": time.perf_counter(),
+        "cpu_start": time.process_time(),
+        "spans": [],
+    }
+
+
+@contextmanager
+def span(run: Optional[dict], stage: str, city: Optional[str] = None, **fields) -> Iterator[dict]:
+    """
+    Time one stage of a run, optionally for one city.
+
+    Yields the span's record; the caller fills in rows_in, rows_out and
+    bytes_downloaded (initial values may be passed as `fields`). On exit it
+    gains wall_seconds, cpu_seconds (process CPU time, so spans running
+    concurrently each see the other's work) and peak_rss_bytes, and is
+    appended to `run["spans"]`. An exception marks it failed and propagates.
+    With `run` None the span is timed but not kept.
+    """
+    record = {
+        "stage": stage,
+        "city": city,
+        "started_at": _utcnow(),
+        "rows_in": None,
+        "rows_out": None,
+        "bytes_downloaded": None,
+        "status": "ok",
+        "error": None,
+        **fields,
+    }
+    clock_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        record["wall_seconds"] = time.perf_counter() - clock_start
+        record["cpu_seconds"] = time.process_time() - cpu_start
+        record["peak_rss_bytes"] = peak_rss_bytes()
+        if run is not None:
+            run["spans"].append(record)
+
+
+def end_run(run: dict, status: str = "ok") -> dict:
+    run["finished_at"] = _utcnow()
+    run["wall_seconds"] = time.perf_counter() - run["clock_start"]
+    run["cpu_seconds"] = time.process_time() - run["cpu_start"]
+    run["peak_rss_bytes"] = peak_rss_bytes()
+    run["status"] = status
+    return run
+
+
+def create_metrics_tables(conn: duckdb.DuckDBPyConnection):
+    # One row per pipeline run, scheduler cycle or backfill
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pipeline_runs (
+            run_id VARCHAR PRIMARY KEY,
+            kind VARCHAR,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            status VARCHAR,
+            wall_seconds DOUBLE,
+            cpu_seconds DOUBLE,
+            peak_rss_bytes BIGINT,
+            rows_loaded BIGINT,
+            spans INTEGER,
+            locations INTEGER,
+            loaded INTEGER,
+            unchanged INTEGER,
+            failed INTEGER
+        )
+        """
+    )
+    for column in RUN_COUNTS:
+        conn.execute(f"ALTER TABLE pipeline_runs ADD COLUMN IF NOT EXISTS {column} INTEGER")
+    # Scheduler cycles used to be recorded separately in pipeline_cycles
+    cycles = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'pipeline_cycles'"
+    ).fetchone()[0]
+    if cycles:
+        conn.execute(
+            """
+            INSERT INTO pipeline_runs
+                (run_id, kind, started_at, finished_at, status, wall_seconds, rows_loaded,
+                 locations, loaded, unchanged, failed)
+            SELECT REPLACE(CAST(uuid() AS VARCHAR), '-', ''), 'scheduler', started_at,
+                   started_at + TO_MICROSECONDS(CAST(wall_seconds * 1e6 AS BIGINT)), 'ok',
+                   wall_seconds, rows_loaded, locations, loaded, unchanged, failed
+            FROM pipeline_cycles
+            """
+        )
+        conn.execute("DROP TABLE pipeline_cycles")
+    # One row per stage (per city where it applies) within a run
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pipeline_spans (
+            run_id VARCHAR,
+            stage VARCHAR,
+            city VARCHAR,
+            started_at TIMESTAMP,
+            wall_seconds DOUBLE,
+            cpu_seconds DOUBLE,
+            rows_in BIGINT,
+            rows_out BIGINT,
+            bytes_downloaded BIGINT,
+            peak_rss_bytes BIGINT,
+            status VARCHAR,
+            error VARCHAR
+        )
+        """
+    )
+
+
+def _rows_loaded(run: dict) -> int:
+    return sum(s["rows_out"] or 0 for s in run["spans"] if s["stage"] == "load")
+
+
+def record_run(conn: duckdb.DuckDBPyConnection, run: dict):
+    """Write a finished run and its spans to pipeline_runs / pipeline_spans."""
+    create_metrics_tables(conn)
+    conn.execute(
+        f"""
+        INSERT INTO pipeline_runs
+            (run_id, kind, started_at, finished_at, status, wall_seconds, cpu_seconds,
+             peak_rss_bytes, rows_loaded, spans, {", ".join(RUN_COUNTS)})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            run["run_id"],
+            run["kind"],
+            run["started_at"],
+            run["finished_at"],
+            run["status"],
+            run["wall_seconds"],
+            run["cpu_seconds"],
+            run["peak_rss_bytes"],
+            _rows_loaded(run),
+            len(run["spans"]),
+            *(run.get(column) for column in RUN_COUNTS),
+        ],
+    )
+    if not run["spans"]:
+        return
+
+    columns = [
+        "stage", "city", "started_at", "wall_seconds", "cpu_seconds", "rows_in",
+        "rows_out", "bytes_downloaded", "peak_rss_bytes", "status", "error",
+    ]
+    spans = pd.DataFrame([{c: s.get(c) for c in columns} for s in run["spans"]], columns=columns)
+    conn.register("run_spans", spans)
+    conn.execute(
+        """
+        INSERT INTO pipeline_spans
+        SELECT
+            ?, stage, CAST(city AS VARCHAR), CAST(started_at AS TIMESTAMP),
+            wall_seconds, cpu_seconds,
+            CAST(rows_in AS BIGINT), CAST(rows_out AS BIGINT),
+            CAST(bytes_downloaded AS BIGINT), CAST(peak_rss_bytes AS BIGINT),
+            status, CAST(error AS VARCHAR)
+        FROM run_spans
+        """,
+        [run["run_id"]],
+    )
+    conn.unregister("run_spans")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def render_metrics(run: dict, fmt: str = "prometheus") -> str:
+    """
+    A finished run as gauges in the Prometheus text format or OpenMetrics
+    (`fmt` "openmetrics"). Spans are summed per (stage, city); spans without
+    a city are labelled city="".
+    """
+    if fmt not in ("prometheus", "openmetrics"):
+        raise ValueError(f"Unknown metrics format: {fmt}")
+
+    totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for s in run["spans"]:
+        values = totals.setdefault((s["stage"], s["city"] or ""), {})
+        for field in _STAGE_METRICS:
+            if s.get(field) is not None:
+                values[field] = values.get(field, 0) + s[field]
+
+    families: List[Tuple[str, Optional[str], str, List[Tuple[str, float]]]] = []
+    for field, (name, unit, help_text) in _STAGE_METRICS.items():
+        samples = [
+            (_labels(kind=run["kind"], stage=stage, city=city), values[field])
+            for (stage, city), values in sorted(totals.items())
+            if field in values
+        ]
+        families.append((name, unit, help_text, samples))
+
+    run_labels = _labels(kind=run["kind"])
+    families += [
+        ("run_wall_seconds", "seconds", "Wall time of the last run.", [(run_labels, run["wall_seconds"])]),
+        ("run_cpu_seconds", "seconds", "Process CPU time of the last run.", [(run_labels, run["cpu_seconds"])]),
+        ("run_rows_loaded", None, "Rows loaded into weather_hourly by the last run.", [(run_labels, _rows_loaded(run))]),
+        ("run_success", None, "1 if the last run completed, 0 if it failed.", [(run_labels, int(run["status"] == "ok"))]),
+        (
+            "run_finished_timestamp_seconds",
+            "seconds",
+            "Unix time the last run finished.",
+            [(run_labels, run["finished_at"].replace(tzinfo=timezone.utc).timestamp())],
+        ),
+    ]
+    if run.get("peak_rss_bytes") is not None:
+        families.append(
+            ("run_peak_rss_bytes", "bytes", "Peak resident set size of the process.", [(run_labels, run["peak_rss_bytes"])])
+        )
+
+    lines = []
+    for name, unit, help_text, samples in families:
+        if not samples:
+            continue
+        metric = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        if fmt == "openmetrics" and unit:
+            lines.append(f"# UNIT {metric} {unit}")
+        lines.extend(f"{metric}{labels} {value}" for labels, value in samples)
+    if fmt == "openmetrics":
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(run: dict, export_path: str, fmt: str = "prometheus") -> str:
+    """
+    Write `run` to `<export_path>/weather_etl_<kind>.prom` (or `.om` for
+    OpenMetrics), replacing the previous run's file atomically so a
+    textfile collector never reads a partial one. Returns the file path.
+    """
+    os.makedirs(export_path, exist_ok=True)
+    extension = "om" if fmt == "openmetrics" else "prom"
+    file_path = os.path.join(export_path, f"{METRIC_PREFIX}_{run['kind']}.{extension}")
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_metrics(run, fmt))
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def complete_run(conn: Optional[duckdb.DuckDBPyConnection], run: dict, config: dict, status: str = "ok") -> dict:
+    """
+    End `run`, record it in the warehouse and export it when
+    `metrics.export_path` is configured. Failures are logged rather than
+    raised, so instrumentation never fails the run it measures.
+    """
+    end_run(run, status)
+    metrics_cfg = config.get("metrics", {})
+    try:
+        if conn is not None:
+            record_run(conn, run)
+        if metrics_cfg.get("export_path"):
+            export_metrics(run, metrics_cfg["export_path"], metrics_cfg.get("format", "prometheus"))
+    except Exception as e:
+        logger.error(f"Recording metrics for run {run['run_id']} failed: {e}")
+    return run
@@ -0,0 +1,306 @@
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import requests # type: ignore
+
+from etl.snapshot import CURRENT_FILE, read_current_snapshot
+
+DATA_VERSION_HEADER = "X-Data-Version"
+
+
+# Client SQL may not read files or the network (read_csv, COPY, ATTACH,
+# httpfs, ...), and cannot switch that back on with SET
+SANDBOX_CONFIG = {"enable_external_access": False, "lock_configuration": True}
+
+
+class _Snapshot:
+    """One opened snapshot: its connection, cursor pool and active readers."""
+
+    def __init__(self, path: str, version: int, pool_size: int):
+        self.version = version
+        self.conn = duckdb.connect(path, read_only=True, config=SANDBOX_CONFIG)
+        self.pool: "queue.Queue[duckdb.DuckDBPyConnection]" = queue.Queue()
+        for _ in range(pool_size):
+            self.pool.put(self.conn.cursor())
+        self.readers = 0
+        self.retired = False
+
+
+class QueryService:
+    """
+    Read-only query executor over the published warehouse snapshot.
+
+    Queries run on a fixed pool of cursors over one read-only connection and
+    their Arrow results are cached keyed by (data version, SQL, params). The
+    data version is the snapshot version published by the loader (see
+    etl.snapshot), so entries stay valid until new data is published and
+    are never expired on a timer. Without a snapshot, `db_path` is opened
+    read-only as version 0. Connections are opened with SANDBOX_CONFIG.
+    """
+
+    def __init__(
+        self,
+        snapshot_dir: str,
+        db_path: Optional[str] = None,
+        pool_size: int = 4,
+        cache_max_entries: int = 512,
+    ):
+        self.snapshot_dir = snapshot_dir
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.cache_max_entries = cache_max_entries
+        self.version: Optional[int] = None
+        self._snapshot: Optional[_Snapshot] = None
+        self._pointer: Optional[tuple] = None
+        self._cache: "OrderedDict[tuple, pa.Table]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _pointer_stat(self) -> Optional[tuple]:
+        # Publishing replaces the file, so the inode changes even when the
+        # filesystem's mtime is too coarse to tell two publishes apart
+        try:
+            stat = os.stat(os.path.join(self.snapshot_dir, CURRENT_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def _refresh(self, pointer: Optional[tuple]):
+        """
+        Switch to a newly published snapshot, if any. Caller holds the lock.
+
+        CURRENT.json is only read when its stat (see _pointer_stat) differs
+        from the last one seen. The replaced connection is closed once its last reader is done.
+        """
+        if self._snapshot is not None and pointer == self._pointer:
+            return
+        current = read_current_snapshot(self.snapshot_dir)
+        if current is not None:
+            version, path = current["version"], os.path.join(self.snapshot_dir, current["file"])
+        elif self.db_path is not None:
+            version, path = 0, self.db_path
+        else:
+            raise FileNotFoundError(f"No published snapshot in {self.snapshot_dir}")
+        self._pointer = pointer
+        if version == self.version:
+            return
+
+        previous = self._snapshot
+        self._snapshot = _Snapshot(path, version, self.pool_size)
+        self._cache.clear()
+        self.version = version
+        if previous is not None:
+            previous.retired = True
+            if previous.readers == 0:
+                previous.conn.close()
+
+    def _release(self, snapshot: _Snapshot):
+        """End a query on `snapshot`; the last reader of a replaced one closes it."""
+        with self._lock:
+            snapshot.readers -= 1
+            if snapshot.retired and snapshot.readers == 0:
+                snapshot.conn.close()
+
+    def current_version(self) -> int:
+        pointer = self._pointer_stat()
+        with self._lock:
+            self._refresh(pointer)
+            return self.version
+
+    def execute(self, sql: str, params: Optional[list] = None) -> Tuple[int, pa.Table]:
+        """Run a read query and return (data version, Arrow table)."""
+        params = params or []
+        pointer = self._pointer_stat()
+        with self._lock:
+            self._refresh(pointer)
+            snapshot = self._snapshot
+            version = snapshot.version
+            key = (version, sql, json.dumps(params, default=str))
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return version, cached
+            self.misses += 1
+            snapshot.readers += 1
+
+        try:
+            cursor = snapshot.pool.get()
+            try:
+                result = cursor.execute(sql, params)
+                # to_arrow_table replaces fetch_arrow_table in newer DuckDB releases
+                table = result.to_arrow_table() if hasattr(result, "to_arrow_table") else result.fetch_arrow_table()
+            finally:
+                snapshot.pool.put(cursor)
+        finally:
+            self._release(snapshot)
+
+        with self._lock:
+            if version == self.version:
+                self._cache[key] = table
+                while len(self._cache) > self.cache_max_entries:
+                    self._cache.popitem(last=False)
+        return version, table
+
+
+def table_to_ipc(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def ipc_to_table(body: bytes) -> pa.Table:
+    return pa.ipc.open_stream(pa.BufferReader(body)).read_all()
+
+
+def _make_handler(service: QueryService):
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: bytes, content_type: str, version: Optional[int] = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if version is not None:
+                self.send_header(DATA_VERSION_HEADER, str(version))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status: int, payload: dict):
+            self._send(status, json.dumps(payload).encode(), "application/json")
+
+        def do_GET(self):
+            if self.path == "/version":
+                try:
+                    version = service.current_version()
+                except FileNotFoundError as e:
+                    return self._send_json(503, {"error": str(e)})
+                return self._send_json(200, {"version": version})
+            if self.path == "/stats":
+                return self._send_json(
+                    200, {"version": service.version, "hits": service.hits, "misses": service.misses}
+                )
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/query":
+                return self._send_json(404, {"error": f"Unknown path {self.path}"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                version, table = service.execute(request["sql"], request.get("params"))
+            except FileNotFoundError as e:
+                return self._send_json(503, {"error": str(e)})
+            except (KeyError, ValueError, duckdb.Error) as e:
+                return self._send_json(400, {"error": str(e)})
+            self._send(200, table_to_ipc(table), "application/vnd.apache.arrow.stream", version)
+
+        def log_message(self, format, *args):
+            # Per-request access logs would swamp the pipeline log
+            pass
+
+    return QueryHandler
+
+
+def create_server(service: QueryService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """HTTP server exposing POST /query (JSON {sql, params} in, Arrow IPC
+    stream out), GET /version and GET /stats. Binds to localhost by default."""
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+class RemoteResult:
+    """The fetch methods of a DuckDB result, over an Arrow table."""
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+
+    def fetchdf(self):
+        return self.table.to_pandas()
+
+    def fetch_arrow_table(self) -> pa.Table:
+        return self.table
+
+    def fetchall(self) -> list:
+        columns = [column.to_pylist() for column in self.table.columns]
+        return list(zip(*columns))
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+    def fetchnumpy(self) -> dict:
+        # NULLs come back masked, as from DuckDB
+        result = {}
+        for name, column in zip(self.table.column_names, self.table.columns):
+            values = column.to_numpy(zero_copy_only=False)
+            if column.null_count:
+                result[name] = np.ma.masked_array(values, mask=column.is_null().to_numpy(zero_copy_only=False))
+            else:
+                result[name] = values
+        return result
+
+
+class RemoteConnection:
+    """
+    Stands in for a read-only DuckDB connection in etl.data_access and the
+    forecast readers, sending each query to a QueryService over HTTP on a
+    pooled keep-alive session.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.version: Optional[int] = None
+
+    def execute(self, sql: str, params: Optional[list] = None) -> RemoteResult:
+        payload = {"sql": sql, "params": [_json_param(p) for p in (params or [])]}
+        response = self.session.post(f"{self.base_url}/query", json=payload, timeout=self.timeout)
+        if response.status_code != 200:
+            raise Exception(f"Query service request failed: {response.status_code} - {response.text}")
+        self.version = int(response.headers.get(DATA_VERSION_HEADER, 0))
+        return RemoteResult(ipc_to_table(response.content))
+
+    def data_version(self) -> int:
+        response = self.session.get(f"{self.base_url}/version", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["version"]
+
+    def close(self):
+        self.session.close()
+
+
+def _json_param(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+if __name__ == "__main__":
+    from etl.config import load_config
+
+    config = load_config()
+    service_cfg = config.get("query_service", {})
+    service = QueryService(
+        config["paths"].get("snapshot_path", "data/warehouse/snapshots"),
+        config["paths"]["duckdb_path"],
+        pool_size=service_cfg.get("pool_size", 4),
+        cache_max_entries=service_cfg.get("cache_max_entries", 512),
+    )
+    host, port = service_cfg.get("host", "127.0.0.1"), service_cfg.get("port", 8765)
+    print(f"Serving warehouse queries on http://{host}:{port}")
+    create_server(service, host, port).serve_forever()
@@ -0,0 +1,113 @@
+import json
+import os
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+import duckdb
+
+from etl.data_access import get_data_versions
+
+# Pointer to the snapshot readers should open, replaced atomically on publish
+CURRENT_FILE = "CURRENT.json"
+
+
+def read_current_snapshot(snapshot_dir: str) -> Optional[dict]:
+    path = os.path.join(snapshot_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def data_stamp(conn: duckdb.DuckDBPyConnection) -> int:
+    """Sum of every city's data version; it grows whenever the loader changes rows."""
+    return sum(get_data_versions(conn).values())
+
+
+def publish_snapshot(
+    conn: duckdb.DuckDBPyConnection, snapshot_dir: str, keep: int = 3, force: bool = False
+) -> Optional[dict]:
+    """
+    Copy the writer's database into a new versioned snapshot file and point
+    CURRENT.json at it.
+
+    The pointer records the data stamp (see data_stamp) it was published at;
+    when the stamp has not moved since, nothing is copied and None is
+    returned, unless `force` is given.
+
+    The copy is written under a fresh name and the pointer is swapped with
+    os.replace, so readers only ever see complete snapshots and never take a
+    lock on the writer's file. All but the newest `keep` snapshots are then
+    removed; on POSIX, readers that still have an older one open keep
+    reading it until they switch.
+
+    Returns the new pointer entry.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    current = read_current_snapshot(snapshot_dir)
+    stamp = data_stamp(conn)
+    if not force and current is not None and current.get("data_stamp") == stamp:
+        return None
+    version = (current["version"] + 1) if current else 1
+    file_name = f"weather-{version:06d}.duckdb"
+    path = os.path.join(snapshot_dir, file_name)
+    if os.path.exists(path):
+        os.remove(path)
+
+    source = conn.execute("SELECT current_database()").fetchone()[0]
+    # ATTACH and COPY take no bound parameters, so the names are quoted here
+    quoted_path = path.replace("'", "''")
+    quoted_source = source.replace('"', '""')
+    conn.execute(f"ATTACH '{quoted_path}' AS weather_snapshot")
+    try:
+        conn.execute(f'COPY FROM DATABASE "{quoted_source}" TO weather_snapshot')
+    finally:
+        conn.execute("DETACH weather_snapshot")
+
+    entry = {
+        "version": version,
+        "file": file_name,
+        "data_stamp": stamp,
+        "published_at": datetime.now(timezone.utc).isoformat(),
+    }
+    tmp_path = os.path.join(snapshot_dir, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, os.path.join(snapshot_dir, CURRENT_FILE))
+
+    prune_snapshots(snapshot_dir, keep)
+    return entry
+
+
+def prune_snapshots(snapshot_dir: str, keep: int = 3) -> int:
+    """Remove all but the newest `keep` snapshot files. Returns the number removed."""
+    snapshots = sorted(
+        name for name in os.listdir(snapshot_dir)
+        if name.startswith("weather-") and name.endswith(".duckdb")
+    )
+    removed = 0
+    for name in snapshots[:-keep] if keep > 0 else snapshots:
+        try:
+            os.remove(os.path.join(snapshot_dir, name))
+            removed += 1
+        except OSError:
+            # Still open by a reader on a platform that refuses to unlink it
+            pass
+    return removed
+
+
+def open_current_snapshot(snapshot_dir: str) -> Tuple[duckdb.DuckDBPyConnection, int]:
+    """
+    Open the currently published snapshot read-only.
+
+    Returns (connection, version). Raises FileNotFoundError when nothing has
+    been published yet.
+    """
+    current = read_current_snapshot(snapshot_dir)
+    if current is None:
+        raise FileNotFoundError(f"No published snapshot in {snapshot_dir}")
+    conn = duckdb.connect(os.path.join(snapshot_dir, current["file"]), read_only=True)
+    return conn, current["version"]
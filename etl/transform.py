@@ -1,7 +1,11 @@
 import os
 import json
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from etl.dqc import apply_rules, evaluate_rules
+from etl.variables import configured_variables, variable_names
 
 
 def load_raw_json(file_path: str) -> dict:
@@ -9,7 +13,26 @@ def load_raw_json(file_path: str) -> dict:
         return json.load(f)
 
 
-def transform_weather_data(raw_json: dict, latitude: float, longitude: float, city: str) -> pd.DataFrame:
+def transform_and_validate(
+    raw_json: dict,
+    latitude: float,
+    longitude: float,
+    city: str,
+    variables: Optional[List[dict]] = None,
+    dqc_enabled: bool = True,
+    expected_hours: int = 168,
+    is_historical: bool = False,
+    max_staleness_hours: float = 6,
+    severity: Optional[Dict[str, str]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Shape a raw payload into hourly rows and run the data quality rules
+    (etl.dqc) over them.
+
+    Returns (valid, quarantined, metrics). Rows failing an error-level rule
+    are quarantined with their reasons instead of failing the batch; only a
+    payload that is structurally unusable raises.
+    """
 
     # ----------------------------
     # 1. Basic structure validation
@@ -18,13 +41,10 @@ def transform_weather_data(raw_json: dict, latitude: float, longitude: float, ci
         raise ValueError("Missing 'hourly' section in the raw JSON")
 
     hourly = raw_json["hourly"]
+    variables = variables or configured_variables()
+    names = variable_names(variables)
 
-    required_fields = [
-        "time",
-        "temperature_2m",
-        "relativehumidity_2m",
-        "precipitation"
-    ]
+    required_fields = ["time"] + names
 
     for field in required_fields:
         if field not in hourly:
@@ -33,72 +53,49 @@ def transform_weather_data(raw_json: dict, latitude: float, longitude: float, ci
     # ----------------------------
     # 2. Build DataFrame
     # ----------------------------
-    df = pd.DataFrame({
-        "timestamp": hourly["time"],
-        "temperature_2m": hourly["temperature_2m"],
-        "relativehumidity_2m": hourly["relativehumidity_2m"],
-        "precipitation": hourly["precipitation"]
-    })
+    df = pd.DataFrame({"timestamp": hourly["time"], **{name: hourly[name] for name in names}})
 
     df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df[names] = df[names].astype(float)
 
-    # ----------------------------
-    # 3. Data Quality Checks
-    # ----------------------------
     if df.empty:
         raise ValueError("Transformed DataFrame is empty.")
 
-    if df["timestamp"].isna().any():
-        raise ValueError("Null timestamps found — invalid source data.")
-
-    if df["timestamp"].duplicated().any():
-        raise ValueError("Duplicate timestamps detected — failing DQC.")
-
-    if (df["temperature_2m"] < -90).any() or (df["temperature_2m"] > 60).any():
-        raise ValueError("Temperature values outside realistic range.")
-
-    if (df["relativehumidity_2m"] < 0).any() or (df["relativehumidity_2m"] > 100).any():
-        raise ValueError("Humidity values outside 0–100% range.")
-
-    if (df["precipitation"] < 0).any():
-        raise ValueError("Negative precipitation values found.")
-
     # ----------------------------
-    # 4. Freshness Checks
-    # ----------------------------
-
-    # 4A: Expected number of hours (7 days = 168)
-    expected_hours = 24 * 7
-    if len(df) != expected_hours:
-        raise ValueError(f"Expected {expected_hours} records, found {len(df)}")
-
-    # 4B: Timestamp gaps
-    expected_range = pd.date_range(start=df["timestamp"].min(),
-                                   end=df["timestamp"].max(),
-                                   freq="H")
-
-    if len(expected_range) != len(df):
-        raise ValueError("Timestamp gaps detected. Missing hourly data.")
-
-    # 4C: Staleness check (latest timestamp must be recent)
-    latest_ts = df["timestamp"].max()
-    now_utc = datetime.utcnow()
-
-    if now_utc - latest_ts > timedelta(hours=6):
-        raise ValueError(
-            f"Data is stale. Latest timestamp is {latest_ts}, "
-            f"{(now_utc - latest_ts).total_seconds()/3600:.1f} hours old."
-        )
-
-    # ----------------------------
-    # 5. Add metadata
+    # 3. Add metadata
     # ----------------------------
     df["city"] = city
     df["latitude"] = latitude
     df["longitude"] = longitude
     df["load_date"] = datetime.utcnow().date()
 
-    return df
+    # ----------------------------
+    # 4. Data Quality Checks (every rule in one pass; bad rows are quarantined)
+    # ----------------------------
+    if not dqc_enabled:
+        return df, df.iloc[:0].assign(reasons=[]), pd.DataFrame(columns=["rule", "severity", "rows_checked", "rows_failed"])
+
+    masks = evaluate_rules(
+        df,
+        variables,
+        expected_hours=expected_hours,
+        max_staleness_hours=max_staleness_hours,
+        is_historical=is_historical,
+        severity=severity,
+    )
+    return apply_rules(df, masks, severity)
+
+
+def transform_weather_data(
+    raw_json: dict,
+    latitude: float,
+    longitude: float,
+    city: str,
+    variables: Optional[List[dict]] = None,
+    **dqc_kwargs,
+) -> pd.DataFrame:
+    """The valid rows of transform_and_validate."""
+    return transform_and_validate(raw_json, latitude, longitude, city, variables, **dqc_kwargs)[0]
 
 
 def save_processed_parquet(df: pd.DataFrame, processed_path: str, city: str) -> str:
@@ -0,0 +1,118 @@
+import re
+import duckdb
+import numpy as np
+import pandas as pd # type: ignore
+from typing import List, Optional
+
+from etl.config import load_config
+from etl.feature_store import FEATURE_COLUMNS
+
+# Hourly variables used when config.yaml has no `variables` section
+DEFAULT_VARIABLES = [
+    {"name": "temperature_2m", "label": "Temperature", "unit": "C", "min": -90, "max": 60},
+    {"name": "relativehumidity_2m", "label": "Humidity", "unit": "%", "min": 0, "max": 100},
+    {"name": "precipitation", "label": "Precipitation", "unit": "mm", "min": 0},
+]
+
+# Variable names become column names in generated SQL
+_NAME_PATTERN = re.compile(r"^[a-z][a-z0-9_]*$")
+
+
+def load_variables(config: Optional[dict] = None) -> List[dict]:
+    """
+    The hourly variable registry: one entry per Open-Meteo hourly variable
+    with its name, label, unit and valid [min, max] range (None when
+    unbounded). Read from the `variables` section of `config`, falling back
+    to DEFAULT_VARIABLES.
+
+    The forecast models predict FEATURE_COLUMNS, so those must stay
+    registered.
+    """
+    entries = (config or {}).get("variables") or DEFAULT_VARIABLES
+    variables = []
+    for entry in entries:
+        name = entry.get("name")
+        if not isinstance(name, str) or not _NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid variable name: {name!r}")
+        if any(v["name"] == name for v in variables):
+            raise ValueError(f"Variable {name} is defined more than once")
+        variables.append(
+            {
+                "name": name,
+                "label": entry.get("label", name),
+                "unit": entry.get("unit", ""),
+                "min": entry.get("min"),
+                "max": entry.get("max"),
+            }
+        )
+
+    missing = [f for f in FEATURE_COLUMNS if not any(v["name"] == f for v in variables)]
+    if missing:
+        raise ValueError(f"Forecast features missing from variables: {', '.join(missing)}")
+    return variables
+
+
+def configured_variables() -> List[dict]:
+    """
+    The registry from config.yaml, or DEFAULT_VARIABLES without one. Callers
+    that are not handed a registry default to this, so they follow the
+    configured variables rather than the built-in set.
+    """
+    try:
+        return load_variables(load_config())
+    except FileNotFoundError:
+        return load_variables()
+
+
+def variable_names(variables: Optional[List[dict]] = None) -> List[str]:
+    return [v["name"] for v in (variables or configured_variables())]
+
+
+def variable_label(variables: List[dict], name: str) -> str:
+    """Axis label such as "Humidity (%)"; unknown names are returned as is."""
+    for v in variables:
+        if v["name"] == name:
+            return f"{v['label']} ({v['unit']})" if v["unit"] else v["label"]
+    return name
+
+
+def range_violations(df: pd.DataFrame, variables: List[dict]) -> pd.DataFrame:
+    """
+    Boolean frame with one column per variable, True where a value lies
+    outside the variable's range. Missing values are not violations. Every
+    column is checked in a single vectorized comparison.
+    """
+    names = variable_names(variables)
+    values = df[names].to_numpy(dtype=float)
+    lower = np.array([-np.inf if v["min"] is None else v["min"] for v in variables], dtype=float)
+    upper = np.array([np.inf if v["max"] is None else v["max"] for v in variables], dtype=float)
+    return pd.DataFrame((values < lower) | (values > upper), index=df.index, columns=names)
+
+
+def table_columns(conn: duckdb.DuckDBPyConnection, table: str) -> List[str]:
+    """Column names of `table` in definition order (empty if it does not exist)."""
+    return [
+        row[0] for row in conn.execute(
+            """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = ?
+            ORDER BY ordinal_position
+            """,
+            [table],
+        ).fetchall()
+    ]
+
+
+def add_variable_columns(conn: duckdb.DuckDBPyConnection, table: str, variables: List[dict]) -> List[str]:
+    """
+    Add a DOUBLE column to `table` for each registered variable it lacks.
+
+    Evolution is additive only: existing rows read NULL for the new
+    variables, and columns of variables later dropped from the registry are
+    kept. Returns the names added.
+    """
+    existing = set(table_columns(conn, table))
+    added = [v["name"] for v in variables if v["name"] not in existing]
+    for name in added:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} DOUBLE")
+    return added
@@ -0,0 +1,289 @@
+import os
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+import torch
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from etl.logger import get_logger
+from forecast.dataset import FEATURES, fill_engineered, scale_values, unscale_values, valid_window_starts
+from forecast.predict import (
+    city_scale_params,
+    get_device,
+    has_city_model,
+    has_global_model,
+    load_global_artifacts,
+    load_model_artifacts,
+)
+
+logger = get_logger()
+
+
+def create_backtest_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS forecast_backtests (
+            city VARCHAR,
+            horizon_hours INTEGER,
+            origin_timestamp TIMESTAMP,
+            target_timestamp TIMESTAMP,
+            lead_hours INTEGER,
+            pred_temperature_2m DOUBLE,
+            pred_relativehumidity_2m DOUBLE,
+            pred_precipitation DOUBLE,
+            actual_temperature_2m DOUBLE,
+            actual_relativehumidity_2m DOUBLE,
+            actual_precipitation DOUBLE,
+            backtest_at TIMESTAMP
+        )
+        """
+    )
+
+
+def build_origin_windows(
+    values: np.ndarray,
+    lookback: int,
+    horizon: int,
+    stride: int = 24,
+    timestamps: Optional[np.ndarray] = None,
+):
+    """Build every rolling-origin input window of a series in one array.
+
+    An origin is the index of the first forecast hour, so window i covers
+    values[origin - lookback : origin] and is scored on the following
+    `horizon` hours.
+
+    Args:
+        values: Array of shape (n, num_features), already scaled.
+        lookback: Number of past hours used as input.
+        horizon: Number of future hours to predict.
+        stride: Hours between consecutive origins.
+        timestamps: Row timestamps; when given, origins whose input window
+            spans a missing or duplicate hour or a missing value are dropped.
+
+    Returns:
+        Tuple of (origins, windows) where windows has shape
+        (num_origins, lookback, num_features). Windows are strided views
+        into `values` and are only copied when batched for inference.
+    """
+    n = len(values)
+    origins = np.arange(lookback, n - horizon + 1, stride)
+    if timestamps is not None:
+        origins = origins[np.isin(origins - lookback, valid_window_starts(timestamps, lookback, values))]
+    if len(origins) == 0:
+        return origins, np.empty((0, lookback, values.shape[1]), dtype=values.dtype)
+
+    # (n - lookback + 1, num_features, lookback) -> (.., lookback, num_features)
+    all_windows = np.lib.stride_tricks.sliding_window_view(values, lookback, axis=0)
+    windows = all_windows[origins - lookback].transpose(0, 2, 1)
+    return origins, windows
+
+
+def backtest_city(
+    city: str,
+    df: pd.DataFrame,
+    horizon: int = 24,
+    stride: int = 24,
+    batch_size: int = 1024,
+    num_threads: Optional[int] = None,
+) -> pd.DataFrame:
+    """Replay forecasts for one city from every origin after its training data.
+
+    Uses the city's own model when present, otherwise the global model (as
+    evaluate_model does). Only origins at or after the model's `fit_end`
+    (the latest hour it saw of the city in training or validation) are
+    scored, so every forecast is out of sample. Models saved without
+    `fit_end` are skipped; retrain them to backtest.
+    All origins are stacked into large inference batches rather than
+    forecasting one origin at a time.
+
+    Args:
+        city: City name matching the trained model directory, or one of
+            the global model's cities.
+        df: DataFrame with a timestamp column and the model's input features,
+            ordered by timestamp.
+        horizon: Forecast horizon in hours (24 or 168 for 7-day).
+        stride: Hours between consecutive forecast origins.
+        batch_size: Number of origins per forward pass.
+        num_threads: Torch intra-op threads. Set to 1 in worker processes to
+            avoid oversubscribing the CPU.
+
+    Returns:
+        Long DataFrame with one row per (origin, lead hour) holding the
+        predicted values. Actuals are attached later by a join in DuckDB.
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+    device = get_device()
+    city_idx = None
+    if has_city_model(city, horizon):
+        model, meta = load_model_artifacts(city, horizon, device)
+        data_min, data_max = meta["scale_min"], meta["scale_max"]
+        fit_end = meta.get("fit_end")
+    else:
+        model, meta = load_global_artifacts(horizon, device)
+        if city not in meta["cities"]:
+            logger.warning(f"No model for {city} ({horizon}h); it is not part of the global model")
+            return pd.DataFrame()
+        data_min, data_max = city_scale_params(meta, city)
+        city_idx = meta["cities"].index(city)
+        # The global model records the span it saw of each city
+        fit_end = meta.get("fit_end", {}).get(city)
+    lookback = meta["lookback"]
+    if fit_end is None:
+        logger.warning(f"Model for {city} ({horizon}h) does not record its training span; retrain to backtest")
+        return pd.DataFrame()
+
+    values = df[meta.get("features", FEATURES)].values.astype(np.float32)
+    scaled = fill_engineered(scale_values(values, data_min, data_max))
+
+    # Origin timestamp is the last observed hour the forecast was issued from
+    timestamps = pd.to_datetime(df["timestamp"]).values
+    origins, windows = build_origin_windows(scaled, lookback, horizon, stride, timestamps)
+    out_of_sample = timestamps[origins - 1] >= np.datetime64(fit_end)
+    origins, windows = origins[out_of_sample], windows[out_of_sample]
+    if len(origins) == 0:
+        logger.warning(f"Not enough history to backtest {city} ({horizon}h)")
+        return pd.DataFrame()
+
+    preds = np.empty((len(origins), horizon, len(FEATURES)), dtype=np.float32)
+    with torch.no_grad():
+        for start in range(0, len(origins), batch_size):
+            xb = torch.from_numpy(
+                np.ascontiguousarray(windows[start : start + batch_size])
+            ).to(device)
+            inputs = [xb] if city_idx is None else [xb, torch.full((len(xb),), city_idx, device=device)]
+            preds[start : start + batch_size] = model(*inputs).cpu().numpy()
+
+    n_targets = len(FEATURES)
+    preds = unscale_values(
+        preds.reshape(-1, n_targets),
+        data_min[:n_targets],
+        data_max[:n_targets],
+    )
+
+    origin_ts = np.repeat(timestamps[origins - 1], horizon)
+    leads = np.tile(np.arange(1, horizon + 1), len(origins))
+
+    return pd.DataFrame(
+        {
+            "city": city,
+            "horizon_hours": horizon,
+            "origin_timestamp": origin_ts,
+            "target_timestamp": origin_ts + leads.astype("timedelta64[h]"),
+            "lead_hours": leads,
+            "pred_temperature_2m": preds[:, 0],
+            "pred_relativehumidity_2m": np.clip(preds[:, 1], 0, 100),
+            "pred_precipitation": np.clip(preds[:, 2], 0, None),
+        }
+    )
+
+
+def save_backtest(conn, preds_df: pd.DataFrame):
+    """Join predictions to weather_hourly actuals and persist them.
+
+    Replaces any earlier backtest for the same city and horizon.
+    """
+    if preds_df.empty:
+        return 0
+
+    create_backtest_table(conn)
+    conn.register("backtest_preds", preds_df)
+    keys = preds_df[["city", "horizon_hours"]].drop_duplicates()
+    for city, horizon in keys.itertuples(index=False):
+        conn.execute(
+            "DELETE FROM forecast_backtests WHERE city = ? AND horizon_hours = ?",
+            [city, int(horizon)],
+        )
+
+    inserted = conn.execute(
+        """
+        INSERT INTO forecast_backtests
+        SELECT p.city, p.horizon_hours, p.origin_timestamp, p.target_timestamp,
+               p.lead_hours,
+               p.pred_temperature_2m, p.pred_relativehumidity_2m, p.pred_precipitation,
+               h.temperature_2m, h.relativehumidity_2m, h.precipitation,
+               ?
+        FROM backtest_preds p
+        JOIN weather_hourly h
+          ON h.city = p.city AND h.timestamp = p.target_timestamp
+        """,
+        [datetime.now(timezone.utc).replace(tzinfo=None)],
+    ).fetchone()[0]
+    conn.unregister("backtest_preds")
+
+    return inserted
+
+
+def run_backtests(
+    conn,
+    cities: List[str],
+    horizons: List[int],
+    stride: int = 24,
+    batch_size: int = 1024,
+    max_workers: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    start_method: str = "spawn",
+):
+    """Backtest every (city, horizon) pair, fanning out across worker processes.
+
+    History is read once per city here (from weather_features when it exists,
+    so models with engineered inputs can be replayed); workers only run
+    inference, and all writes go back through the single DuckDB connection.
+    Cities without their own model are backtested with the global model.
+    Workers are started with `start_method`; the default "spawn" avoids
+    forking a process that has already initialised torch.
+
+    Returns:
+        Total number of backtest rows persisted.
+    """
+    has_features = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'weather_features'"
+    ).fetchone()[0]
+    source = "weather_features" if has_features else "weather_hourly"
+
+    histories = {}
+    for city in cities:
+        histories[city] = conn.execute(
+            f"""
+            SELECT * EXCLUDE (city)
+            FROM {source}
+            WHERE city = ?
+              AND (? IS NULL OR timestamp >= CAST(? AS TIMESTAMP))
+              AND (? IS NULL OR timestamp <= CAST(? AS TIMESTAMP))
+            ORDER BY timestamp
+            """,
+            [city, start_date, start_date, end_date, end_date],
+        ).fetchdf()
+
+    jobs = [
+        (city, horizon)
+        for city in cities
+        for horizon in horizons
+        if has_city_model(city, horizon) or has_global_model(horizon)
+    ]
+    max_workers = max_workers or min(len(jobs), os.cpu_count() or 1) or 1
+
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context(start_method)) as pool:
+        futures = {
+            pool.submit(
+                backtest_city, city, histories[city], horizon, stride, batch_size, 1
+            ): (city, horizon)
+            for city, horizon in jobs
+        }
+        for future, (city, horizon) in futures.items():
+            try:
+                preds_df = future.result()
+            except Exception as e:
+                logger.error(f"Backtest failed for {city} ({horizon}h): {e}")
+                continue
+            rows = save_backtest(conn, preds_df)
+            total_rows += rows
+            logger.info(f"Backtest for {city} ({horizon}h): {rows} scored forecasts")
+
+    return total_rows
@@ -1,33 +1,269 @@
 import numpy as np
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, IterableDataset
 from sklearn.preprocessing import MinMaxScaler
 
+from etl.corpus import load_city_corpus, read_manifest
+from etl.data_access import record_batches
+from etl.feature_store import FEATURE_COLUMNS, get_scaled_series, get_scaling_params, scaled_series_query
 
-FEATURES = ["temperature_2m", "relativehumidity_2m", "precipitation"]
+
+FEATURES = FEATURE_COLUMNS
+
+HOUR = np.timedelta64(1, "h")
+
+
+def hourly_series_query(max_gap_hours: int = 0) -> str:
+    """SQL (one `city` parameter) for a city's unnormalized FEATURES ordered
+    by timestamp, gap-filled exactly like the scaled series training reads."""
+    return scaled_series_query(FEATURES, max_gap_hours, source="weather_hourly")
+
+
+def valid_window_starts(timestamps: np.ndarray, window: int, values: np.ndarray = None) -> np.ndarray:
+    """Offsets i where timestamps[i : i + window] are consecutive hours.
+
+    Windows touching a missing hour or a duplicate timestamp are excluded,
+    as are windows over a row of `values` with a missing (NaN) value.
+    """
+    timestamps = np.asarray(timestamps)
+    n = len(timestamps)
+    if n < window:
+        return np.empty(0, dtype=np.int64)
+
+    # breaks[k] counts non-hourly steps among the first k steps
+    breaks = np.concatenate([[0], np.cumsum(np.diff(timestamps) != HOUR)])
+    starts = np.arange(n - window + 1)
+    starts = starts[breaks[starts + window - 1] == breaks[starts]]
+    if values is not None:
+        # missing[k] counts rows with a NaN among the first k rows
+        missing = np.concatenate([[0], np.cumsum(np.isnan(values).any(axis=1))])
+        starts = starts[missing[starts + window] == missing[starts]]
+    return starts
 
 
 class WeatherSequenceDataset(Dataset):
     """Sliding-window dataset for weather time series.
 
-    Creates (input, target) pairs from a contiguous block of weather data.
-    Input: lookback hours of 3 features.
-    Target: horizon hours of 3 features.
+    Creates (input, target) pairs from a block of weather data.
+    Input: lookback hours of all features.
+    Target: horizon hours of the first num_targets features (all by default).
+
+    When `timestamps` are given, only windows over consecutive hours without
+    missing values are used (see valid_window_starts); otherwise rows are
+    assumed contiguous and complete.
+
+    `rescale` holds per-feature (factor, offset) rows applied to each window
+    as it is read (see training_rescale), so `data` itself, possibly a
+    memory map, is never rewritten.
     """
 
-    def __init__(self, data: np.ndarray, lookback: int, horizon: int):
+    def __init__(
+        self,
+        data: np.ndarray,
+        lookback: int,
+        horizon: int,
+        num_targets: int = None,
+        timestamps: np.ndarray = None,
+        rescale: np.ndarray = None,
+    ):
         self.lookback = lookback
         self.horizon = horizon
         self.data = data
-        self.samples = len(data) - lookback - horizon + 1
+        self.num_targets = num_targets or data.shape[1]
+        self.rescale = None if rescale is None else torch.as_tensor(rescale, dtype=torch.float32)
+        if timestamps is not None:
+            self.starts = valid_window_starts(timestamps, lookback + horizon, data)
+        else:
+            self.starts = np.arange(max(0, len(data) - lookback - horizon + 1))
 
     def __len__(self):
-        return max(0, self.samples)
+        return len(self.starts)
 
     def __getitem__(self, idx):
+        idx = self.starts[idx]
         x = self.data[idx : idx + self.lookback]
-        y = self.data[idx + self.lookback : idx + self.lookback + self.horizon]
-        return torch.FloatTensor(x), torch.FloatTensor(y)
+        y = self.data[idx + self.lookback : idx + self.lookback + self.horizon, : self.num_targets]
+        # torch.tensor copies, so read-only memory-mapped windows are fine
+        x, y = torch.tensor(x, dtype=torch.float32), torch.tensor(y, dtype=torch.float32)
+        if self.rescale is not None:
+            factor, offset = self.rescale
+            x = x * factor + offset
+            y = y * factor[: self.num_targets] + offset[: self.num_targets]
+        return x, y
+
+
+class CityTaggedDataset(Dataset):
+    """Wraps a per-city dataset so each sample carries its city index.
+
+    Yields (input, city_idx, target) for training city-conditioned models.
+    """
+
+    def __init__(self, dataset: Dataset, city_idx: int):
+        self.dataset = dataset
+        self.city_idx = torch.tensor(city_idx, dtype=torch.long)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        x, y = self.dataset[idx]
+        return x, self.city_idx, y
+
+
+class StreamingWeatherDataset(IterableDataset):
+    """Sliding windows streamed from weather_hourly with bounded memory.
+
+    Rows of [start, end) are read in timestamp order through a DuckDB
+    cursor in chunks of `chunk_rows`. Only the last lookback + horizon - 1
+    rows are carried over between chunks, so windows spanning a chunk
+    boundary are still produced. Gaps of up to `max_gap_hours` are filled
+    as in load_scaled_series; windows over remaining gaps, duplicate hours
+    or missing values are skipped, as in WeatherSequenceDataset. Windows
+    pass through a shuffle buffer of `shuffle_buffer` samples (0 keeps them
+    in order), so memory stays constant however long the history is.
+
+    Yields (input, target) like WeatherSequenceDataset, normalized with the
+    given ranges.
+    """
+
+    def __init__(
+        self,
+        conn,
+        city: str,
+        lookback: int,
+        horizon: int,
+        data_min,
+        data_max,
+        start=None,
+        end=None,
+        chunk_rows: int = 50_000,
+        shuffle_buffer: int = 10_000,
+        seed: int = 0,
+        max_gap_hours: int = 0,
+    ):
+        self.conn = conn
+        self.city = city
+        self.lookback = lookback
+        self.horizon = horizon
+        self.data_min = data_min
+        self.data_max = data_max
+        self.start = start
+        self.end = end
+        self.chunk_rows = chunk_rows
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = 0
+        self.series = hourly_series_query(max_gap_hours)
+
+        # Windows over consecutive hours, counted in SQL without reading rows
+        window = lookback + horizon
+        self.samples = conn.execute(
+            f"""
+            SELECT COUNT(*) FROM (
+                SELECT SUM(CASE WHEN step = INTERVAL 1 HOUR THEN 0 ELSE 1 END) OVER steps AS breaks,
+                       SUM(missing) OVER rows_ahead AS missing,
+                       COUNT(*) OVER rows_ahead AS n
+                FROM (
+                    SELECT timestamp, LEAD(timestamp) OVER (ORDER BY timestamp) - timestamp AS step,
+                           CASE WHEN {" OR ".join(f"{f} IS NULL" for f in FEATURES)} THEN 1 ELSE 0 END AS missing
+                    FROM ({self.series})
+                    WHERE {self._where()}
+                )
+                WINDOW steps AS (ORDER BY timestamp ROWS BETWEEN CURRENT ROW AND {window - 2} FOLLOWING),
+                       rows_ahead AS (ORDER BY timestamp ROWS BETWEEN CURRENT ROW AND {window - 1} FOLLOWING)
+            )
+            WHERE breaks = 0 AND missing = 0 AND n = {window}
+            """,
+            self._params(),
+        ).fetchone()[0]
+
+    def _where(self) -> str:
+        return (
+            "(? IS NULL OR timestamp >= CAST(? AS TIMESTAMP)) "
+            "AND (? IS NULL OR timestamp < CAST(? AS TIMESTAMP))"
+        )
+
+    def _params(self) -> list:
+        return [self.city, self.start, self.start, self.end, self.end]
+
+    def __len__(self):
+        return self.samples
+
+    def _windows(self):
+        window = self.lookback + self.horizon
+        # Separate cursor so other queries on conn don't cancel the stream
+        cursor = self.conn.cursor()
+        reader = record_batches(
+            cursor,
+            f"""
+            SELECT timestamp, {", ".join(FEATURES)}
+            FROM ({self.series})
+            WHERE {self._where()}
+            ORDER BY timestamp
+            """,
+            self._params(),
+            self.chunk_rows,
+        )
+
+        carry_ts = np.empty(0, dtype="datetime64[us]")
+        carry = np.empty((0, len(FEATURES)), dtype=np.float32)
+        for batch in reader:
+            values = np.column_stack(
+                [batch.column(f).to_numpy(zero_copy_only=False) for f in FEATURES]
+            ).astype(np.float32)
+            ts = batch.column("timestamp").to_numpy(zero_copy_only=False).astype("datetime64[us]")
+            block = np.concatenate([carry, scale_values(values, self.data_min, self.data_max)])
+            block_ts = np.concatenate([carry_ts, ts])
+            for i in valid_window_starts(block_ts, window, block):
+                # Copies, so buffered samples don't pin whole chunks in memory
+                yield (
+                    torch.tensor(block[i : i + self.lookback]),
+                    torch.tensor(block[i + self.lookback : i + window]),
+                )
+            keep = max(0, len(block) - window + 1)
+            carry, carry_ts = block[keep:], block_ts[keep:]
+        cursor.close()
+
+    def __iter__(self):
+        if self.shuffle_buffer <= 1:
+            yield from self._windows()
+            return
+
+        # Different order every epoch, reproducible from the seed
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+
+        buffer = []
+        for sample in self._windows():
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            i = rng.integers(len(buffer))
+            yield buffer[i]
+            buffer[i] = sample
+
+        for i in rng.permutation(len(buffer)):
+            yield buffer[i]
+
+
+def streaming_split_bounds(conn, city: str, train_frac=0.7, val_frac=0.15, max_gap_hours: int = 0):
+    """Timestamps where the validation and test splits of a city start.
+
+    Gives the same row split as split_datasets over the gap-filled series,
+    so StreamingWeatherDataset can cover train/val/test as [None, val_start),
+    [val_start, test_start) and [test_start, None).
+    """
+    series = hourly_series_query(max_gap_hours)
+    n = conn.execute(f"SELECT COUNT(*) FROM ({series})", [city]).fetchone()[0]
+
+    def timestamp_at(row):
+        found = conn.execute(
+            f"SELECT timestamp FROM ({series}) ORDER BY timestamp LIMIT 1 OFFSET ?",
+            [city, row],
+        ).fetchone()
+        return found[0] if found else None
+
+    return timestamp_at(int(n * train_frac)), timestamp_at(int(n * (train_frac + val_frac)))
 
 
 def prepare_datasets(df, lookback, horizon, train_frac=0.7, val_frac=0.15):
@@ -63,3 +299,149 @@ def prepare_datasets(df, lookback, horizon, train_frac=0.7, val_frac=0.15):
     test_ds = WeatherSequenceDataset(test_scaled, lookback, horizon)
 
     return train_ds, val_ds, test_ds, scaler
+
+
+def scale_values(values: np.ndarray, data_min, data_max) -> np.ndarray:
+    """Min/max-normalize values with stored per-feature ranges.
+
+    Matches MinMaxScaler and the weather_hourly_scaled view: a feature with
+    zero range is only shifted. Missing values stay NaN.
+    """
+    data_min = np.asarray(data_min, dtype=np.float32)
+    data_range = np.asarray(data_max, dtype=np.float32) - data_min
+    data_range = np.where(data_range > 0, data_range, 1.0).astype(np.float32)
+    return ((values - data_min) / data_range).astype(np.float32)
+
+
+def fill_engineered(scaled: np.ndarray, num_targets: int = len(FEATURES)) -> np.ndarray:
+    """Set missing engineered inputs (columns after the first `num_targets`)
+    to 0, the bottom of their training range.
+
+    Lags and trailing windows that reach into a gap are NULL by design in
+    weather_features. Missing observed values are left as NaN so windows
+    over them are skipped.
+    """
+    scaled = scaled.copy()
+    scaled[:, num_targets:] = np.nan_to_num(scaled[:, num_targets:])
+    return scaled
+
+
+def unscale_values(scaled: np.ndarray, data_min, data_max) -> np.ndarray:
+    """Inverse of scale_values."""
+    data_min = np.asarray(data_min, dtype=np.float32)
+    data_range = np.asarray(data_max, dtype=np.float32) - data_min
+    data_range = np.where(data_range > 0, data_range, 1.0).astype(np.float32)
+    return scaled * data_range + data_min
+
+
+def split_datasets(
+    scaled: np.ndarray,
+    lookback,
+    horizon,
+    train_frac=0.7,
+    val_frac=0.15,
+    num_targets=None,
+    timestamps=None,
+    rescale=None,
+):
+    """Split an already-normalized series into train/val/test datasets.
+
+    Args:
+        scaled: Array of shape (n, num_features), already normalized.
+        lookback: Number of past hours used as input.
+        horizon: Number of future hours to predict.
+        train_frac: Fraction of data for training.
+        val_frac: Fraction of data for validation. Test gets the remainder.
+        num_targets: Leading features to predict. Defaults to all.
+        timestamps: Row timestamps; when given, windows spanning gaps or
+            duplicates are skipped.
+        rescale: Per-feature (factor, offset) rows applied to every window
+            (see training_rescale).
+
+    Returns:
+        Tuple of (train_dataset, val_dataset, test_dataset).
+    """
+    n = len(scaled)
+    train_end = int(n * train_frac)
+    val_end = int(n * (train_frac + val_frac))
+
+    def split(start, end):
+        return WeatherSequenceDataset(
+            scaled[start:end], lookback, horizon, num_targets,
+            None if timestamps is None else timestamps[start:end], rescale,
+        )
+
+    train_ds = split(0, train_end)
+    val_ds = split(train_end, val_end)
+    test_ds = split(val_end, n)
+
+    return train_ds, val_ds, test_ds
+
+
+def fit_end_timestamp(timestamps, train_frac=0.7, val_frac=0.15) -> str:
+    """Last timestamp of the rows split_datasets puts in the train and
+    validation splits, i.e. the latest hour the fitted model has seen."""
+    val_end = int(len(timestamps) * (train_frac + val_frac))
+    return str(np.asarray(timestamps)[val_end - 1].astype("datetime64[s]"))
+
+
+def model_features(features=None) -> list:
+    """Input feature list for a model: the FEATURES targets first, then any
+    engineered inputs from weather_features."""
+    extras = [f for f in (features or []) if f not in FEATURES]
+    return FEATURES + extras
+
+
+def training_ranges(values: np.ndarray, train_frac=0.7):
+    """Per-feature (min, max) of the rows split_datasets puts in the training
+    split, so normalization never sees validation or test values."""
+    train = np.asarray(values[: int(len(values) * train_frac)], dtype=np.float32)
+    return np.nanmin(train, axis=0), np.nanmax(train, axis=0)
+
+
+def training_rescale(scaled: np.ndarray, data_min, data_max, train_frac=0.7):
+    """Affine map from a series scaled with (data_min, data_max), such as the
+    full-history feature_stats ranges, onto the ranges of its training split.
+
+    Only the training rows are read, and scaling is increasing, so their
+    min/max are taken on the scaled values directly; a memory-mapped series
+    is never copied. Validation and test rows may map outside [0, 1].
+
+    Returns:
+        Tuple of (rescale, train_min, train_max), where rescale holds the
+        per-feature (factor, offset) rows for WeatherSequenceDataset.
+    """
+    data_min = np.asarray(data_min, dtype=np.float32)
+    data_max = np.asarray(data_max, dtype=np.float32)
+    train = scaled[: int(len(scaled) * train_frac)]
+    train_min = unscale_values(np.nanmin(train, axis=0), data_min, data_max)
+    train_max = unscale_values(np.nanmax(train, axis=0), data_min, data_max)
+    old_range = np.where(data_max > data_min, data_max - data_min, 1.0)
+    new_range = np.where(train_max > train_min, train_max - train_min, 1.0)
+    rescale = np.stack([old_range / new_range, (data_min - train_min) / new_range]).astype(np.float32)
+    return rescale, train_min, train_max
+
+
+def load_scaled_series(
+    conn, city: str, corpus_dir: str = None, mmap_mode: str = "r", max_gap_hours: int = 0
+):
+    """A city's normalized FEATURES series as (timestamps, values, data_min, data_max).
+
+    When `corpus_dir` holds an export for the city with the same gap filling
+    (see etl.corpus), values are a memory-mapped view of it and the ranges
+    come from its manifest; otherwise the series is read from the
+    weather_hourly_scaled view, filling gaps of up to `max_gap_hours`.
+    """
+    if corpus_dir and city in read_manifest(corpus_dir):
+        timestamps, values, entry = load_city_corpus(city, corpus_dir, mmap_mode)
+        if entry["features"] == FEATURES and entry.get("max_gap_hours", 0) == max_gap_hours:
+            return (
+                timestamps,
+                values,
+                np.array(entry["scale_min"], dtype=np.float32),
+                np.array(entry["scale_max"], dtype=np.float32),
+            )
+
+    data_min, data_max = get_scaling_params(conn, city, FEATURES)
+    timestamps, values = get_scaled_series(conn, city, FEATURES, max_gap_hours)
+    return timestamps, values, data_min, data_max
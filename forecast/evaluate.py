@@ -3,68 +3,83 @@ import torch
 from torch.utils.data import DataLoader
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from etl.feature_engineering import get_feature_history
 from etl.logger import get_logger
-from forecast.dataset import prepare_datasets, FEATURES
-from forecast.model import WeatherLSTM
+from forecast.dataset import (
+    CityTaggedDataset,
+    FEATURES,
+    fill_engineered,
+    load_scaled_series,
+    scale_values,
+    split_datasets,
+    unscale_values,
+)
+from forecast.predict import (
+    city_scale_params,
+    get_device,
+    has_city_model,
+    load_global_artifacts,
+    load_model_artifacts,
+)
 
 logger = get_logger()
 
 
-def evaluate_model(city: str, conn, lookback: int = 168, horizon: int = 24) -> dict:
+def evaluate_model(
+    city: str, conn, lookback: int = 168, horizon: int = 24, corpus_dir: str = None
+) -> dict:
     """Evaluate a trained model on the test split and return metrics per feature.
 
+    Uses the city's own model when present, otherwise the global model. With
+    `corpus_dir`, the exported corpus is memory-mapped. Test windows follow
+    the model's gap handling (meta["max_gap_hours"]).
+
     Returns:
         Dict with keys like mae_temperature_2m, rmse_temperature_2m, r2_temperature_2m, etc.
     """
-    import os
-    import joblib
-
     horizon_label = "24h" if horizon <= 24 else "7d"
-    model_dir = os.path.join("models", city.replace(" ", "_").lower())
-    meta = torch.load(
-        os.path.join(model_dir, f"meta_{horizon_label}.pt"), weights_only=True
-    )
-    scaler = joblib.load(os.path.join(model_dir, f"scaler_{horizon_label}.joblib"))
-
-    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
-    model = WeatherLSTM(
-        num_features=meta["num_features"],
-        hidden_size=meta["hidden_size"],
-        num_layers=meta["num_layers"],
-        dropout=meta["dropout"],
-        horizon=meta["horizon"],
-    ).to(device)
-    model.load_state_dict(
-        torch.load(
-            os.path.join(model_dir, f"lstm_{horizon_label}.pt"),
-            map_location=device,
-            weights_only=True,
+    device = get_device()
+    city_idx = None
+    if has_city_model(city, horizon):
+        model, meta = load_model_artifacts(city, horizon, device)
+        data_min, data_max = meta["scale_min"], meta["scale_max"]
+    else:
+        model, meta = load_global_artifacts(horizon, device)
+        data_min, data_max = city_scale_params(meta, city)
+        city_idx = meta["cities"].index(city)
+
+    features = meta.get("features", FEATURES)
+    if features == FEATURES:
+        timestamps, series, series_min, series_max = load_scaled_series(
+            conn, city, corpus_dir, max_gap_hours=meta.get("max_gap_hours", 0)
         )
+        if np.allclose(series_min, data_min) and np.allclose(series_max, data_max):
+            scaled = series
+        else:
+            # Re-normalize with the ranges the model was trained on
+            raw = unscale_values(series, series_min, series_max)
+            scaled = scale_values(raw, data_min, data_max)
+    else:
+        timestamps, values = get_feature_history(conn, city, features)
+        scaled = fill_engineered(scale_values(values, data_min, data_max))
+
+    _, _, test_ds = split_datasets(
+        scaled, lookback, horizon, num_targets=len(FEATURES), timestamps=timestamps
     )
-    model.eval()
-
-    df = conn.execute(
-        """
-        SELECT timestamp, temperature_2m, relativehumidity_2m, precipitation
-        FROM weather_hourly WHERE city = ? ORDER BY timestamp
-        """,
-        [city],
-    ).fetchdf()
-
-    _, _, test_ds, _ = prepare_datasets(df, lookback, horizon)
 
     if len(test_ds) == 0:
         logger.warning(f"No test data for {city}")
         return {}
 
+    if city_idx is not None:
+        test_ds = CityTaggedDataset(test_ds, city_idx)
     test_loader = DataLoader(test_ds, batch_size=64)
 
     all_preds = []
     all_targets = []
     with torch.no_grad():
-        for xb, yb in test_loader:
-            xb = xb.to(device)
-            pred = model(xb).cpu().numpy()
+        for *inputs, yb in test_loader:
+            pred = model(*[t.to(device) for t in inputs]).cpu().numpy()
             all_preds.append(pred)
             all_targets.append(yb.numpy())
 
@@ -72,9 +87,10 @@ def evaluate_model(city: str, conn, lookback: int = 168, horizon: int = 24) -> d
     targets = np.concatenate(all_targets)
 
     # Inverse-transform for metrics in original scale
-    n_samples = preds.shape[0] * preds.shape[1]
-    preds_flat = scaler.inverse_transform(preds.reshape(-1, len(FEATURES)))
-    targets_flat = scaler.inverse_transform(targets.reshape(-1, len(FEATURES)))
+    n_targets = len(FEATURES)
+    data_min, data_max = data_min[:n_targets], data_max[:n_targets]
+    preds_flat = unscale_values(preds.reshape(-1, n_targets), data_min, data_max)
+    targets_flat = unscale_values(targets.reshape(-1, n_targets), data_min, data_max)
 
     metrics = {"city": city, "horizon": horizon}
     for i, feat in enumerate(FEATURES):
@@ -2,11 +2,18 @@ import torch
 import torch.nn as nn
 
 
+# Directory under models/ holding the multi-city model artifacts
+GLOBAL_MODEL_DIR = "global"
+
+
 class WeatherLSTM(nn.Module):
     """Stacked LSTM for multi-step weather forecasting.
 
     Input shape:  (batch, seq_len, num_features)
-    Output shape: (batch, horizon, num_features)
+    Output shape: (batch, horizon, num_targets)
+
+    num_targets defaults to num_features; when extra engineered inputs are
+    used, the targets are the first num_targets input features.
     """
 
     def __init__(
@@ -16,10 +23,12 @@ class WeatherLSTM(nn.Module):
         num_layers: int = 2,
         dropout: float = 0.2,
         horizon: int = 24,
+        num_targets: int = None,
     ):
         super().__init__()
         self.horizon = horizon
         self.num_features = num_features
+        self.num_targets = num_targets or num_features
 
         self.lstm = nn.LSTM(
             input_size=num_features,
@@ -29,12 +38,57 @@ class WeatherLSTM(nn.Module):
             batch_first=True,
         )
 
-        self.fc = nn.Linear(hidden_size, horizon * num_features)
+        self.fc = nn.Linear(hidden_size, horizon * self.num_targets)
 
     def forward(self, x):
         # x: (batch, seq_len, features)
         lstm_out, _ = self.lstm(x)
         # Use last timestep output
         last = lstm_out[:, -1, :]  # (batch, hidden_size)
-        out = self.fc(last)  # (batch, horizon * features)
+        out = self.fc(last)  # (batch, horizon * targets)
+        return out.view(-1, self.horizon, self.num_targets)
+
+
+class GlobalWeatherLSTM(nn.Module):
+    """Stacked LSTM shared across cities, conditioned on a learned city embedding.
+
+    The city embedding is appended to every timestep's features, so one
+    network can learn location-specific behaviour for many cities.
+
+    Input shape:  (batch, seq_len, num_features) and city_idx (batch,)
+    Output shape: (batch, horizon, num_features)
+    """
+
+    def __init__(
+        self,
+        num_cities: int,
+        num_features: int = 3,
+        hidden_size: int = 64,
+        num_layers: int = 2,
+        dropout: float = 0.2,
+        horizon: int = 24,
+        embedding_dim: int = 8,
+    ):
+        super().__init__()
+        self.horizon = horizon
+        self.num_features = num_features
+
+        self.city_embedding = nn.Embedding(num_cities, embedding_dim)
+        self.lstm = nn.LSTM(
+            input_size=num_features + embedding_dim,
+            hidden_size=hidden_size,
+            num_layers=num_layers,
+            dropout=dropout if num_layers > 1 else 0.0,
+            batch_first=True,
+        )
+
+        self.fc = nn.Linear(hidden_size, horizon * num_features)
+
+    def forward(self, x, city_idx):
+        # x: (batch, seq_len, features), city_idx: (batch,)
+        emb = self.city_embedding(city_idx)  # (batch, embedding_dim)
+        emb = emb.unsqueeze(1).expand(-1, x.size(1), -1)
+        lstm_out, _ = self.lstm(torch.cat([x, emb], dim=-1))
+        last = lstm_out[:, -1, :]
+        out = self.fc(last)
         return out.view(-1, self.horizon, self.num_features)
@@ -1,29 +1,36 @@
 import os
-import joblib
 import numpy as np
 import pandas as pd
 import torch
 from datetime import timedelta
+from typing import List, Optional
 
-from etl.data_access import get_recent_hours
-from forecast.dataset import FEATURES
-from forecast.model import WeatherLSTM
+from etl.data_access import get_recent_hours, get_recent_hours_multi
+from etl.feature_engineering import get_feature_history
+from etl.load import create_model_tables
+from etl.logger import get_logger
+from forecast.dataset import FEATURES, fill_engineered, scale_values, unscale_values
+from forecast.model import GLOBAL_MODEL_DIR, GlobalWeatherLSTM, WeatherLSTM
+from forecast.uncertainty import apply_intervals, load_intervals
 
+logger = get_logger()
 
-def generate_forecast(
-    city: str,
-    conn,
-    horizon: int = 24,
-) -> pd.DataFrame:
-    """Generate a weather forecast for a city using a trained LSTM model.
+
+def get_device() -> torch.device:
+    return torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+
+
+def load_model_artifacts(city: str, horizon: int, device=None):
+    """Load a trained model and its metadata for a city.
 
     Args:
         city: City name matching the trained model directory.
-        conn: DuckDB connection.
         horizon: Forecast horizon in hours (24 or 168 for 7-day).
+        device: Torch device to load the model onto. Defaults to get_device().
 
     Returns:
-        DataFrame with predicted timestamp, temperature, humidity, precipitation.
+        Tuple of (model, meta). The model is in eval mode and
+        meta["scale_min"]/meta["scale_max"] hold the normalization ranges.
     """
     horizon_label = "24h" if horizon <= 24 else "7d"
     model_dir = os.path.join("models", city.replace(" ", "_").lower())
@@ -35,12 +42,16 @@ def generate_forecast(
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"No trained model found at {model_path}")
 
-    meta = torch.load(meta_path, weights_only=True)
-    scaler = joblib.load(scaler_path)
+    device = device or get_device()
 
-    lookback = meta["lookback"]
+    meta = torch.load(meta_path, weights_only=True)
+    if "scale_min" not in meta:
+        # Models trained before the feature store shipped a fitted scaler
+        import joblib
 
-    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+        scaler = joblib.load(scaler_path)
+        meta["scale_min"] = scaler.data_min_.tolist()
+        meta["scale_max"] = scaler.data_max_.tolist()
 
     model = WeatherLSTM(
         num_features=meta["num_features"],
@@ -48,28 +59,289 @@ def generate_forecast(
         num_layers=meta["num_layers"],
         dropout=meta["dropout"],
         horizon=meta["horizon"],
+        num_targets=meta.get("num_targets"),
     ).to(device)
     model.load_state_dict(torch.load(model_path, map_location=device, weights_only=True))
     model.eval()
 
-    # Get the most recent data for input
-    df = get_recent_hours(conn, city, lookback)
-    if len(df) < lookback:
+    return model, meta
+
+
+def has_city_model(city: str, horizon: int) -> bool:
+    horizon_label = "24h" if horizon <= 24 else "7d"
+    model_dir = os.path.join("models", city.replace(" ", "_").lower())
+    return os.path.exists(os.path.join(model_dir, f"lstm_{horizon_label}.pt"))
+
+
+def has_global_model(horizon: int) -> bool:
+    horizon_label = "24h" if horizon <= 24 else "7d"
+    return os.path.exists(os.path.join("models", GLOBAL_MODEL_DIR, f"lstm_{horizon_label}.pt"))
+
+
+def model_checkpoint_mtime(city: str, horizon: int) -> Optional[int]:
+    """
+    Modification time (ns) of the checkpoint generate_forecast would load
+    for the city: its own model, else the global one. None when neither is
+    trained. Changes whenever the model is retrained.
+    """
+    horizon_label = "24h" if horizon <= 24 else "7d"
+    model_dir = os.path.join("models", city.replace(" ", "_").lower())
+    if not has_city_model(city, horizon):
+        model_dir = os.path.join("models", GLOBAL_MODEL_DIR)
+    try:
+        return os.stat(os.path.join(model_dir, f"lstm_{horizon_label}.pt")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def latest_checkpoint_mtime() -> Optional[int]:
+    """
+    Newest modification time (ns) among every trained checkpoint, per-city
+    or global, or None when nothing is trained. Changes whenever any model
+    is retrained.
+    """
+    mtimes = [
+        os.stat(os.path.join(root, name)).st_mtime_ns
+        for root, _, files in os.walk("models")
+        for name in files
+        if name.startswith("lstm_") and name.endswith(".pt")
+    ]
+    return max(mtimes, default=None)
+
+
+def load_global_artifacts(horizon: int, device=None):
+    """Load the multi-city GlobalWeatherLSTM and its metadata.
+
+    Returns:
+        Tuple of (model, meta). meta["cities"] lists cities in embedding
+        order; meta["scale_min"]/["scale_max"] hold per-city scaling.
+    """
+    horizon_label = "24h" if horizon <= 24 else "7d"
+    model_dir = os.path.join("models", GLOBAL_MODEL_DIR)
+
+    meta_path = os.path.join(model_dir, f"meta_{horizon_label}.pt")
+    model_path = os.path.join(model_dir, f"lstm_{horizon_label}.pt")
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"No trained global model found at {model_path}")
+
+    device = device or get_device()
+
+    meta = torch.load(meta_path, weights_only=True)
+    model = GlobalWeatherLSTM(
+        num_cities=len(meta["cities"]),
+        num_features=meta["num_features"],
+        hidden_size=meta["hidden_size"],
+        num_layers=meta["num_layers"],
+        dropout=meta["dropout"],
+        horizon=meta["horizon"],
+        embedding_dim=meta["embedding_dim"],
+    ).to(device)
+    model.load_state_dict(torch.load(model_path, map_location=device, weights_only=True))
+    model.eval()
+
+    return model, meta
+
+
+def city_scale_params(meta: dict, city: str):
+    """Per-city (min, max) normalization ranges of a global model."""
+    if city not in meta["cities"]:
+        raise ValueError(f"{city} is not part of the global model")
+    return meta["scale_min"][city], meta["scale_max"][city]
+
+
+def lookback_window(
+    city: str,
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    lookback: int,
+    max_gap_hours: int = 0,
+):
+    """The `lookback` consecutive hours ending at the latest row, as
+    (timestamps, values).
+
+    Missing hours are handled as in training: runs of up to `max_gap_hours`
+    are filled by linear interpolation between the surrounding observations
+    (etl.feature_store.scaled_series_query) and duplicate hours are
+    averaged. A longer gap raises ValueError, so the model is never fed
+    hours that are not consecutive as if they were.
+    """
+    df = pd.DataFrame(values, index=pd.DatetimeIndex(timestamps)).groupby(level=0).mean()
+    if df.empty:
+        raise ValueError(f"Need {lookback} hours of data, only have 0 for {city}")
+
+    hours = pd.date_range(end=df.index[-1], periods=lookback, freq="h")
+    if df.index[0] > hours[0]:
+        raise ValueError(f"Need {lookback} hours of data, only have {len(df)} for {city}")
+
+    # Missing hours between consecutive observations that reach into the window
+    observed = df.index[df.index >= df.index[df.index <= hours[0]][-1]]
+    gaps = np.diff(observed.values) // np.timedelta64(1, "h") - 1
+    if len(gaps) and gaps.max() > max_gap_hours:
         raise ValueError(
-            f"Need {lookback} hours of data, only have {len(df)} for {city}"
+            f"{int(gaps.max())}-hour gap in the last {lookback} hours for {city} "
+            f"(model fills up to {max_gap_hours})"
+        )
+
+    window = df.reindex(hours).to_numpy(dtype=np.float32)
+    missing = ~hours.isin(df.index)
+    if missing.any():
+        known = (df.index - hours[0]) / pd.Timedelta(hours=1)
+        for j in range(window.shape[1]):
+            present = df[j].notna().to_numpy()
+            window[missing, j] = np.interp(
+                np.flatnonzero(missing), known[present], df[j].to_numpy()[present]
+            )
+    return hours.values, window
+
+
+def generate_forecasts(
+    cities: List[str],
+    conn,
+    horizon: int = 24,
+) -> pd.DataFrame:
+    """Forecast many cities in one batched pass through the global model.
+
+    Cities without enough complete recent history, or with a gap in it
+    longer than the model's max_gap_hours, are skipped with a warning.
+
+    Args:
+        cities: City names the global model was trained on.
+        conn: DuckDB connection.
+        horizon: Forecast horizon in hours (24 or 168 for 7-day).
+
+    Returns:
+        DataFrame in the same layout as generate_forecast, for all cities.
+    """
+    horizon_label = "24h" if horizon <= 24 else "7d"
+    device = get_device()
+    model, meta = load_global_artifacts(horizon, device)
+    lookback = meta["lookback"]
+
+    unknown = [c for c in cities if c not in meta["cities"]]
+    if unknown:
+        raise ValueError(f"Not part of the global model: {', '.join(unknown)}")
+
+    recent = get_recent_hours_multi(conn, cities, lookback)
+    max_gap_hours = meta.get("max_gap_hours", 0)
+    ready, windows, last_ts = [], [], []
+    for city in cities:
+        rows = recent[recent["city"] == city]
+        try:
+            timestamps, values = lookback_window(
+                city, rows["timestamp"].values, rows[FEATURES].values.astype(np.float32),
+                lookback, max_gap_hours,
+            )
+        except ValueError as e:
+            logger.warning(str(e))
+            continue
+        if np.isnan(values).any():
+            logger.warning(f"Missing values in the last {lookback} hours for {city}")
+            continue
+        ready.append(city)
+        windows.append(values)
+        last_ts.append(timestamps[-1])
+    if not ready:
+        raise ValueError(f"Not enough recent data to forecast {', '.join(cities)}")
+
+    values = np.stack(windows)
+    data_min = np.array([meta["scale_min"][c] for c in ready], dtype=np.float32)[:, None, :]
+    data_max = np.array([meta["scale_max"][c] for c in ready], dtype=np.float32)[:, None, :]
+
+    x = torch.from_numpy(scale_values(values, data_min, data_max)).to(device)
+    idx = torch.tensor([meta["cities"].index(c) for c in ready], device=device)
+
+    with torch.no_grad():
+        pred_scaled = model(x, idx).cpu().numpy()  # (cities, horizon, F)
+
+    pred = unscale_values(pred_scaled, data_min, data_max)
+
+    last_ts = np.array(last_ts, dtype="datetime64[ns]")
+    leads = np.arange(1, horizon + 1).astype("timedelta64[h]")
+    pred = pred.reshape(-1, len(FEATURES))
+
+    forecast_df = pd.DataFrame(
+        {
+            "timestamp": (last_ts[:, None] + leads[None, :]).ravel(),
+            "temperature_2m": pred[:, 0],
+            "relativehumidity_2m": np.clip(pred[:, 1], 0, 100),
+            "precipitation": np.clip(pred[:, 2], 0, None),
+            "city": np.repeat(ready, horizon),
+            "horizon_hours": horizon,
+            "forecast_type": "lstm_global",
+            "model_version": meta.get("model_version", f"global_{horizon_label}"),
+            "forecast_timestamp": np.repeat(last_ts, horizon),
+        }
+    )
+
+    parts = [
+        apply_intervals(part, load_intervals(conn, city, horizon))
+        for city, part in forecast_df.groupby("city", sort=False)
+    ]
+    return pd.concat(parts, ignore_index=True)
+
+
+def generate_forecast(
+    city: str,
+    conn,
+    horizon: int = 24,
+) -> pd.DataFrame:
+    """Generate a weather forecast for a city using a trained LSTM model.
+
+    Args:
+        city: City name matching the trained model directory.
+        conn: DuckDB connection.
+        horizon: Forecast horizon in hours (24 or 168 for 7-day).
+
+    Returns:
+        DataFrame with predicted timestamp, temperature, humidity, precipitation.
+        When forecast_intervals has rows for the city, each feature also gets
+        <feature>_lower and <feature>_upper columns. Cities without their own
+        model are forecast with the global model when one is trained.
+
+    Raises:
+        ValueError: The last `lookback` hours are incomplete or have a gap
+            longer than the model's max_gap_hours (see lookback_window).
+    """
+    if not has_city_model(city, horizon) and os.path.exists(
+        os.path.join("models", GLOBAL_MODEL_DIR)
+    ):
+        return generate_forecasts([city], conn, horizon)
+
+    horizon_label = "24h" if horizon <= 24 else "7d"
+    device = get_device()
+    model, meta = load_model_artifacts(city, horizon, device)
+
+    lookback = meta["lookback"]
+    features = meta.get("features", FEATURES)
+
+    # Get the most recent data for input
+    if features == FEATURES:
+        df = get_recent_hours(conn, city, lookback)
+        timestamps, values = lookback_window(
+            city, df["timestamp"].values, df[FEATURES].values.astype(np.float32),
+            lookback, meta.get("max_gap_hours", 0),
         )
+    else:
+        # Engineered inputs are not interpolated in training, so neither here
+        timestamps, values = get_feature_history(conn, city, features, limit=lookback)
+        timestamps, values = lookback_window(city, timestamps, values, lookback)
 
-    values = df[FEATURES].values.astype(np.float32)
-    scaled = scaler.transform(values)
+    scaled = fill_engineered(scale_values(values, meta["scale_min"], meta["scale_max"]))
+    if np.isnan(scaled).any():
+        raise ValueError(f"Missing values in the last {lookback} hours for {city}")
 
-    x = torch.FloatTensor(scaled).unsqueeze(0).to(device)
+    x = torch.from_numpy(scaled).unsqueeze(0).to(device)
 
     with torch.no_grad():
         pred_scaled = model(x).cpu().numpy()[0]
 
-    pred = scaler.inverse_transform(pred_scaled)
+    n_targets = len(FEATURES)
+    pred = unscale_values(
+        pred_scaled, meta["scale_min"][:n_targets], meta["scale_max"][:n_targets]
+    )
 
-    last_timestamp = pd.Timestamp(df["timestamp"].iloc[-1])
+    last_timestamp = pd.Timestamp(timestamps[-1])
     forecast_timestamps = [
         last_timestamp + timedelta(hours=i + 1) for i in range(horizon)
     ]
@@ -83,7 +355,43 @@ def generate_forecast(
             "city": city,
             "horizon_hours": horizon,
             "forecast_type": "lstm",
+            "model_version": meta.get("model_version", f"lstm_{horizon_label}"),
+            "forecast_timestamp": last_timestamp,
         }
     )
 
+    # Empirical prediction intervals from the precomputed lookup table
+    forecast_df = apply_intervals(forecast_df, load_intervals(conn, city, horizon))
+
     return forecast_df
+
+
+def save_forecast(conn, forecast_df: pd.DataFrame) -> int:
+    """Store an issued forecast in weather_forecasts.
+
+    The loader later scores these rows against actuals as they arrive
+    (see etl.load.update_forecast_verification). Rows already stored for the
+    same issue time, target hour and model version are left as they are, so
+    rerunning an hour does not count its forecast twice.
+
+    Returns:
+        Number of rows written.
+    """
+    if forecast_df.empty:
+        return 0
+
+    create_model_tables(conn)
+    conn.register("issued_forecast", forecast_df)
+    written = conn.execute(
+        """
+        INSERT INTO weather_forecasts
+            (city, forecast_timestamp, target_timestamp, horizon_hours,
+             temperature_2m, relativehumidity_2m, precipitation, model_version)
+        SELECT city, forecast_timestamp, timestamp, horizon_hours,
+               temperature_2m, relativehumidity_2m, precipitation, model_version
+        FROM issued_forecast
+        ON CONFLICT DO NOTHING
+        """
+    ).fetchone()[0]
+    conn.unregister("issued_forecast")
+    return written
@@ -1,17 +1,103 @@
 import os
-import joblib
+from datetime import datetime, timezone
+from typing import List, Optional
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader
+from torch.utils.data import ConcatDataset, DataLoader
 
 from etl.logger import get_logger
 from etl.data_access import get_weather_history
-from forecast.dataset import prepare_datasets, FEATURES
-from forecast.model import WeatherLSTM
+from etl.feature_engineering import get_feature_history
+from etl.feature_store import get_scaling_params, record_model_scaling
+from forecast.dataset import (
+    CityTaggedDataset,
+    FEATURES,
+    fill_engineered,
+    fit_end_timestamp,
+    hourly_series_query,
+    StreamingWeatherDataset,
+    load_scaled_series,
+    model_features,
+    scale_values,
+    split_datasets,
+    streaming_split_bounds,
+    training_ranges,
+    training_rescale,
+)
+from forecast.model import GLOBAL_MODEL_DIR, GlobalWeatherLSTM, WeatherLSTM
 
 logger = get_logger()
 
 
+def fit_model(
+    model: nn.Module,
+    train_loader: DataLoader,
+    val_loader: DataLoader,
+    epochs: int,
+    lr: float,
+    patience: int,
+    device,
+) -> float:
+    """Train with Adam/MSE and early stopping, leaving the best weights loaded.
+
+    Batches are tuples whose last element is the target; everything before
+    it is passed to the model (so city-conditioned models receive
+    `(x, city_idx)`).
+
+    Returns the best validation loss.
+    """
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    criterion = nn.MSELoss()
+
+    best_val_loss = float("inf")
+    epochs_no_improve = 0
+    best_state = None
+
+    for epoch in range(1, epochs + 1):
+        # Train
+        model.train()
+        train_loss = 0.0
+        for *inputs, yb in train_loader:
+            inputs, yb = [t.to(device) for t in inputs], yb.to(device)
+            pred = model(*inputs)
+            loss = criterion(pred, yb)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item() * len(yb)
+        train_loss /= len(train_loader.dataset)
+
+        # Validate
+        model.eval()
+        val_loss = 0.0
+        with torch.no_grad():
+            for *inputs, yb in val_loader:
+                inputs, yb = [t.to(device) for t in inputs], yb.to(device)
+                pred = model(*inputs)
+                val_loss += criterion(pred, yb).item() * len(yb)
+        val_loss /= len(val_loader.dataset)
+
+        if epoch % 5 == 0 or epoch == 1:
+            logger.info(
+                f"  Epoch {epoch}/{epochs} — train_loss={train_loss:.6f}, val_loss={val_loss:.6f}"
+            )
+
+        if val_loss < best_val_loss:
+            best_val_loss = val_loss
+            epochs_no_improve = 0
+            best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+        else:
+            epochs_no_improve += 1
+            if epochs_no_improve >= patience:
+                logger.info(f"  Early stopping at epoch {epoch}")
+                break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+
+    return best_val_loss
+
+
 def train_model(
     city: str,
     conn,
@@ -24,110 +110,246 @@ def train_model(
     num_layers: int = 2,
     dropout: float = 0.2,
     patience: int = 7,
+    extra_meta: Optional[dict] = None,
+    features: Optional[List[str]] = None,
+    corpus_dir: Optional[str] = None,
+    streaming: bool = False,
+    chunk_rows: int = 50_000,
+    shuffle_buffer: int = 10_000,
+    max_gap_hours: int = 0,
 ) -> str:
     """Train a WeatherLSTM model for a single city.
 
+    `extra_meta` is merged into the saved metadata (e.g. the hyperparameter
+    search result that produced this configuration).
+
+    `features` adds engineered inputs from the weather_features table (see
+    etl.feature_engineering). The model still predicts FEATURES only.
+
+    With `corpus_dir`, the base series is read through a memory map of the
+    exported corpus (see etl.corpus) instead of being fetched from DuckDB.
+
+    With `streaming`, windows are read from weather_hourly in chunks of
+    `chunk_rows` through StreamingWeatherDataset and shuffled in a buffer of
+    `shuffle_buffer` samples, so memory does not grow with history length.
+
+    Windows never span missing or duplicate hours; in both modes gaps of up
+    to `max_gap_hours` are first filled by interpolation in DuckDB.
+
+    Inputs are normalized with min/max ranges of the training split only,
+    applied per window so a memory-mapped corpus is never copied into the
+    trainer; the ranges are saved in the meta and recorded in model_scaling under the
+    model version.
+
     Returns the directory path where model artifacts are saved.
     """
     logger.info(f"Training {horizon}h model for {city} (lookback={lookback})")
 
-    # Fetch all available data
-    df = conn.execute(
-        """
-        SELECT timestamp, temperature_2m, relativehumidity_2m, precipitation
-        FROM weather_hourly
-        WHERE city = ?
-        ORDER BY timestamp
-        """,
-        [city],
-    ).fetchdf()
-
-    if len(df) < lookback + horizon + 100:
+    inputs = model_features(features)
+    if streaming:
+        if inputs != FEATURES:
+            raise ValueError("Streaming training only supports the base FEATURES")
+        series = hourly_series_query(max_gap_hours)
+        n_rows = conn.execute(f"SELECT COUNT(*) FROM ({series})", [city]).fetchone()[0]
+    elif inputs == FEATURES:
+        # All available data, normalized by the feature store; each window
+        # is re-normalized with the training split's ranges as it is read
+        timestamps, scaled, data_min, data_max = load_scaled_series(
+            conn, city, corpus_dir, max_gap_hours=max_gap_hours
+        )
+        rescale, data_min, data_max = training_rescale(scaled, data_min, data_max)
+        n_rows = len(scaled)
+    else:
+        timestamps, values = get_feature_history(conn, city, inputs)
+        data_min, data_max = training_ranges(values)
+        scaled = fill_engineered(scale_values(values, data_min, data_max))
+        rescale = None
+        n_rows = len(scaled)
+
+    if n_rows < lookback + horizon + 100:
         raise ValueError(
-            f"Not enough data for {city}: {len(df)} rows, "
+            f"Not enough data for {city}: {n_rows} rows, "
             f"need at least {lookback + horizon + 100}"
         )
 
-    logger.info(f"  Data rows: {len(df)}")
+    logger.info(f"  Data rows: {n_rows}")
 
-    train_ds, val_ds, test_ds, scaler = prepare_datasets(df, lookback, horizon)
+    if streaming:
+        val_start, test_start = streaming_split_bounds(conn, city, max_gap_hours=max_gap_hours)
+        data_min, data_max = get_scaling_params(conn, city, FEATURES, end=val_start)
+        fit_end = conn.execute(
+            f"SELECT MAX(timestamp) FROM ({series}) WHERE timestamp < ?", [city, test_start]
+        ).fetchone()[0]
+        fit_end = fit_end.isoformat(timespec="seconds")
+        train_ds, val_ds, test_ds = [
+            StreamingWeatherDataset(
+                conn, city, lookback, horizon, data_min, data_max,
+                start=start, end=end, chunk_rows=chunk_rows,
+                shuffle_buffer=shuffle_buffer if start is None else 0,
+                max_gap_hours=max_gap_hours,
+            )
+            for start, end in [(None, val_start), (val_start, test_start), (test_start, None)]
+        ]
+    else:
+        train_ds, val_ds, test_ds = split_datasets(
+            scaled, lookback, horizon, num_targets=len(FEATURES), timestamps=timestamps, rescale=rescale
+        )
+        fit_end = fit_end_timestamp(timestamps)
     logger.info(
         f"  Splits: train={len(train_ds)}, val={len(val_ds)}, test={len(test_ds)}"
     )
 
-    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True)
+    # Streaming datasets shuffle through their own buffer
+    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=not streaming)
     val_loader = DataLoader(val_ds, batch_size=batch_size)
 
     device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
 
     model = WeatherLSTM(
-        num_features=len(FEATURES),
+        num_features=len(inputs),
         hidden_size=hidden_size,
         num_layers=num_layers,
         dropout=dropout,
         horizon=horizon,
+        num_targets=len(FEATURES),
     ).to(device)
 
-    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
-    criterion = nn.MSELoss()
+    best_val_loss = fit_model(
+        model, train_loader, val_loader, epochs, lr, patience, device
+    )
 
-    best_val_loss = float("inf")
-    epochs_no_improve = 0
-    best_state = None
+    # Save artifacts
+    horizon_label = "24h" if horizon <= 24 else "7d"
+    save_dir = os.path.join("models", city.replace(" ", "_").lower())
+    os.makedirs(save_dir, exist_ok=True)
 
-    for epoch in range(1, epochs + 1):
-        # Train
-        model.train()
-        train_loss = 0.0
-        for xb, yb in train_loader:
-            xb, yb = xb.to(device), yb.to(device)
-            pred = model(xb)
-            loss = criterion(pred, yb)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-            train_loss += loss.item() * len(xb)
-        train_loss /= len(train_ds)
+    model_path = os.path.join(save_dir, f"lstm_{horizon_label}.pt")
+    meta_path = os.path.join(save_dir, f"meta_{horizon_label}.pt")
 
-        # Validate
-        model.eval()
-        val_loss = 0.0
-        with torch.no_grad():
-            for xb, yb in val_loader:
-                xb, yb = xb.to(device), yb.to(device)
-                pred = model(xb)
-                val_loss += criterion(pred, yb).item() * len(xb)
-        val_loss /= len(val_ds)
+    trained_at = datetime.now(timezone.utc)
+    model_version = f"lstm_{horizon_label}_{trained_at:%Y%m%dT%H%M%S}"
 
-        if epoch % 5 == 0 or epoch == 1:
-            logger.info(
-                f"  Epoch {epoch}/{epochs} — train_loss={train_loss:.6f}, val_loss={val_loss:.6f}"
-            )
+    torch.save(model.state_dict(), model_path)
+    torch.save(
+        {
+            "lookback": lookback,
+            "horizon": horizon,
+            "hidden_size": hidden_size,
+            "num_layers": num_layers,
+            "dropout": dropout,
+            "num_features": len(inputs),
+            "num_targets": len(FEATURES),
+            "features": inputs,
+            "max_gap_hours": max_gap_hours,
+            # Latest hour seen in training or validation; backtests start after it
+            "fit_end": fit_end,
+            # Training-split ranges used for normalization
+            "scale_min": data_min.tolist(),
+            "scale_max": data_max.tolist(),
+            "best_val_loss": best_val_loss,
+            "model_version": model_version,
+            "lr": lr,
+            **(extra_meta or {}),
+        },
+        meta_path,
+    )
+    record_model_scaling(conn, model_version, city, inputs, data_min, data_max)
 
-        if val_loss < best_val_loss:
-            best_val_loss = val_loss
-            epochs_no_improve = 0
-            best_state = model.state_dict().copy()
-        else:
-            epochs_no_improve += 1
-            if epochs_no_improve >= patience:
-                logger.info(f"  Early stopping at epoch {epoch}")
-                break
+    logger.info(
+        f"  Model saved to {model_path} (best val_loss={best_val_loss:.6f})"
+    )
+    return save_dir
+
+
+def train_global_model(
+    cities: List[str],
+    conn,
+    lookback: int = 168,
+    horizon: int = 24,
+    epochs: int = 50,
+    lr: float = 0.001,
+    batch_size: int = 32,
+    hidden_size: int = 64,
+    num_layers: int = 2,
+    dropout: float = 0.2,
+    patience: int = 7,
+    embedding_dim: int = 8,
+    corpus_dir: Optional[str] = None,
+    max_gap_hours: int = 0,
+) -> str:
+    """Train one GlobalWeatherLSTM on the windows of every city.
+
+    Each city is normalized with the min/max of its own training split and
+    tagged with an embedding index. Cities with too little history are
+    skipped. The per-city ranges are saved in the meta and model_scaling. With `corpus_dir`,
+    every city's series is memory-mapped from the exported corpus and
+    re-normalized per window, so cities share the mapping instead of each
+    holding a copy. Gaps are
+    handled as in train_model.
+
+    Returns the directory path where model artifacts are saved.
+    """
+    logger.info(f"Training global {horizon}h model for {len(cities)} cities (lookback={lookback})")
+
+    train_parts, val_parts = [], []
+    trained_cities, scale_min, scale_max, fit_end = [], {}, {}, {}
+    for city in cities:
+        timestamps, scaled, data_min, data_max = load_scaled_series(
+            conn, city, corpus_dir, max_gap_hours=max_gap_hours
+        )
+        if len(scaled) < lookback + horizon + 100:
+            logger.warning(f"  Skipping {city}: only {len(scaled)} rows")
+            continue
+
+        rescale, data_min, data_max = training_rescale(scaled, data_min, data_max)
+        train_ds, val_ds, _ = split_datasets(
+            scaled, lookback, horizon, timestamps=timestamps, rescale=rescale
+        )
+        city_idx = len(trained_cities)
+        train_parts.append(CityTaggedDataset(train_ds, city_idx))
+        val_parts.append(CityTaggedDataset(val_ds, city_idx))
+        trained_cities.append(city)
+        scale_min[city] = data_min.tolist()
+        scale_max[city] = data_max.tolist()
+        fit_end[city] = fit_end_timestamp(timestamps)
+
+    if not trained_cities:
+        raise ValueError("No city has enough data to train a global model")
+
+    train_ds, val_ds = ConcatDataset(train_parts), ConcatDataset(val_parts)
+    logger.info(f"  Cities: {len(trained_cities)}, train={len(train_ds)}, val={len(val_ds)}")
+
+    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=True)
+    val_loader = DataLoader(val_ds, batch_size=batch_size)
+
+    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+
+    model = GlobalWeatherLSTM(
+        num_cities=len(trained_cities),
+        num_features=len(FEATURES),
+        hidden_size=hidden_size,
+        num_layers=num_layers,
+        dropout=dropout,
+        horizon=horizon,
+        embedding_dim=embedding_dim,
+    ).to(device)
+
+    best_val_loss = fit_model(
+        model, train_loader, val_loader, epochs, lr, patience, device
+    )
 
     # Save artifacts
     horizon_label = "24h" if horizon <= 24 else "7d"
-    save_dir = os.path.join("models", city.replace(" ", "_").lower())
+    save_dir = os.path.join("models", GLOBAL_MODEL_DIR)
     os.makedirs(save_dir, exist_ok=True)
 
     model_path = os.path.join(save_dir, f"lstm_{horizon_label}.pt")
-    scaler_path = os.path.join(save_dir, f"scaler_{horizon_label}.joblib")
     meta_path = os.path.join(save_dir, f"meta_{horizon_label}.pt")
 
-    if best_state is not None:
-        model.load_state_dict(best_state)
+    trained_at = datetime.now(timezone.utc)
+    model_version = f"global_{horizon_label}_{trained_at:%Y%m%dT%H%M%S}"
 
     torch.save(model.state_dict(), model_path)
-    joblib.dump(scaler, scaler_path)
     torch.save(
         {
             "lookback": lookback,
@@ -136,12 +358,22 @@ def train_model(
             "num_layers": num_layers,
             "dropout": dropout,
             "num_features": len(FEATURES),
+            "embedding_dim": embedding_dim,
+            "max_gap_hours": max_gap_hours,
+            "cities": trained_cities,
+            "fit_end": fit_end,
+            "scale_min": scale_min,
+            "scale_max": scale_max,
             "best_val_loss": best_val_loss,
+            "model_version": model_version,
+            "lr": lr,
         },
         meta_path,
     )
+    for city in trained_cities:
+        record_model_scaling(conn, model_version, city, FEATURES, scale_min[city], scale_max[city])
 
     logger.info(
-        f"  Model saved to {model_path} (best val_loss={best_val_loss:.6f})"
+        f"  Global model saved to {model_path} (best val_loss={best_val_loss:.6f})"
     )
     return save_dir
@@ -0,0 +1,262 @@
+import os
+import random
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+import torch.nn as nn
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from etl.logger import get_logger
+from forecast.dataset import load_scaled_series, training_rescale, valid_window_starts
+from forecast.model import WeatherLSTM
+
+logger = get_logger()
+
+DEFAULT_SPACE = {
+    "hidden_size": [32, 64, 128],
+    "num_layers": [1, 2, 3],
+    "dropout": [0.0, 0.2, 0.3],
+    "lr": [0.0005, 0.001, 0.003],
+}
+
+
+def sample_trials(space: Dict[str, list], n_trials: int, seed: int = 0) -> List[dict]:
+    """Draw up to n_trials distinct configurations from a grid search space."""
+    keys = sorted(space)
+    grid_size = int(np.prod([len(space[k]) for k in keys]))
+    rng = random.Random(seed)
+
+    trials, seen = [], set()
+    while len(trials) < min(n_trials, grid_size):
+        params = {k: rng.choice(space[k]) for k in keys}
+        key = tuple(params[k] for k in keys)
+        if key not in seen:
+            seen.add(key)
+            trials.append(params)
+    return trials
+
+
+def _should_prune(reports, lock, trial_id: int, epoch: int, val_loss: float,
+                  warmup_epochs: int, min_peers: int) -> bool:
+    """Median pruning: stop a trial whose val loss is worse than the median
+    of every other trial that reached the same epoch."""
+    with lock:
+        reports[(trial_id, epoch)] = val_loss
+        peers = [v for (t, e), v in reports.items() if e == epoch and t != trial_id]
+    if epoch < warmup_epochs or len(peers) < min_peers:
+        return False
+    return val_loss > float(np.median(peers))
+
+
+def _run_trial(
+    trial_id: int,
+    params: dict,
+    series: torch.Tensor,
+    rescale: torch.Tensor,
+    train_targets: np.ndarray,
+    val_targets: np.ndarray,
+    horizon: int,
+    epochs: int,
+    batch_size: int,
+    reports,
+    lock,
+    warmup_epochs: int,
+    min_peers: int,
+    seed: int,
+) -> dict:
+    """Train one configuration on the shared series and report val loss per epoch.
+
+    `series` lives in shared memory; windows are gathered per batch from
+    strided views of it, so trials never hold a private copy of the dataset.
+    Each batch is mapped onto the training split's ranges with the per-feature
+    `rescale` (factor, offset) rows.
+    """
+    torch.set_num_threads(1)
+    torch.manual_seed(seed + trial_id)
+
+    lookback = params["lookback"]
+    x_windows = series.unfold(0, lookback, 1)  # (n - lookback + 1, F, lookback)
+    y_windows = series.unfold(0, horizon, 1)  # (n - horizon + 1, F, horizon)
+
+    factor, offset = rescale
+
+    def batch(targets):
+        t = torch.from_numpy(targets)
+        return (
+            x_windows[t - lookback].transpose(1, 2) * factor + offset,
+            y_windows[t].transpose(1, 2) * factor + offset,
+        )
+
+    model = WeatherLSTM(
+        num_features=series.shape[1],
+        hidden_size=params["hidden_size"],
+        num_layers=params["num_layers"],
+        dropout=params["dropout"],
+        horizon=horizon,
+    )
+    optimizer = torch.optim.Adam(model.parameters(), lr=params["lr"])
+    criterion = nn.MSELoss()
+
+    best_val_loss = float("inf")
+    for epoch in range(1, epochs + 1):
+        model.train()
+        order = np.random.permutation(train_targets)
+        for start in range(0, len(order), batch_size):
+            xb, yb = batch(order[start : start + batch_size])
+            loss = criterion(model(xb), yb)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        model.eval()
+        val_loss = 0.0
+        with torch.no_grad():
+            for start in range(0, len(val_targets), batch_size):
+                xb, yb = batch(val_targets[start : start + batch_size])
+                val_loss += criterion(model(xb), yb).item() * len(xb)
+        val_loss /= len(val_targets)
+        best_val_loss = min(best_val_loss, val_loss)
+
+        if _should_prune(reports, lock, trial_id, epoch, val_loss, warmup_epochs, min_peers):
+            return {"params": params, "best_val_loss": best_val_loss,
+                    "epochs": epoch, "pruned": True}
+
+    return {"params": params, "best_val_loss": best_val_loss,
+            "epochs": epochs, "pruned": False}
+
+
+def search_hyperparameters(
+    city: str,
+    conn,
+    horizon: int = 24,
+    lookbacks: Optional[List[int]] = None,
+    space: Optional[Dict[str, list]] = None,
+    n_trials: int = 12,
+    max_workers: Optional[int] = None,
+    epochs: int = 20,
+    batch_size: int = 32,
+    warmup_epochs: int = 3,
+    min_peers: int = 2,
+    train_frac: float = 0.7,
+    val_frac: float = 0.15,
+    seed: int = 0,
+    corpus_dir: Optional[str] = None,
+    max_gap_hours: int = 0,
+    start_method: str = "spawn",
+) -> dict:
+    """Search WeatherLSTM hyperparameters for one city with parallel trials.
+
+    The city's normalized history is read once from the feature store into
+    a shared-memory tensor, or memory-mapped from the exported corpus when
+    `corpus_dir` has one (trial processes then share its page cache). Trials
+    normalize with the ranges of the training split only. Every
+    trial uses the same forecast targets regardless of its lookback, so val
+    losses are comparable and can drive median pruning.
+
+    Args:
+        city: City name.
+        conn: DuckDB connection.
+        horizon: Forecast horizon in hours.
+        lookbacks: Candidate lookback lengths in hours.
+        space: Grid of hidden_size, num_layers, dropout and lr values.
+        n_trials: Number of configurations to try.
+        max_workers: Parallel trial processes. Defaults to the CPU count.
+        epochs: Maximum epochs per trial.
+        batch_size: Training batch size.
+        warmup_epochs: Epochs before a trial can be pruned.
+        min_peers: Other trials that must have reported an epoch before
+            pruning against it.
+        train_frac: Fraction of data for training.
+        val_frac: Fraction of data for validation.
+        seed: Seed for trial sampling and model initialisation.
+        corpus_dir: Directory of the exported training corpus (etl.corpus).
+        max_gap_hours: Longest gap filled by interpolation; windows never
+            span remaining gaps.
+        start_method: multiprocessing start method for trial processes.
+            "fork" is unsafe once torch has started its thread pools and is
+            unavailable or deprecated on some platforms.
+
+    Returns:
+        Dict with the winning lookback, hidden_size, num_layers, dropout,
+        lr and best_val_loss, plus trial and pruned counts.
+    """
+    lookbacks = lookbacks or [168]
+    space = dict(space or DEFAULT_SPACE)
+    space["lookback"] = lookbacks
+
+    # Copy-on-write mapping so torch can wrap it without a private copy
+    timestamps, scaled, data_min, data_max = load_scaled_series(
+        conn, city, corpus_dir, mmap_mode="c", max_gap_hours=max_gap_hours
+    )
+    n = len(scaled)
+    train_end = int(n * train_frac)
+
+    # Affine map from the feature store's ranges to the training split's,
+    # applied per batch so the shared series is never rewritten
+    rescale = torch.from_numpy(training_rescale(scaled, data_min, data_max, train_frac)[0])
+    val_end = int(n * (train_frac + val_frac))
+    max_lookback = max(lookbacks)
+
+    # Same target positions for every trial, each with max_lookback + horizon
+    # consecutive hours around it; the val region never reads inputs from
+    # before its own start, matching prepare_datasets
+    targets = valid_window_starts(timestamps, max_lookback + horizon, scaled) + max_lookback
+    train_targets = targets[targets + horizon <= train_end]
+    val_targets = targets[(targets - max_lookback >= train_end) & (targets + horizon <= val_end)]
+    if len(train_targets) == 0 or len(val_targets) == 0:
+        raise ValueError(
+            f"Not enough data to search {city}: {n} rows for lookback up to "
+            f"{max_lookback} and horizon {horizon}"
+        )
+
+    series = torch.from_numpy(np.ascontiguousarray(scaled))
+    if not isinstance(scaled, np.memmap):
+        series.share_memory_()
+
+    trials = sample_trials(space, n_trials, seed)
+    max_workers = max_workers or min(len(trials), os.cpu_count() or 1)
+    logger.info(
+        f"Searching {len(trials)} configs for {city} ({horizon}h) on {max_workers} workers"
+    )
+
+    ctx = mp.get_context(start_method)
+    manager = ctx.Manager()
+    reports = manager.dict()
+    lock = manager.Lock()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        futures = [
+            pool.submit(
+                _run_trial, i, params, series, rescale, train_targets, val_targets, horizon,
+                epochs, batch_size, reports, lock, warmup_epochs, min_peers, seed,
+            )
+            for i, params in enumerate(trials)
+        ]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"  Trial failed for {city}: {e}")
+    manager.shutdown()
+
+    if not results:
+        raise RuntimeError(f"All search trials failed for {city}")
+
+    for r in sorted(results, key=lambda r: r["best_val_loss"]):
+        status = "pruned" if r["pruned"] else "complete"
+        logger.info(
+            f"  {r['params']} — val_loss={r['best_val_loss']:.6f} "
+            f"({status} after {r['epochs']} epochs)"
+        )
+
+    # Prefer configurations that trained to completion over pruned ones
+    completed = [r for r in results if not r["pruned"]] or results
+    best = min(completed, key=lambda r: r["best_val_loss"])
+    return {
+        **best["params"],
+        "best_val_loss": best["best_val_loss"],
+        "trials": len(results),
+        "pruned": sum(r["pruned"] for r in results),
+    }
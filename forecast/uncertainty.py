@@ -0,0 +1,149 @@
+import duckdb
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+
+from etl.logger import get_logger
+from forecast.dataset import FEATURES
+
+logger = get_logger()
+
+# Physical bounds applied to interval edges, matching generate_forecast clipping
+FEATURE_BOUNDS = {
+    "temperature_2m": (None, None),
+    "relativehumidity_2m": (0, 100),
+    "precipitation": (0, None),
+}
+
+
+def create_interval_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS forecast_intervals (
+            city VARCHAR,
+            horizon_hours INTEGER,
+            lead_hours INTEGER,
+            feature VARCHAR,
+            q_lower DOUBLE,
+            q_upper DOUBLE,
+            n BIGINT,
+            computed_at TIMESTAMP
+        )
+        """
+    )
+
+
+def _table_exists(conn, name: str) -> bool:
+    return (
+        conn.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?",
+            [name],
+        ).fetchone()[0]
+        > 0
+    )
+
+
+def compute_interval_table(
+    conn, lower: float = 0.05, upper: float = 0.95, min_samples: int = 20
+) -> int:
+    """Rebuild per-city, per-lead-hour residual quantiles.
+
+    Residuals (actual - predicted) come from forecast_backtests and, when
+    present, live forecast_verification rows. Quantiles are computed in one
+    grouped DuckDB pass; leads with fewer than `min_samples` residuals are
+    left out so sparse tails don't produce misleading bands.
+
+    Returns:
+        Number of (city, horizon, lead, feature) rows written.
+    """
+    create_interval_table(conn)
+
+    sources = []
+    if _table_exists(conn, "forecast_backtests"):
+        sources.append(
+            " UNION ALL ".join(
+                f"""
+                SELECT city, horizon_hours, lead_hours, '{feat}' AS feature,
+                       actual_{feat} - pred_{feat} AS residual
+                FROM forecast_backtests
+                """
+                for feat in FEATURES
+            )
+        )
+    if _table_exists(conn, "forecast_verification"):
+        sources.append(
+            " UNION ALL ".join(
+                f"""
+                SELECT city, horizon_hours, lead_hours, '{feat}' AS feature,
+                       -error_{feat} AS residual
+                FROM forecast_verification
+                """
+                for feat in FEATURES
+            )
+        )
+    if not sources:
+        logger.warning("No backtest or verification data to compute intervals from")
+        return 0
+
+    conn.execute("DELETE FROM forecast_intervals")
+    written = conn.execute(
+        f"""
+        INSERT INTO forecast_intervals
+        SELECT city, horizon_hours, lead_hours, feature,
+               quantile_cont(residual, ?) AS q_lower,
+               quantile_cont(residual, ?) AS q_upper,
+               COUNT(*) AS n,
+               ?
+        FROM ({" UNION ALL ".join(sources)})
+        WHERE residual IS NOT NULL
+        GROUP BY city, horizon_hours, lead_hours, feature
+        HAVING COUNT(*) >= ?
+        """,
+        [lower, upper, datetime.now(timezone.utc).replace(tzinfo=None), min_samples],
+    ).fetchone()[0]
+
+    logger.info(f"Computed {written} forecast interval rows ({lower:.0%}-{upper:.0%})")
+    return written
+
+
+def load_intervals(conn, city: str, horizon: int) -> pd.DataFrame:
+    """Fetch the interval lookup rows for one city and horizon."""
+    try:
+        return conn.execute(
+            """
+            SELECT lead_hours, feature, q_lower, q_upper
+            FROM forecast_intervals
+            WHERE city = ? AND horizon_hours = ?
+            """,
+            [city, horizon],
+        ).fetchdf()
+    except duckdb.CatalogException:
+        return pd.DataFrame(columns=["lead_hours", "feature", "q_lower", "q_upper"])
+
+
+def apply_intervals(forecast_df: pd.DataFrame, intervals: pd.DataFrame) -> pd.DataFrame:
+    """Add <feature>_lower / <feature>_upper columns to a forecast.
+
+    The forecast rows are ordered by lead hour (row i is lead i + 1), so the
+    residual quantiles are added as whole arrays per feature. Leads with no
+    interval data get NaN bounds.
+    """
+    if intervals.empty:
+        return forecast_df
+
+    leads = np.arange(1, len(forecast_df) + 1)
+    out = forecast_df.copy()
+    for feat in FEATURES:
+        feat_q = intervals[intervals["feature"] == feat].set_index("lead_hours")
+        q_lower = feat_q["q_lower"].reindex(leads).to_numpy()
+        q_upper = feat_q["q_upper"].reindex(leads).to_numpy()
+
+        pred = out[feat].to_numpy()
+        lower, upper = pred + q_lower, pred + q_upper
+        lo, hi = FEATURE_BOUNDS[feat]
+        if lo is not None or hi is not None:
+            lower, upper = np.clip(lower, lo, hi), np.clip(upper, lo, hi)
+        out[f"{feat}_lower"] = lower
+        out[f"{feat}_upper"] = upper
+
+    return out
@@ -1,83 +1,269 @@
-from etl.extract import extract_weather_data
-from etl.transform import transform_weather_data, load_raw_json
-from etl.load import connect_duckdb, upsert_weather_data, backfill_city
+from etl.extract import (
+    MAX_RETRY_AFTER_SECONDS,
+    extract_weather_locations,
+    mark_location_loaded,
+    payload_hash,
+)
+from etl.transform import transform_and_validate, load_raw_json
+from etl.load import (
+    append_weather_revisions,
+    backfill_city,
+    connect_duckdb,
+    create_revision_tables,
+    create_weather_table,
+    upsert_weather_data,
+)
+from etl.corpus import export_corpus
+from etl.dqc import create_dq_tables, dqc_options, record_dq_results
+from etl.locations import record_grid_point, register_locations
+from etl.metrics import complete_run, span, start_run
+from etl.snapshot import publish_snapshot
+from etl.variables import load_variables, variable_names
+from etl.feature_engineering import rebuild_weather_features
+from etl.feature_store import rebuild_feature_stats
+from etl.ledger import diff_against_warehouse, last_payload_hash, record_payload
 from etl.logger import get_logger
 from etl.config import load_config
 from etl.transform import save_processed_parquet
 
 import time
 import traceback
+from datetime import datetime, timezone
 
 logger = get_logger()
 
-def run_pipeline(): 
-    config = load_config()
+def process_location(conn, config: dict, location: dict, raw_file, run=None) -> int:
+    """
+    Transform and load one extracted location.
+
+    `raw_file` is what extraction returned for it: a raw file path, None for
+    a payload whose content hash matches the last one loaded, or the
+    exception it failed with. Transform and load are recorded as spans of
+    `run` (see etl.metrics). Returns the number of new or revised hours
+    written to weather_hourly.
+    """
+    settings = config.get("settings", {})
+    cache_dir = config.get("extract", {}).get("cache_dir")
+    variables = load_variables(config)
+    hourly = variable_names(variables)
+    city = location.get("name", "unknown")
+    latitude = location["latitude"]
+    longitude = location["longitude"]
+
+    logger.info(f"--- Processing location: {city} ({latitude}, {longitude}) ---")
+
+    if isinstance(raw_file, Exception):
+        logger.error(f"Extract failed for {city}, skipping: {raw_file}")
+        return 0
+    if raw_file is None:
+        logger.info(f"Payload for {city} unchanged since last load; skipping transform and load")
+        return 0
+    logger.info(f"Extract step completed. Raw file: {raw_file}")
+
+    raw_json = load_raw_json(raw_file)
+    # Open-Meteo snaps to its grid; keep the served point so backfill can resolve it
+    record_grid_point(conn, city, raw_json)
+    # The API does not report an issue time, so the fetch is stamped as the issue
+    issued_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    # Checked against payload_ledger, so an identical payload is skipped even
+    # without the extract cache or after its entry expired
+    fingerprint = payload_hash(raw_json)
+    if fingerprint == last_payload_hash(conn, city):
+        logger.info(f"Payload for {city} matches the last one loaded; skipping transform and load")
+        if cache_dir:
+            mark_location_loaded(cache_dir, latitude, longitude, hourly)
+        return 0
+
+    # -----------------------------
+    # TRANSFORM
+    # -----------------------------
+    with span(run, "transform", city) as transform_span:
+        transform_span["rows_in"] = len(raw_json.get("hourly", {}).get("time", []))
+        df, quarantined, dq_metrics = transform_and_validate(
+            raw_json=raw_json,
+            latitude=latitude,
+            longitude=longitude,
+            city=city,
+            variables=variables,
+            **dqc_options(config),
+        )
+        transform_span["rows_out"] = len(df)
+        # Rows failing a data quality rule are held back with their reasons; the rest load
+        if record_dq_results(conn, city, quarantined, dq_metrics, issued_at, variables):
+            logger.warning(f"Quarantined {len(quarantined)} rows for {city} (see dq_quarantine)")
+        logger.info(f"Transform step completed. Records transformed: {len(df)}")
+
+        # Every changed hour is also kept as a revision with its issue time
+        if settings.get("versioned_storage", False):
+            revisions = append_weather_revisions(conn, df, issued_at, variables)
+            logger.info(f"Appended {revisions} forecast revisions for {city}")
+
+        # Only new hours and revised ones go on to Parquet and the loader
+        changed_df, revised = diff_against_warehouse(conn, df, hourly)
+        if revised:
+            logger.info(f"{revised} already-loaded hours for {city} have revised values")
+    logger.info(f"Transform step duration: {transform_span['wall_seconds']:.3f} seconds")
+
+    if df.empty:
+        # Not fingerprinted, so the payload is retried once the rules or the data are fixed
+        logger.warning(f"Every row for {city} was quarantined; nothing to load")
+        return 0
+    if changed_df.empty:
+        logger.info(f"No new or revised hours for {city}; skipping Parquet and load")
+        record_payload(conn, city, fingerprint, df, 0, raw_json.get("generationtime_ms"))
+        if cache_dir:
+            mark_location_loaded(cache_dir, latitude, longitude, hourly)
+        return 0
+
+    # -----------------------------
+    # LOAD (processed Parquet, then the warehouse)
+    # -----------------------------
+    with span(run, "load", city, rows_in=len(changed_df)) as load_span:
+        processed_path = config["paths"]["processed_path"]
+        parquet_file = save_processed_parquet(changed_df, processed_path, city)
+        logger.info(f"Processed data saved to: {parquet_file}")
+
+        upsert_weather_data(conn, changed_df, variables, revise=True)
+        record_payload(conn, city, fingerprint, df, len(changed_df), raw_json.get("generationtime_ms"))
+        if cache_dir:
+            mark_location_loaded(cache_dir, latitude, longitude, hourly)
+        load_span["rows_out"] = len(changed_df)
+    logger.info(f"Load step completed for {city}. Rows written: {len(changed_df)} ({revised} revised)")
+    logger.info(f"Load step duration: {load_span['wall_seconds']:.3f} seconds")
+
+    # -----------------------------
+    # ISSUE FORECASTS (scored by the loader once actuals arrive)
+    # -----------------------------
+    if settings.get("store_forecasts", False):
+        from forecast.predict import generate_forecast, save_forecast
+
+        for horizon in (24, 168):
+            try:
+                issued = save_forecast(conn, generate_forecast(city, conn, horizon))
+                logger.info(f"Stored {issued} forecast rows for {city} ({horizon}h)")
+            except (FileNotFoundError, ValueError) as e:
+                logger.info(f"Skipping {horizon}h forecast for {city}: {e}")
+
+    return len(changed_df)
+
+def finish_run(conn, config: dict, locations: list, run=None, changed: bool = True, backfill: bool = True) -> bool:
+    """
+    Steps that run once after every location has been processed.
+
+    The full-table backfill runs only with `backfill`; the corpus export only
+    when `changed` (some rows were loaded). A run that loaded nothing leaves
+    the previous export in place. Returns whether the data changed, i.e.
+    whether a snapshot should be published (see publish_read_snapshot) once
+    the run itself has been recorded.
+    """
+    # Backfill city for any existing nulls (e.g., older ingested rows)
+    if backfill:
+        with span(run, "backfill") as backfill_span:
+            backfill_span["rows_out"] = backfill_city(conn, locations)
+            if backfill_span["rows_out"]:
+                # Newly attributed rows were not part of any per-city statistics
+                rebuild_feature_stats(conn)
+                rebuild_weather_features(conn)
+        changed = changed or backfill_span["rows_out"] > 0
 
+    if not changed:
+        logger.info("No rows loaded; skipping corpus export and snapshot")
+        return False
+
+    # -----------------------------
+    # EXPORT TRAINING CORPUS (memory-mapped, read by training workers)
+    # -----------------------------
+    corpus_path = config["paths"].get("corpus_path")
+    if corpus_path:
+        with span(run, "export") as export_span:
+            max_gap_hours = config.get("model", {}).get("max_gap_hours", 0)
+            manifest = export_corpus(
+                conn, corpus_path, max_gap_hours=max_gap_hours,
+                min_interval_minutes=config.get("settings", {}).get("corpus_export_interval_minutes", 0),
+            )
+        logger.info(f"Training corpus at {corpus_path} covers {len(manifest)} cities")
+        logger.info(f"Export step duration: {export_span['wall_seconds']:.3f} seconds")
+    return True
+
+def publish_read_snapshot(conn, config: dict):
+    """
+    Publish a read snapshot for the dashboard (it reads this, never the live
+    file). Called after complete_run, so the snapshot carries the run's own
+    pipeline_runs / pipeline_spans rows; its timing is logged only.
+    """
+    snapshot_path = config["paths"].get("snapshot_path")
+    if not snapshot_path:
+        return
+    with span(None, "snapshot") as snapshot_span:
+        snapshot = publish_snapshot(conn, snapshot_path, config.get("settings", {}).get("snapshot_keep", 3))
+    if snapshot is None:
+        logger.info(f"Snapshot at {snapshot_path} already has the current data")
+    else:
+        logger.info(f"Published snapshot {snapshot['version']} to {snapshot_path}")
+    logger.info(f"Snapshot step duration: {snapshot_span['wall_seconds']:.3f} seconds")
+
+def prepare_warehouse(conn, config: dict, locations: list):
+    """Register the configured locations and add columns for any newly
+    configured hourly variables, once per run."""
+    variables = load_variables(config)
+    register_locations(conn, locations)
+    create_weather_table(conn, variables)
+    create_dq_tables(conn, variables)
+    if config.get("settings", {}).get("versioned_storage", False):
+        create_revision_tables(conn, variables)
+
+def get_locations(config: dict) -> list:
     locations = config.get("locations") or ([config["location"]] if "location" in config else [])
     if not locations:
         raise ValueError("No locations defined in config.yaml")
+    return locations
+
+def run_pipeline(): 
+    config = load_config()
+    locations = get_locations(config)
 
     raw_path = config["paths"]["raw_path"]
     duckdb_path = config["paths"]["duckdb_path"]
 
     print("=== WEATHER ETL PIPELINE STARTED ===")
     start_time = time.time()
+    run = start_run("pipeline")
+    status = "failed"
+    conn = None
+    changed = False
 
     try:
         conn = connect_duckdb(duckdb_path)
+        prepare_warehouse(conn, config, locations)
 
-        total_rows = 0
-        for location in locations:
-            city = location.get("name", "unknown")
-            latitude = location["latitude"]
-            longitude = location["longitude"]
-
-            logger.info(f"--- Processing location: {city} ({latitude}, {longitude}) ---")
-
-            # -----------------------------
-            # EXTRACT
-            # -----------------------------
-            t0 = time.time()
-            raw_file = extract_weather_data(
-                latitude=latitude,
-                longitude=longitude,
-                raw_path=raw_path,
-                city=city
-            )
+        # -----------------------------
+        # EXTRACT (all locations concurrently over one pooled session)
+        # -----------------------------
+        extract_cfg = config.get("extract", {})
+        t0 = time.time()
+        raw_files = extract_weather_locations(
+            locations,
+            raw_path,
+            concurrency=extract_cfg.get("concurrency", 8),
+            retries=extract_cfg.get("retries", 4),
+            backoff=extract_cfg.get("backoff_seconds", 1.0),
+            max_retry_after=extract_cfg.get("max_retry_after_seconds", MAX_RETRY_AFTER_SECONDS),
+            timeout=extract_cfg.get("timeout_seconds", 10),
+            cache_dir=extract_cfg.get("cache_dir"),
+            cache_ttl=extract_cfg.get("cache_ttl_seconds", 900),
+            cache_max_age=extract_cfg.get("cache_max_age_seconds", 7 * 24 * 3600),
+            cache_max_entries=extract_cfg.get("cache_max_entries", 1000),
+            hourly=variable_names(load_variables(config)),
+            run=run,
+        )
+        logger.info(f"Extract step duration: {time.time() - t0:.3f} seconds")
 
-            logger.info(f"Extract step completed. Raw file: {raw_file}")
-            logger.info(f"Extract step duration: {time.time() - t0:.3f} seconds")
-
-            # -----------------------------
-            # TRANSFORM
-            # -----------------------------
-            t1 = time.time()
-            raw_json = load_raw_json(raw_file)
-            df = transform_weather_data(
-                raw_json=raw_json,
-                latitude=latitude,
-                longitude=longitude,
-                city=city
-            )
+        total_rows = 0
+        for location, raw_file in zip(locations, raw_files):
+            total_rows += process_location(conn, config, location, raw_file, run)
 
-            # Save processed parquet
-            processed_path = config["paths"]["processed_path"]
-            parquet_file = save_processed_parquet(df, processed_path, city)
-            logger.info(f"Processed data saved to: {parquet_file}")
-            logger.info(f"Transform step completed. Records transformed: {len(df)}")
-            logger.info(f"Transform step duration: {time.time() - t1:.3f} seconds")
-
-            # -----------------------------
-            # LOAD
-            # -----------------------------
-            t2 = time.time()
-            upsert_weather_data(conn, df)
-            total_rows += len(df)
-            logger.info(f"Load step completed for {city}. Rows inserted: {len(df)}")
-            logger.info(f"Load step duration: {time.time() - t2:.3f} seconds")
-
-        # Backfill city for any existing nulls (e.g., older ingested rows)
-        backfill_city(conn, locations)
+        changed = finish_run(conn, config, locations, run, changed=total_rows > 0)
+        status = "ok"
 
         # -----------------------------
         # TOTAL RUNTIME
@@ -96,6 +282,17 @@ def run_pipeline():
         logger.info(f"=== WEATHER ETL PIPELINE FAILED after {total_runtime:.3f} seconds ===")
 
     finally:
+        # Per-stage timings go to pipeline_runs / pipeline_spans (and metrics.export_path)
+        complete_run(conn, run, config, status)
+        # -----------------------------
+        # PUBLISH READ SNAPSHOT (after the run is recorded, so it includes its metrics)
+        # -----------------------------
+        if changed:
+            try:
+                publish_read_snapshot(conn, config)
+            except Exception as e:
+                logger.error(f"Publishing the snapshot failed: {e}")
+                logger.error(traceback.format_exc())
         print("=== WEATHER ETL PIPELINE ENDED (SUCCESS OR FAILURE)===")
 
 if __name__ == "__main__":
@@ -4,8 +4,16 @@ set -e
 DIR="$(cd "$(dirname "$0")" && pwd)"
 cd "$DIR"
 
-echo "Running ETL pipeline..."
-python pipeline.py
+if [ "$1" = "--scheduler" ]; then
+    echo "Starting ETL scheduler in the background..."
+    python scheduler.py &
+    SCHEDULER_PID=$!
+    # Stop the scheduler when the dashboard exits or the script is interrupted
+    trap 'kill $SCHEDULER_PID 2>/dev/null' EXIT
+else
+    echo "Running ETL pipeline..."
+    python pipeline.py
+fi
 
 echo ""
 echo "Launching dashboard..."
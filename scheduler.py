@@ -0,0 +1,235 @@
+import asyncio
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import duckdb
+
+from etl.config import load_config
+from etl.extract import MAX_RETRY_AFTER_SECONDS, create_session, extract_location_async, prune_response_cache
+from etl.load import connect_duckdb
+from etl.logger import get_logger
+from etl.metrics import RUN_COUNTS, complete_run, span, start_run
+from etl.variables import load_variables, variable_names
+from pipeline import finish_run, get_locations, prepare_warehouse, process_location, publish_read_snapshot
+
+logger = get_logger()
+
+
+def stagger_offsets(n_locations: int, cycle_seconds: float) -> List[float]:
+    """Seconds into the cycle at which each location is fetched, spread
+    evenly so requests arrive at a steady rate instead of in one burst."""
+    if n_locations == 0:
+        return []
+    return [i * cycle_seconds / n_locations for i in range(n_locations)]
+
+
+async def run_cycle(
+    conn: duckdb.DuckDBPyConnection,
+    config: dict,
+    locations: List[dict],
+    session,
+    semaphore: asyncio.Semaphore,
+    fetch_executor: ThreadPoolExecutor,
+    load_executor: ThreadPoolExecutor,
+    cycle_seconds: float,
+    queue_size: int = 32,
+    run: Optional[dict] = None,
+    backfill: bool = True,
+) -> dict:
+    """
+    One pass over every location, as a two-stage pipeline.
+
+    Fetches start at their staggered offsets and push results onto a bounded
+    queue; a single consumer transforms and loads them on `load_executor`
+    (one thread, the only one touching `conn`). When loading falls behind,
+    the full queue holds back further fetches instead of piling up raw
+    payloads. Per-city stages are recorded as spans of `run` (see
+    etl.metrics) and the location counts are set on it. The end-of-cycle
+    steps (pipeline.finish_run) run the backfill only with `backfill`, and
+    export only when the cycle loaded rows. Returns the cycle's counts and
+    timings, with `changed` set when a snapshot should be published.
+    """
+    loop = asyncio.get_running_loop()
+    extract_cfg = config.get("extract", {})
+    raw_path = config["paths"]["raw_path"]
+    hourly = variable_names(load_variables(config))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    stats = {
+        "started_at": datetime.now(timezone.utc).replace(tzinfo=None),
+        "locations": len(locations),
+        "loaded": 0,
+        "unchanged": 0,
+        "failed": 0,
+        "rows_loaded": 0,
+        "extract_seconds": 0.0,
+        "load_seconds": 0.0,
+        "finish_seconds": 0.0,
+        "changed": False,
+    }
+    cycle_start = time.monotonic()
+
+    async def produce(location: dict, offset: float):
+        await asyncio.sleep(max(0.0, cycle_start + offset - time.monotonic()))
+        t0 = time.monotonic()
+        try:
+            with span(run, "extract", location.get("name"), bytes_downloaded=0) as record:
+                raw_file = await extract_location_async(
+                    location,
+                    raw_path,
+                    session,
+                    semaphore,
+                    fetch_executor,
+                    retries=extract_cfg.get("retries", 4),
+                    backoff=extract_cfg.get("backoff_seconds", 1.0),
+                    max_retry_after=extract_cfg.get("max_retry_after_seconds", MAX_RETRY_AFTER_SECONDS),
+                    timeout=extract_cfg.get("timeout_seconds", 10),
+                    cache_dir=extract_cfg.get("cache_dir"),
+                    cache_ttl=extract_cfg.get("cache_ttl_seconds", 900),
+                    hourly=hourly,
+                    stats=record,
+                )
+        except Exception as e:
+            raw_file = e
+        stats["extract_seconds"] += time.monotonic() - t0
+        await queue.put((location, raw_file))
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            location, raw_file = item
+            if isinstance(raw_file, Exception):
+                stats["failed"] += 1
+            elif raw_file is None:
+                stats["unchanged"] += 1
+
+            t0 = time.monotonic()
+            try:
+                rows = await loop.run_in_executor(
+                    load_executor, process_location, conn, config, location, raw_file, run
+                )
+            except Exception:
+                logger.error(f"Processing failed for {location.get('name')}:\n{traceback.format_exc()}")
+                stats["failed"] += 1
+                rows = 0
+            stats["load_seconds"] += time.monotonic() - t0
+            if rows:
+                stats["loaded"] += 1
+                stats["rows_loaded"] += rows
+
+    consumer = asyncio.create_task(consume())
+    offsets = stagger_offsets(len(locations), cycle_seconds)
+    await asyncio.gather(*(produce(loc, off) for loc, off in zip(locations, offsets)))
+    await queue.put(None)
+    await consumer
+
+    t0 = time.monotonic()
+    try:
+        stats["changed"] = await loop.run_in_executor(
+            load_executor, finish_run, conn, config, locations, run, stats["rows_loaded"] > 0, backfill
+        )
+    except Exception:
+        # A failed backfill/export is retried next cycle rather than stopping the daemon
+        logger.error(f"End-of-cycle steps failed:\n{traceback.format_exc()}")
+    stats["finish_seconds"] = time.monotonic() - t0
+    stats["wall_seconds"] = time.monotonic() - cycle_start
+    if run is not None:
+        run.update({key: stats[key] for key in RUN_COUNTS})
+    return stats
+
+
+async def run_scheduler_async(config: dict, cycles: Optional[int] = None):
+    """
+    Run pipeline cycles back to back every `scheduler.cycle_seconds`, keeping
+    the DuckDB connection, HTTP connection pool and thread pools open across
+    cycles. Runs forever unless `cycles` is given.
+    """
+    locations = get_locations(config)
+    scheduler_cfg = config.get("scheduler", {})
+    extract_cfg = config.get("extract", {})
+    cycle_seconds = scheduler_cfg.get("cycle_seconds", 3600)
+    # The full-table backfill runs on the first cycle and then every N cycles
+    backfill_every = max(1, scheduler_cfg.get("backfill_every_cycles", 24))
+    stagger = scheduler_cfg.get("stagger", True)
+    queue_size = scheduler_cfg.get("queue_size", 32)
+    concurrency = extract_cfg.get("concurrency", 8)
+    cache_dir = extract_cfg.get("cache_dir")
+
+    conn = connect_duckdb(config["paths"]["duckdb_path"])
+    prepare_warehouse(conn, config, locations)
+    session = create_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    fetch_executor = ThreadPoolExecutor(max_workers=concurrency)
+    load_executor = ThreadPoolExecutor(max_workers=1)
+
+    try:
+        cycle = 0
+        while cycles is None or cycle < cycles:
+            next_start = time.monotonic() + cycle_seconds
+            if cache_dir:
+                prune_response_cache(
+                    cache_dir,
+                    extract_cfg.get("cache_max_age_seconds", 7 * 24 * 3600),
+                    extract_cfg.get("cache_max_entries", 1000),
+                )
+
+            run = start_run("scheduler")
+            stats = await run_cycle(
+                conn,
+                config,
+                locations,
+                session,
+                semaphore,
+                fetch_executor,
+                load_executor,
+                cycle_seconds if stagger else 0,
+                queue_size,
+                run,
+                backfill=cycle % backfill_every == 0,
+            )
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(load_executor, complete_run, conn, run, config)
+            # Published after the cycle is recorded, so the snapshot includes its metrics
+            if stats["changed"]:
+                try:
+                    await loop.run_in_executor(load_executor, publish_read_snapshot, conn, config)
+                except Exception:
+                    logger.error(f"Publishing the snapshot failed:\n{traceback.format_exc()}")
+            logger.info(
+                f"Cycle {cycle} completed: {stats['loaded']} loaded, {stats['unchanged']} unchanged, "
+                f"{stats['failed']} failed, {stats['rows_loaded']} rows | "
+                f"extract {stats['extract_seconds']:.3f}s, load {stats['load_seconds']:.3f}s, "
+                f"finish {stats['finish_seconds']:.3f}s, wall {stats['wall_seconds']:.3f}s"
+            )
+
+            cycle += 1
+            if cycles is not None and cycle >= cycles:
+                break
+            wait = next_start - time.monotonic()
+            if wait < 0:
+                logger.warning(f"Cycle {cycle - 1} overran its {cycle_seconds}s slot by {-wait:.1f}s")
+            await asyncio.sleep(max(0.0, wait))
+    finally:
+        fetch_executor.shutdown(wait=False)
+        load_executor.shutdown(wait=True)
+        session.close()
+        conn.close()
+
+
+def run_scheduler(cycles: Optional[int] = None):
+    config = load_config()
+    print("=== WEATHER ETL SCHEDULER STARTED ===")
+    try:
+        asyncio.run(run_scheduler_async(config, cycles))
+    except KeyboardInterrupt:
+        logger.info("Scheduler stopped")
+    finally:
+        print("=== WEATHER ETL SCHEDULER ENDED ===")
+
+
+if __name__ == "__main__":
+    run_scheduler()
@@ -0,0 +1,61 @@
+import pytest
+import duckdb
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timezone
+from typing import Optional
+
+
+@pytest.fixture
+def conn():
+    """Create an in-memory DuckDB connection for testing."""
+    c = duckdb.connect(":memory:")
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def writer(tmp_path):
+    """A read-write connection to a file database, as the ETL holds it."""
+    c = duckdb.connect(str(tmp_path / "weather.duckdb"))
+    c.execute("""
+        CREATE TABLE weather_hourly AS
+        SELECT 'A' AS city, TIMESTAMP '2024-01-01 00:00:00' + INTERVAL (i) HOUR AS timestamp,
+               CASE WHEN i = 1 THEN NULL ELSE 20.0 + i END AS temperature_2m
+        FROM range(3) t(i)
+    """)
+    yield c
+    c.close()
+
+
+def weather_df(
+    city: Optional[str] = "TestCity",
+    rows: int = 10,
+    start_hour: int = 0,
+    temperature: float = 10.0,
+    temperature_step: float = 1.0,
+    humidity: float = 50.0,
+    humidity_step: float = 0.0,
+    precipitation: float = 0.0,
+    latitude: float = -26.2,
+    longitude: float = 28.0,
+    load_date: Optional[date] = None,
+) -> pd.DataFrame:
+    """
+    Hourly rows for one location from 2024-01-01 `start_hour`, shaped like
+    the transform's output. Temperature and humidity rise by their step each
+    hour from the given start value.
+    """
+    hours = np.arange(rows, dtype=float)
+    return pd.DataFrame(
+        {
+            "timestamp": pd.date_range(datetime(2024, 1, 1, start_hour), periods=rows, freq="h"),
+            "temperature_2m": temperature + temperature_step * hours,
+            "relativehumidity_2m": humidity + humidity_step * hours,
+            "precipitation": [precipitation] * rows,
+            "city": city,
+            "latitude": latitude,
+            "longitude": longitude,
+            "load_date": load_date or datetime.now(timezone.utc).date(),
+        }
+    )
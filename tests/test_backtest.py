@@ -0,0 +1,128 @@
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+from datetime import datetime, timezone
+
+from etl.load import upsert_weather_data
+from forecast.backtest import backtest_city, build_origin_windows, run_backtests
+from forecast.dataset import load_scaled_series, split_datasets
+from forecast.train import train_global_model, train_model
+
+
+def _load_history(conn, rows=600, city="TestCity"):
+    hours = np.arange(rows)
+    df = pd.DataFrame(
+        {
+            "timestamp": pd.date_range(datetime(2024, 1, 1), periods=rows, freq="h"),
+            "temperature_2m": 15 + 5 * np.sin(hours * 2 * np.pi / 24),
+            "relativehumidity_2m": 60 + 10 * np.cos(hours * 2 * np.pi / 24),
+            "precipitation": (hours % 5 == 0).astype(float),
+            "city": city,
+            "latitude": -26.2,
+            "longitude": 28.0,
+            "load_date": datetime.now(timezone.utc).date(),
+        }
+    )
+    upsert_weather_data(conn, df)
+    return df
+
+
+class TestBuildOriginWindows:
+    def test_windows_match_history(self):
+        values = np.arange(60, dtype=np.float32).reshape(20, 3)
+        origins, windows = build_origin_windows(values, lookback=4, horizon=2, stride=3)
+        assert list(origins) == [4, 7, 10, 13, 16]
+        assert windows.shape == (5, 4, 3)
+        for origin, window in zip(origins, windows):
+            np.testing.assert_array_equal(window, values[origin - 4 : origin])
+
+    def test_last_origin_leaves_room_for_horizon(self):
+        values = np.zeros((10, 3), dtype=np.float32)
+        origins, _ = build_origin_windows(values, lookback=4, horizon=3, stride=1)
+        assert origins[-1] + 3 <= len(values)
+
+    def test_drops_origins_with_gaps_in_input(self):
+        values = np.zeros((20, 3), dtype=np.float32)
+        timestamps = np.delete(
+            np.arange("2024-01-01T00", "2024-01-01T21", dtype="datetime64[h]"), 9
+        )
+        origins, windows = build_origin_windows(values, 4, 2, stride=1, timestamps=timestamps)
+        # Inputs ending at row 8 and starting at row 9 straddle the gap
+        assert not set(origins) & {10, 11, 12}
+        assert {4, 9, 13}.issubset(set(origins))
+        assert len(windows) == len(origins)
+
+    def test_too_short_history(self):
+        values = np.zeros((5, 3), dtype=np.float32)
+        origins, windows = build_origin_windows(values, lookback=4, horizon=3)
+        assert len(origins) == 0
+        assert windows.shape == (0, 4, 3)
+
+
+class TestBacktestCity:
+    def test_scores_only_origins_after_training_data(self, conn, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        history = _load_history(conn)
+        train_model("TestCity", conn, lookback=24, horizon=6, epochs=1, hidden_size=8, num_layers=1)
+        meta = torch.load("models/testcity/meta_24h.pt", weights_only=True)
+
+        # Latest hour touched by any training or validation sample
+        timestamps, scaled, _, _ = load_scaled_series(conn, "TestCity")
+        train_ds, val_ds, _ = split_datasets(scaled, 24, 6, timestamps=timestamps)
+        val_start = int(len(timestamps) * 0.7)
+        last_fitted = max(
+            timestamps[train_ds.starts.max() + 30 - 1],
+            timestamps[val_start + val_ds.starts.max() + 30 - 1],
+        )
+        assert np.datetime64(meta["fit_end"]) >= last_fitted
+
+        preds = backtest_city("TestCity", history, horizon=6, stride=6)
+        assert not preds.empty
+        origins = preds["origin_timestamp"].to_numpy()
+        assert (origins >= last_fitted).all()
+        assert (origins >= np.datetime64(meta["fit_end"])).all()
+
+    def test_model_without_training_span_is_skipped(self, conn, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        history = _load_history(conn)
+        train_model("TestCity", conn, lookback=24, horizon=6, epochs=1, hidden_size=8, num_layers=1)
+        meta = torch.load("models/testcity/meta_24h.pt", weights_only=True)
+        del meta["fit_end"]
+        torch.save(meta, "models/testcity/meta_24h.pt")
+
+        assert backtest_city("TestCity", history, horizon=6, stride=6).empty
+
+
+class TestGlobalModelBacktest:
+    @pytest.fixture
+    def global_model(self, conn, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        for city in ("CityA", "CityB"):
+            _load_history(conn, city=city)
+        train_global_model(
+            ["CityA", "CityB"], conn,
+            lookback=24, horizon=6, epochs=1, hidden_size=8, num_layers=1, embedding_dim=4,
+        )
+        meta = torch.load("models/global/meta_24h.pt", weights_only=True)
+        return conn, meta
+
+    def test_city_without_own_model_uses_global(self, global_model):
+        conn, meta = global_model
+        history = conn.execute(
+            "SELECT * EXCLUDE (city) FROM weather_hourly WHERE city = 'CityB' ORDER BY timestamp"
+        ).fetchdf()
+        preds = backtest_city("CityB", history, horizon=6, stride=6)
+        assert not preds.empty
+        assert (preds["origin_timestamp"] >= np.datetime64(meta["fit_end"]["CityB"])).all()
+
+    def test_unknown_city_skipped(self, global_model):
+        conn, _ = global_model
+        assert backtest_city("Elsewhere", pd.DataFrame(), horizon=6).empty
+
+    def test_global_cities_backtested_in_spawned_workers(self, global_model):
+        conn, _ = global_model
+        rows = run_backtests(conn, ["CityA", "CityB"], [6], stride=6, max_workers=1, start_method="spawn")
+        assert rows > 0
+        cities = conn.execute("SELECT DISTINCT city FROM forecast_backtests ORDER BY city").fetchall()
+        assert cities == [("CityA",), ("CityB",)]
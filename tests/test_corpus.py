@@ -0,0 +1,95 @@
+import pytest
+import numpy as np
+from functools import partial
+
+from etl.corpus import export_corpus, load_city_corpus, read_manifest
+from etl.feature_store import get_scaled_series
+from etl.load import upsert_weather_data
+from forecast.dataset import load_scaled_series
+from tests.conftest import weather_df
+
+
+_make_df = partial(weather_df, temperature_step=2.0, humidity=40.0, humidity_step=1.0, precipitation=0.5)
+
+
+class TestCorpusExport:
+    def test_export_matches_scaled_view(self, conn, tmp_path):
+        upsert_weather_data(conn, _make_df(rows=12))
+        upsert_weather_data(conn, _make_df(city="Other", rows=5))
+
+        manifest = export_corpus(conn, str(tmp_path))
+
+        assert set(manifest) == {"TestCity", "Other"}
+        ts, values, entry = load_city_corpus("TestCity", str(tmp_path))
+        expected_ts, expected = get_scaled_series(conn, "TestCity")
+
+        assert isinstance(values, np.memmap)
+        assert values.dtype == np.float32
+        assert entry["rows"] == 12
+        np.testing.assert_array_equal(values, expected)
+        np.testing.assert_array_equal(ts, expected_ts)
+
+    def test_reexport_replaces_series_and_keeps_other_cities(self, conn, tmp_path):
+        upsert_weather_data(conn, _make_df(rows=6))
+        upsert_weather_data(conn, _make_df(city="Other", rows=5))
+        export_corpus(conn, str(tmp_path))
+
+        upsert_weather_data(conn, _make_df(rows=6, start_hour=6))
+        export_corpus(conn, str(tmp_path), cities=["TestCity"])
+
+        manifest = read_manifest(str(tmp_path))
+        assert manifest["TestCity"]["rows"] == 12
+        assert manifest["Other"]["rows"] == 5
+
+    def test_unchanged_city_not_reexported(self, conn, tmp_path):
+        upsert_weather_data(conn, _make_df(rows=6))
+        upsert_weather_data(conn, _make_df(city="Other", rows=5))
+        first = export_corpus(conn, str(tmp_path))
+
+        upsert_weather_data(conn, _make_df(rows=6, start_hour=6))
+        second = export_corpus(conn, str(tmp_path))
+
+        assert second["Other"]["exported_at"] == first["Other"]["exported_at"]
+        assert second["TestCity"]["rows"] == 12
+        assert second["TestCity"]["data_version"] == 2
+
+    def test_changed_city_waits_for_interval(self, conn, tmp_path):
+        upsert_weather_data(conn, _make_df(rows=6))
+        export_corpus(conn, str(tmp_path))
+        upsert_weather_data(conn, _make_df(rows=6, start_hour=6))
+
+        manifest = export_corpus(conn, str(tmp_path), min_interval_minutes=60)
+        assert manifest["TestCity"]["rows"] == 6
+
+    def test_gap_setting_change_reexports(self, conn, tmp_path):
+        upsert_weather_data(conn, _make_df(rows=6))
+        export_corpus(conn, str(tmp_path))
+        manifest = export_corpus(conn, str(tmp_path), max_gap_hours=2, min_interval_minutes=60)
+        assert manifest["TestCity"]["max_gap_hours"] == 2
+
+    def test_missing_city_raises(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            load_city_corpus("Nowhere", str(tmp_path))
+
+
+class TestLoadScaledSeries:
+    def test_prefers_corpus_ranges(self, conn, tmp_path):
+        upsert_weather_data(conn, _make_df(rows=10))
+        export_corpus(conn, str(tmp_path))
+        # Stats widen after the export; the corpus keeps its own snapshot
+        upsert_weather_data(conn, _make_df(rows=10, start_hour=10))
+
+        _, values, data_min, data_max = load_scaled_series(conn, "TestCity", str(tmp_path))
+
+        assert isinstance(values, np.memmap)
+        assert len(values) == 10
+        assert data_max[0] == pytest.approx(28.0)
+
+    def test_falls_back_to_feature_store(self, conn, tmp_path):
+        upsert_weather_data(conn, _make_df(rows=10))
+
+        _, values, data_min, data_max = load_scaled_series(conn, "TestCity", str(tmp_path))
+
+        assert not isinstance(values, np.memmap)
+        assert len(values) == 10
+        assert data_min[0] == pytest.approx(10.0)
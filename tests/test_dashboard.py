@@ -0,0 +1,106 @@
+import os
+
+import pytest
+import streamlit as st
+from datetime import datetime
+
+import dashboard.data as dashboard_data
+from dashboard.data import (
+    fetch_city_figures,
+    fetch_model_performance_figure,
+    fetch_multi_city_figure,
+    fetch_page_data,
+)
+from etl.load import upsert_weather_data
+from tests.conftest import weather_df
+
+
+def _make_df(city, rows=23, start_hour=0):
+    return weather_df(city, rows, start_hour, load_date=datetime(2024, 1, 3).date())
+
+
+def _train(path, mtime_ns):
+    # Stands in for a retrain: only the checkpoint's mtime is read for the key
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def loaded(conn, tmp_path, monkeypatch):
+    # No config.yaml or trained models: default variables, no forecast
+    monkeypatch.chdir(tmp_path)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    upsert_weather_data(conn, _make_df("CityA"))
+    upsert_weather_data(conn, _make_df("CityB"))
+    yield conn
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+class TestMultiCityFigure:
+    def test_built_once_per_data_version(self, loaded):
+        page = fetch_page_data(loaded, "2024-01-01")
+        figure = fetch_multi_city_figure(loaded, page, "temperature_2m", "2024-01-01 12:00:00")
+        assert figure is not None
+        assert fetch_multi_city_figure(loaded, page, "temperature_2m", "2024-01-01 12:00:00") is figure
+
+        upsert_weather_data(loaded, _make_df("CityB", rows=1, start_hour=23))
+        page = fetch_page_data(loaded, "2024-01-01")
+        assert fetch_multi_city_figure(loaded, page, "temperature_2m", "2024-01-01 12:00:00") is not figure
+
+    def test_empty_window_cached_as_none(self, loaded, monkeypatch):
+        page = fetch_page_data(loaded, "2024-01-01")
+        calls = []
+        split = dashboard_data.split_multi_city
+        monkeypatch.setattr(
+            dashboard_data, "split_multi_city", lambda *args: calls.append(args) or split(*args)
+        )
+        for _ in range(2):
+            assert fetch_multi_city_figure(loaded, page, "temperature_2m", "2024-02-01") is None
+        # The rerun is answered from the cache without splitting the page again
+        assert len(calls) == 1
+
+
+class TestCityFigures:
+    def test_reused_until_city_reloaded(self, loaded):
+        page = fetch_page_data(loaded, "2024-01-01")
+        figures = fetch_city_figures(loaded, page, "CityA", 24, "2024-01-01", "2024-01-01 23:00:00")
+        assert set(figures) == {"temperature", "humidity", "precipitation"}
+        assert fetch_city_figures(loaded, page, "CityA", 24, "2024-01-01", "2024-01-01 23:00:00") is figures
+        assert fetch_city_figures(loaded, page, "CityB", 24, "2024-01-01", "2024-01-01 23:00:00") is not figures
+
+        upsert_weather_data(loaded, _make_df("CityA", rows=1, start_hour=23))
+        page = fetch_page_data(loaded, "2024-01-01")
+        assert fetch_city_figures(loaded, page, "CityA", 24, "2024-01-01", "2024-01-01 23:00:00") is not figures
+
+    def test_retrain_replaces_figures(self, loaded, monkeypatch):
+        forecasts = []
+
+        def generate_forecast(city, conn, horizon):
+            forecasts.append(city)
+            raise FileNotFoundError("stand-in checkpoint")
+
+        monkeypatch.setattr(dashboard_data, "generate_forecast", generate_forecast)
+        page = fetch_page_data(loaded, "2024-01-01")
+        args = (loaded, page, "CityA", 24, "2024-01-01", "2024-01-01 23:00:00")
+        figures = fetch_city_figures(*args)
+
+        _train("models/citya/lstm_24h.pt", 1_000_000_000)
+        retrained = fetch_city_figures(*args)
+        assert retrained is not figures
+        assert fetch_city_figures(*args) is retrained
+
+        _train("models/citya/lstm_24h.pt", 2_000_000_000)
+        assert fetch_city_figures(*args) is not retrained
+        assert len(forecasts) == 3
+
+
+class TestModelPerformanceFigure:
+    def test_retrain_replaces_figure(self, loaded):
+        figure = fetch_model_performance_figure(loaded)
+        assert fetch_model_performance_figure(loaded) is figure
+
+        _train("models/global/lstm_24h.pt", 1_000_000_000)
+        assert fetch_model_performance_figure(loaded) is not figure
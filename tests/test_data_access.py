@@ -0,0 +1,74 @@
+import pytest
+import pandas as pd
+from datetime import datetime
+
+from etl.data_access import (
+    get_available_cities,
+    get_data_freshness,
+    get_latest_weather,
+    get_page_data,
+    get_recent_hours_multi,
+    get_weather_history,
+    split_history,
+    split_latest,
+    split_multi_city,
+)
+from etl.load import upsert_weather_data
+from tests.conftest import weather_df
+
+
+def _make_df(city, rows=72, offset=0.0):
+    return weather_df(
+        city, rows, temperature=offset, latitude=-26.2 + offset, load_date=datetime(2024, 1, 4).date()
+    )
+
+
+@pytest.fixture
+def loaded(conn):
+    upsert_weather_data(conn, _make_df("CityA"))
+    upsert_weather_data(conn, _make_df("CityB", offset=100.0))
+    return conn
+
+
+class TestPageData:
+    def test_summary_matches_separate_queries(self, loaded):
+        page = get_page_data(loaded, "2024-01-02")
+        assert page["cities"] == get_available_cities(loaded)
+
+        freshness = get_data_freshness(loaded)
+        for city in page["cities"]:
+            assert page["freshness"][city]["latest_timestamp"] == freshness[city]["latest_timestamp"]
+
+        pd.testing.assert_frame_equal(
+            split_latest(page, "CityB"), get_latest_weather(loaded, "CityB"), check_dtype=False
+        )
+
+    def test_history_matches_separate_query(self, loaded):
+        page = get_page_data(loaded, "2024-01-02")
+        expected = get_weather_history(loaded, "CityA", "2024-01-02", "2024-01-02 12:00:00")
+        actual = split_history(page, "CityA", "2024-01-02", "2024-01-02 12:00:00")
+        assert len(actual) == 13
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    def test_rows_start_at_window(self, loaded):
+        page = get_page_data(loaded, "2024-01-03")
+        assert page["rows"]["timestamp"].min() == pd.Timestamp("2024-01-03")
+
+        multi = split_multi_city(page, ["CityA", "CityB"], "2024-01-03 12:00:00")
+        assert sorted(multi["city"].unique()) == ["CityA", "CityB"]
+        assert len(multi) == 2 * 12
+        assert list(multi.columns) == [
+            "timestamp", "temperature_2m", "relativehumidity_2m", "precipitation", "city"
+        ]
+
+
+class TestRecentHoursMulti:
+    def test_last_hours_per_city(self, loaded):
+        recent = get_recent_hours_multi(loaded, ["CityB", "CityA"], 3)
+        assert list(recent["city"]) == ["CityA"] * 3 + ["CityB"] * 3
+        assert list(recent["temperature_2m"]) == [69.0, 70.0, 71.0, 169.0, 170.0, 171.0]
+        assert recent.groupby("city")["timestamp"].is_monotonic_increasing.all()
+
+    def test_city_without_rows_is_absent(self, loaded):
+        recent = get_recent_hours_multi(loaded, ["CityA", "Elsewhere"], 3)
+        assert set(recent["city"]) == {"CityA"}
@@ -0,0 +1,245 @@
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+from datetime import datetime, timezone
+
+from etl.feature_store import get_scaled_series, get_scaling_params
+from etl.load import upsert_weather_data
+from forecast.dataset import (
+    StreamingWeatherDataset,
+    WeatherSequenceDataset,
+    fill_engineered,
+    scale_values,
+    split_datasets,
+    streaming_split_bounds,
+    training_rescale,
+    valid_window_starts,
+)
+
+
+def _hours(rows):
+    return pd.date_range(datetime(2024, 1, 1), periods=rows, freq="h").values
+
+
+def _load(conn, rows=60, skip=()):
+    df = pd.DataFrame(
+        {
+            "timestamp": pd.date_range(datetime(2024, 1, 1), periods=rows, freq="h"),
+            "temperature_2m": np.arange(rows, dtype=float),
+            "relativehumidity_2m": 50.0 + np.arange(rows) % 7,
+            "precipitation": (np.arange(rows) % 3).astype(float),
+            "city": "TestCity",
+            "latitude": -26.2,
+            "longitude": 28.0,
+            "load_date": datetime.now(timezone.utc).date(),
+        }
+    ).drop(index=list(skip))
+    upsert_weather_data(conn, df)
+    return get_scaling_params(conn, "TestCity")
+
+
+def _stack(samples):
+    xs, ys = zip(*samples)
+    return torch.stack(xs), torch.stack(ys)
+
+
+class TestValidWindowStarts:
+    def test_contiguous_series(self):
+        assert list(valid_window_starts(_hours(6), 4)) == [0, 1, 2]
+
+    def test_gap_excludes_spanning_windows(self):
+        ts = np.delete(_hours(10), 4)  # hour 4 missing
+        # Windows of 3 may not straddle rows 3 -> 4 (03:00 -> 05:00)
+        assert list(valid_window_starts(ts, 3)) == [0, 1, 4, 5, 6]
+
+    def test_duplicate_timestamp_breaks_windows(self):
+        ts = np.insert(_hours(6), 3, _hours(6)[2])
+        assert list(valid_window_starts(ts, 3)) == [0, 3, 4]
+
+    def test_too_short(self):
+        assert len(valid_window_starts(_hours(2), 3)) == 0
+
+
+class TestWeatherSequenceDataset:
+    def test_windows_skip_gaps(self):
+        ts = np.delete(_hours(20), 10)
+        data = np.arange(len(ts) * 3, dtype=np.float32).reshape(-1, 3)
+        ds = WeatherSequenceDataset(data, 4, 2, timestamps=ts)
+
+        assert len(ds) == 5 + 4  # 10 rows before the gap, 9 after
+        for i in range(len(ds)):
+            start = ds.starts[i]
+            window = ts[start : start + 6]
+            assert (np.diff(window) == np.timedelta64(1, "h")).all()
+
+    def test_without_timestamps_assumes_contiguous(self):
+        data = np.zeros((20, 3), dtype=np.float32)
+        assert len(WeatherSequenceDataset(data, 4, 2)) == 15
+
+    def test_windows_skip_missing_values(self):
+        data = np.zeros((20, 3), dtype=np.float32)
+        data[10, 1] = np.nan
+        ds = WeatherSequenceDataset(data, 4, 2, timestamps=_hours(20))
+        # Windows of 6 covering row 10 start at 5..10
+        assert list(ds.starts) == [0, 1, 2, 3, 4, 11, 12, 13, 14]
+
+
+class TestScaleValues:
+    def test_missing_values_stay_missing(self):
+        scaled = scale_values(np.array([[0.0, np.nan], [10.0, 4.0]]), [0.0, 0.0], [10.0, 4.0])
+        assert scaled[0, 0] == 0.0 and np.isnan(scaled[0, 1])
+
+    def test_fill_engineered_only_fills_extra_inputs(self):
+        scaled = np.full((2, 5), np.nan, dtype=np.float32)
+        filled = fill_engineered(scaled, num_targets=3)
+        assert np.isnan(filled[:, :3]).all()
+        assert (filled[:, 3:] == 0.0).all()
+        assert np.isnan(scaled).all()
+
+
+class TestTrainingRanges:
+    def test_ranges_come_from_training_split(self, conn):
+        data_min, data_max = _load(conn, rows=100)
+        _, scaled = get_scaled_series(conn, "TestCity")
+        rescale, train_min, train_max = training_rescale(scaled, data_min, data_max)
+        # temperature_2m counts up from 0, so the training split ends at 69
+        assert (train_min[0], train_max[0]) == (0.0, 69.0)
+        rescaled = scaled * rescale[0] + rescale[1]
+        np.testing.assert_allclose(rescaled[:70, 0], np.arange(70) / 69.0, rtol=1e-5, atol=1e-6)
+        # Later rows are expressed in the training range, not squeezed into it
+        assert rescaled[-1, 0] == pytest.approx(99.0 / 69.0)
+
+    def test_windows_rescaled_without_copying_memmap(self, conn, tmp_path):
+        data_min, data_max = _load(conn, rows=100)
+        _, values = get_scaled_series(conn, "TestCity")
+        path = tmp_path / "series.npy"
+        np.save(path, values)
+        scaled = np.load(path, mmap_mode="r")
+        rescale, train_min, train_max = training_rescale(scaled, data_min, data_max)
+
+        train_ds, _, test_ds = split_datasets(scaled, 8, 4, rescale=rescale)
+        assert isinstance(train_ds.data, np.memmap)
+        expected = scale_values(np.asarray(values) * (data_max - data_min) + data_min, train_min, train_max)
+        x, y = test_ds[0]
+        np.testing.assert_allclose(x.numpy(), expected[85:93], rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(y.numpy(), expected[93:97], rtol=1e-5, atol=1e-6)
+
+
+class TestGapFilling:
+    def test_short_gaps_interpolated_long_gaps_kept(self, conn):
+        # Hour 3 missing (short gap), hours 6-8 missing (long gap)
+        _load(conn, rows=12, skip=[3, 6, 7, 8])
+
+        ts, values = get_scaled_series(conn, "TestCity", max_gap_hours=2)
+        _, raw = get_scaled_series(conn, "TestCity")
+
+        assert len(ts) == 9
+        assert np.datetime64("2024-01-01T03:00") in ts
+        assert np.datetime64("2024-01-01T07:00") not in ts
+        filled = values[list(ts).index(np.datetime64("2024-01-01T03:00"))]
+        np.testing.assert_allclose(filled[0], (raw[2, 0] + raw[3, 0]) / 2, rtol=1e-6)
+
+
+class TestStreamingWeatherDataset:
+    def test_in_order_matches_in_memory_windows_across_chunks(self, conn):
+        data_min, data_max = _load(conn)
+        # Chunks smaller than a window force windows across chunk boundaries
+        stream = StreamingWeatherDataset(
+            conn, "TestCity", 8, 4, data_min, data_max, chunk_rows=5, shuffle_buffer=0
+        )
+        _, scaled = get_scaled_series(conn, "TestCity")
+        expected = WeatherSequenceDataset(scaled, 8, 4)
+
+        xs, ys = _stack(list(stream))
+        ex, ey = _stack([expected[i] for i in range(len(expected))])
+
+        assert len(stream) == len(expected) == 49
+        torch.testing.assert_close(xs, ex)
+        torch.testing.assert_close(ys, ey)
+
+    def test_shuffle_buffer_permutes_windows(self, conn):
+        data_min, data_max = _load(conn)
+        stream = StreamingWeatherDataset(
+            conn, "TestCity", 8, 4, data_min, data_max, chunk_rows=7, shuffle_buffer=10
+        )
+
+        first = [x[0, 0].item() for x, _ in stream]
+        second = [x[0, 0].item() for x, _ in stream]
+
+        assert sorted(first) == sorted(second)
+        assert len(first) == 49
+        assert first != sorted(first)
+        assert first != second  # reshuffled each epoch
+
+    def test_skips_windows_over_gaps(self, conn):
+        data_min, data_max = _load(conn, skip=[30])
+        stream = StreamingWeatherDataset(
+            conn, "TestCity", 8, 4, data_min, data_max, chunk_rows=7, shuffle_buffer=0
+        )
+        ts, scaled = get_scaled_series(conn, "TestCity")
+        expected = WeatherSequenceDataset(scaled, 8, 4, timestamps=ts)
+
+        xs, _ = _stack(list(stream))
+        ex, _ = _stack([expected[i] for i in range(len(expected))])
+
+        assert len(stream) == len(expected) == 19 + 18
+        torch.testing.assert_close(xs, ex)
+
+    def test_skips_windows_over_missing_values(self, conn):
+        data_min, data_max = _load(conn)
+        conn.execute(
+            "UPDATE weather_hourly_facts SET precipitation = NULL "
+            "WHERE timestamp = TIMESTAMP '2024-01-02 00:00:00'"
+        )
+        stream = StreamingWeatherDataset(
+            conn, "TestCity", 8, 4, data_min, data_max, chunk_rows=7, shuffle_buffer=0
+        )
+        ts, scaled = get_scaled_series(conn, "TestCity")
+        expected = WeatherSequenceDataset(scaled, 8, 4, timestamps=ts)
+
+        xs, _ = _stack(list(stream))
+        ex, _ = _stack([expected[i] for i in range(len(expected))])
+
+        assert len(stream) == len(expected) == 49 - 12
+        assert not torch.isnan(xs).any()
+        torch.testing.assert_close(xs, ex)
+
+    def test_fills_gaps_like_in_memory_series(self, conn):
+        data_min, data_max = _load(conn, skip=[20, 40, 41, 42, 43])
+        stream = StreamingWeatherDataset(
+            conn, "TestCity", 8, 4, data_min, data_max,
+            chunk_rows=7, shuffle_buffer=0, max_gap_hours=2,
+        )
+        ts, scaled = get_scaled_series(conn, "TestCity", max_gap_hours=2)
+        expected = WeatherSequenceDataset(scaled, 8, 4, timestamps=ts)
+
+        xs, ys = _stack(list(stream))
+        ex, ey = _stack([expected[i] for i in range(len(expected))])
+
+        # Hour 20 is filled; the four-hour gap still splits the series
+        assert len(stream) == len(expected) == 40 - 11 + 16 - 11
+        torch.testing.assert_close(xs, ex)
+        torch.testing.assert_close(ys, ey)
+
+    def test_split_bounds_follow_filled_series(self, conn):
+        data_min, data_max = _load(conn, rows=100, skip=[10, 11, 50])
+        val_start, test_start = streaming_split_bounds(conn, "TestCity", max_gap_hours=2)
+        ts, scaled = get_scaled_series(conn, "TestCity", max_gap_hours=2)
+        assert len(ts) == 100
+        assert (val_start, test_start) == (pd.Timestamp(ts[70]), pd.Timestamp(ts[85]))
+
+    def test_split_bounds_match_split_datasets(self, conn):
+        data_min, data_max = _load(conn, rows=100)
+        val_start, test_start = streaming_split_bounds(conn, "TestCity")
+        _, scaled = get_scaled_series(conn, "TestCity")
+        train_ds, val_ds, test_ds = split_datasets(scaled, 8, 4)
+
+        bounds = [(None, val_start), (val_start, test_start), (test_start, None)]
+        for (start, end), expected in zip(bounds, [train_ds, val_ds, test_ds]):
+            stream = StreamingWeatherDataset(
+                conn, "TestCity", 8, 4, data_min, data_max,
+                start=start, end=end, shuffle_buffer=0,
+            )
+            assert len(stream) == len(expected)
+            torch.testing.assert_close(next(iter(stream))[0], expected[0][0])
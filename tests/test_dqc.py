@@ -0,0 +1,109 @@
+import pytest
+import pandas as pd
+from datetime import datetime
+
+from etl.dqc import apply_rules, create_dq_tables, dqc_options, evaluate_rules, record_dq_results
+from etl.variables import DEFAULT_VARIABLES, load_variables, table_columns
+
+NOW = datetime(2024, 1, 2, 0)
+
+
+def _batch(hours=24, start="2024-01-01 00:00"):
+    return pd.DataFrame(
+        {
+            "timestamp": pd.date_range(start, periods=hours, freq="h"),
+            "temperature_2m": [20.0] * hours,
+            "relativehumidity_2m": [50.0] * hours,
+            "precipitation": [0.0] * hours,
+            "latitude": -26.2,
+            "longitude": 28.0,
+        }
+    )
+
+
+class TestEvaluateRules:
+    def test_clean_batch_passes_every_rule(self):
+        masks = evaluate_rules(_batch(), expected_hours=24, now=NOW)
+        assert not masks.to_numpy().any()
+        assert {"stale", "too_few_hours", "hour_gap", "out_of_range:precipitation"} <= set(masks.columns)
+
+    def test_gap_flags_hour_after_it(self):
+        df = _batch().drop(index=[5, 6]).reset_index(drop=True)
+        masks = evaluate_rules(df, expected_hours=22, now=NOW)
+        assert masks.index[masks["hour_gap"]].tolist() == [5]
+
+    def test_off_rule_not_evaluated(self):
+        masks = evaluate_rules(_batch(), severity={"missing_value": "off", "stale": "off"}, now=NOW)
+        assert not any(rule.startswith("missing_value") for rule in masks.columns)
+        assert "stale" not in masks.columns
+
+    def test_historical_skips_batch_rules(self):
+        masks = evaluate_rules(_batch(hours=3), expected_hours=168, is_historical=True, now=NOW)
+        assert "too_few_hours" not in masks.columns
+        assert "stale" not in masks.columns
+
+    def test_unknown_severity_rejected(self):
+        with pytest.raises(ValueError, match="Unknown severity"):
+            evaluate_rules(_batch(), severity={"stale": "fatal"})
+
+    def test_options_from_config(self):
+        options = dqc_options({"settings": {"hours_to_fetch": 48}, "dqc": {"severity": {"stale": "off"}}})
+        assert options["expected_hours"] == 48
+        assert options["max_staleness_hours"] == 6
+        assert options["severity"] == {"stale": "off"}
+
+
+class TestApplyRules:
+    def test_reasons_list_every_failed_rule(self):
+        df = _batch()
+        df.loc[3, "temperature_2m"] = None
+        df.loc[7, ["temperature_2m", "precipitation"]] = [99.0, -1.0]
+        masks = evaluate_rules(df, expected_hours=24, now=NOW)
+        valid, quarantined, metrics = apply_rules(df, masks)
+
+        assert len(valid) == 22
+        assert quarantined["reasons"].tolist() == [
+            ["missing_value:temperature_2m"],
+            ["out_of_range:temperature_2m", "out_of_range:precipitation"],
+        ]
+        counts = metrics.set_index("rule")
+        assert counts.loc["missing_value:temperature_2m", "rows_failed"] == 1
+        assert counts.loc["missing_value:temperature_2m", "severity"] == "error"
+        assert (counts["rows_checked"] == 24).all()
+
+    def test_missing_value_as_warning_still_loads(self):
+        df = _batch()
+        df.loc[3, "temperature_2m"] = None
+        severity = {"missing_value": "warn"}
+        masks = evaluate_rules(df, expected_hours=24, severity=severity, now=NOW)
+        valid, quarantined, _ = apply_rules(df, masks, severity)
+        assert len(valid) == 24 and quarantined.empty
+
+
+class TestRecordResults:
+    def test_writes_quarantine_and_metrics(self, conn):
+        df = _batch()
+        df.loc[0, "temperature_2m"] = 99.0
+        _, quarantined, metrics = apply_rules(df, evaluate_rules(df, expected_hours=24, now=NOW))
+
+        assert record_dq_results(conn, "Johannesburg", quarantined, metrics, NOW) == 1
+        row = conn.execute("SELECT city, temperature_2m, reasons FROM dq_quarantine").fetchone()
+        assert row == ("Johannesburg", 99.0, ["out_of_range:temperature_2m"])
+        failed = conn.execute(
+            "SELECT rows_failed FROM dq_metrics WHERE rule = 'out_of_range:temperature_2m'"
+        ).fetchone()[0]
+        assert failed == 1
+        assert conn.execute("SELECT COUNT(*) FROM dq_metrics").fetchone()[0] == len(metrics)
+
+    def test_clean_batch_records_metrics_only(self, conn):
+        df = _batch()
+        _, quarantined, metrics = apply_rules(df, evaluate_rules(df, expected_hours=24, now=NOW))
+        assert record_dq_results(conn, "Johannesburg", quarantined, metrics, NOW) == 0
+        assert conn.execute("SELECT COUNT(*) FROM dq_quarantine").fetchone()[0] == 0
+        assert conn.execute("SELECT SUM(rows_failed) FROM dq_metrics").fetchone()[0] == 0
+
+    def test_quarantine_gains_new_variable_columns(self, conn):
+        create_dq_tables(conn)
+        wind = {"name": "windspeed_10m", "label": "Wind speed", "min": 0}
+        create_dq_tables(conn, load_variables({"variables": DEFAULT_VARIABLES + [wind]}))
+        assert table_columns(conn, "dq_quarantine")[-2:] == ["reasons", "windspeed_10m"]
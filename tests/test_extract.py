@@ -0,0 +1,211 @@
+import json
+import os
+import pytest
+
+from etl import extract
+from etl.extract import (
+    extract_weather_locations,
+    mark_location_loaded,
+    normalize_url,
+    payload_hash,
+    prune_response_cache,
+    retry_delay,
+)
+from etl.metrics import start_run
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.headers = headers or {}
+        self.text = json.dumps(self.payload)
+        self.content = self.text.encode() if status_code != 304 else b""
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Returns queued responses per latitude; records request count."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = 0
+        self.headers = []
+
+    def get(self, url, timeout, headers=None):
+        self.calls += 1
+        self.headers.append(headers or {})
+        latitude = float(url.split("latitude=")[1].split("&")[0])
+        return self.responses[latitude].pop(0)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waited = []
+
+    async def fake_sleep(seconds):
+        waited.append(seconds)
+
+    monkeypatch.setattr(extract.asyncio, "sleep", fake_sleep)
+    return waited
+
+
+def _location(latitude, name):
+    return {"latitude": latitude, "longitude": 0.0, "name": name}
+
+
+class TestRetryDelay:
+    def test_honors_retry_after_seconds(self):
+        assert retry_delay(0, FakeResponse(429, headers={"Retry-After": "7"})) == 7.0
+
+    def test_jittered_exponential_backoff(self):
+        for attempt in range(5):
+            assert 0 <= retry_delay(attempt, FakeResponse(503), backoff=1.0) <= 2 ** attempt
+
+    def test_capped(self):
+        assert retry_delay(20, None, backoff=1.0, max_backoff=5.0) <= 5.0
+
+    def test_long_retry_after_not_cut_to_backoff_cap(self):
+        response = FakeResponse(429, headers={"Retry-After": "120"})
+        assert retry_delay(0, response, max_backoff=60.0) == 120.0
+
+    def test_retry_after_clamped_and_logged(self, caplog):
+        response = FakeResponse(429, headers={"Retry-After": "7200"})
+        with caplog.at_level("WARNING"):
+            assert retry_delay(0, response, max_retry_after=900.0) == 900.0
+        assert "Retry-After of 7200s exceeds the 900s limit" in caplog.text
+
+
+class TestExtractLocations:
+    def test_max_retry_after_passed_through(self, tmp_path, sleeps):
+        session = FakeSession(
+            {1.0: [FakeResponse(429, headers={"Retry-After": "3600"}), FakeResponse(200, {"hourly": {}})]}
+        )
+        extract_weather_locations(
+            [_location(1.0, "A")], str(tmp_path), session=session, max_retry_after=300.0
+        )
+        assert sleeps == [300.0]
+
+    def test_retries_then_succeeds(self, tmp_path, sleeps):
+        session = FakeSession(
+            {1.0: [FakeResponse(429, headers={"Retry-After": "2"}), FakeResponse(503),
+                   FakeResponse(200, {"hourly": {}})]}
+        )
+
+        (path,) = extract_weather_locations(
+            [_location(1.0, "A")], str(tmp_path), retries=3, session=session
+        )
+
+        assert session.calls == 3
+        assert sleeps[0] == 2.0
+        with open(path) as f:
+            assert json.load(f) == {"hourly": {}}
+
+    def test_one_failure_does_not_abort_others(self, tmp_path, sleeps):
+        session = FakeSession(
+            {
+                1.0: [FakeResponse(400, {"reason": "bad"})],
+                2.0: [FakeResponse(200, {"hourly": {}})],
+            }
+        )
+
+        failed, ok = extract_weather_locations(
+            [_location(1.0, "A"), _location(2.0, "B")], str(tmp_path), session=session
+        )
+
+        assert isinstance(failed, Exception)
+        assert "400" in str(failed)
+        assert ok.endswith(".json")
+        assert sleeps == []  # 4xx other than 429 is not retried
+
+    def test_gives_up_after_retries(self, tmp_path, sleeps):
+        session = FakeSession({1.0: [FakeResponse(500)] * 3})
+
+        (result,) = extract_weather_locations(
+            [_location(1.0, "A")], str(tmp_path), retries=2, session=session
+        )
+
+        assert isinstance(result, Exception)
+        assert session.calls == 3
+        assert len(sleeps) == 2
+
+    def test_run_records_extract_spans(self, tmp_path, sleeps):
+        session = FakeSession(
+            {
+                1.0: [FakeResponse(503), FakeResponse(200, {"hourly": {}})],
+                2.0: [FakeResponse(400, {"reason": "bad"})],
+            }
+        )
+        run = start_run("pipeline")
+        extract_weather_locations(
+            [_location(1.0, "A"), _location(2.0, "B")], str(tmp_path), session=session, run=run
+        )
+
+        spans = {s["city"]: s for s in run["spans"]}
+        assert spans["A"]["stage"] == "extract"
+        assert spans["A"]["status"] == "ok"
+        # Retried bodies count too: "{}" then '{"hourly": {}}'
+        assert spans["A"]["bytes_downloaded"] == 2 + 14
+        assert spans["B"]["status"] == "failed"
+        assert "400" in spans["B"]["error"]
+
+
+class TestResponseCache:
+    def _extract(self, session, tmp_path, ttl=900):
+        return extract_weather_locations(
+            [_location(1.0, "A")], str(tmp_path / "raw"), session=session,
+            cache_dir=str(tmp_path / "cache"), cache_ttl=ttl,
+        )[0]
+
+    def test_fresh_entry_skips_request(self, tmp_path, sleeps):
+        session = FakeSession({1.0: [FakeResponse(200, {"hourly": {"t": [1]}})]})
+
+        assert self._extract(session, tmp_path).endswith(".json")
+        assert self._extract(session, tmp_path).endswith(".json")  # not loaded yet
+        assert session.calls == 1
+
+    def test_unchanged_payload_after_load_returns_none(self, tmp_path, sleeps):
+        payload = {"hourly": {"t": [1]}, "generationtime_ms": 0.1}
+        session = FakeSession(
+            {1.0: [FakeResponse(200, payload, {"ETag": '"v1"'}), FakeResponse(304)]}
+        )
+        self._extract(session, tmp_path)
+        mark_location_loaded(str(tmp_path / "cache"), 1.0, 0.0)
+
+        # Stale entry is revalidated with the ETag; 304 reuses the loaded body
+        assert self._extract(session, tmp_path, ttl=0) is None
+        assert session.headers[1] == {"If-None-Match": '"v1"'}
+
+    def test_changed_payload_is_extracted(self, tmp_path, sleeps):
+        session = FakeSession(
+            {1.0: [FakeResponse(200, {"hourly": {"t": [1]}}),
+                   FakeResponse(200, {"hourly": {"t": [2]}})]}
+        )
+        self._extract(session, tmp_path)
+        mark_location_loaded(str(tmp_path / "cache"), 1.0, 0.0)
+
+        assert self._extract(session, tmp_path, ttl=0).endswith(".json")
+
+    def test_prune_evicts_oldest_beyond_limit(self, tmp_path):
+        for i in range(3):
+            path = tmp_path / f"{i}.json"
+            path.write_text("{}")
+            os.utime(path, (1000 + i, 1000 + i))
+
+        removed = prune_response_cache(str(tmp_path), max_age_seconds=1e12, max_entries=2)
+
+        assert removed == 1
+        assert not (tmp_path / "0.json").exists()
+
+
+class TestCacheKeys:
+    def test_normalize_url_sorts_query(self):
+        assert normalize_url("HTTPS://Api.X.com/v1?b=2&a=1") == normalize_url("https://api.x.com/v1?a=1&b=2")
+
+    def test_payload_hash_ignores_generation_time(self):
+        assert payload_hash({"a": 1, "generationtime_ms": 0.2}) == payload_hash({"a": 1, "generationtime_ms": 0.9})
@@ -0,0 +1,81 @@
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from etl.feature_engineering import (
+    get_feature_history,
+    rebuild_weather_features,
+)
+from etl.load import upsert_weather_data
+from tests.conftest import weather_df
+
+
+def _make_df(city="TestCity", rows=48, start_hour=0, skip=()):
+    df = weather_df(city, rows, start_hour, precipitation=1.0)
+    return df.drop(index=list(skip)).reset_index(drop=True)
+
+
+def _features(conn):
+    return conn.execute(
+        "SELECT * FROM weather_features ORDER BY city, timestamp"
+    ).fetchdf()
+
+
+class TestWeatherFeatures:
+    def test_lags_are_exact_hours_across_gaps(self, conn):
+        # Hour 5 is missing, so hour 6 has no 1h lag
+        upsert_weather_data(conn, _make_df(rows=30, skip=[5]))
+        df = _features(conn).set_index("timestamp")
+
+        assert np.isnan(df.loc[datetime(2024, 1, 1, 6), "temperature_2m_lag_1h"])
+        assert df.loc[datetime(2024, 1, 1, 7), "temperature_2m_lag_1h"] == 16.0
+        assert df.loc[datetime(2024, 1, 2, 1), "temperature_2m_lag_24h"] == 11.0
+        assert np.isnan(df.loc[datetime(2024, 1, 1, 23), "temperature_2m_lag_24h"])
+
+    def test_rolling_windows_cover_trailing_24_hours(self, conn):
+        upsert_weather_data(conn, _make_df(rows=30))
+        row = _features(conn).iloc[25]
+
+        assert row["precipitation_sum_24h"] == 24.0
+        # Mean of hours 2..25 -> temperatures 12..35
+        assert row["temperature_2m_mean_24h"] == pytest.approx(23.5)
+
+    def test_incremental_refresh_matches_rebuild(self, conn):
+        upsert_weather_data(conn, _make_df(rows=30))
+        upsert_weather_data(conn, _make_df(rows=30, start_hour=20))
+        incremental = _features(conn)
+
+        rebuild_weather_features(conn)
+        rebuilt = _features(conn)
+
+        pd.testing.assert_frame_equal(incremental, rebuilt)
+        assert len(rebuilt) == 50
+
+    def test_dew_point_below_temperature(self, conn):
+        upsert_weather_data(conn, _make_df(rows=5))
+        df = _features(conn)
+
+        assert (df["dew_point_2m"] < df["temperature_2m"]).all()
+        assert df["hour_sin"].between(-1, 1).all()
+
+
+class TestGetFeatureHistory:
+    def test_limit_returns_latest_rows_with_nan_for_missing(self, conn):
+        upsert_weather_data(conn, _make_df(rows=30))
+
+        ts, values = get_feature_history(
+            conn, "TestCity", ["temperature_2m", "temperature_2m_lag_24h"], limit=10
+        )
+
+        assert values.shape == (10, 2)
+        assert values.dtype == np.float32
+        assert pd.Timestamp(ts[-1]) == pd.Timestamp(datetime(2024, 1, 2, 5))
+        assert np.isnan(values[0, 1])  # hour 20 has no 24h lag
+        assert values[-1, 1] == 15.0
+
+    def test_unknown_feature_raises(self, conn):
+        upsert_weather_data(conn, _make_df(rows=5))
+
+        with pytest.raises(ValueError, match="Unknown features"):
+            get_feature_history(conn, "TestCity", ["not_a_feature"])
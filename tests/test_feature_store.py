@@ -0,0 +1,86 @@
+import pytest
+import numpy as np
+from functools import partial
+from datetime import datetime
+
+from etl.feature_store import (
+    create_feature_store,
+    get_scaled_series,
+    get_scaling_params,
+    rebuild_feature_stats,
+    record_model_scaling,
+)
+from etl.load import create_weather_table, upsert_weather_data
+from tests.conftest import weather_df
+
+
+_make_df = partial(weather_df, temperature_step=2.0, humidity=40.0, humidity_step=1.0)
+
+
+class TestFeatureStats:
+    def test_incremental_matches_full_rebuild(self, conn):
+        upsert_weather_data(conn, _make_df(rows=10))
+        upsert_weather_data(conn, _make_df(rows=10, start_hour=5))
+        incremental = conn.execute(
+            "SELECT * FROM feature_stats ORDER BY city, feature"
+        ).fetchall()
+        rebuild_feature_stats(conn)
+        rebuilt = conn.execute("SELECT * FROM feature_stats ORDER BY city, feature").fetchall()
+        assert incremental == rebuilt
+
+    def test_seeded_from_existing_history(self, conn):
+        conn.register("seed", _make_df(rows=4))
+        conn.execute("CREATE TABLE weather_hourly AS SELECT * FROM seed")
+        create_weather_table(conn)
+        create_feature_store(conn)
+        data_min, data_max = get_scaling_params(conn, "TestCity")
+        np.testing.assert_allclose(data_min, [10.0, 40.0, 0.0])
+        np.testing.assert_allclose(data_max, [16.0, 43.0, 0.0])
+
+    def test_summary_mean_and_std(self, conn):
+        upsert_weather_data(conn, _make_df(rows=3))
+        mean, std = conn.execute(
+            "SELECT mean_value, std_value FROM feature_stats_summary "
+            "WHERE feature = 'temperature_2m'"
+        ).fetchone()
+        assert mean == pytest.approx(12.0)
+        assert std == pytest.approx(np.std([10.0, 12.0, 14.0]))
+
+    def test_unknown_city_raises(self, conn):
+        create_weather_table(conn)
+        create_feature_store(conn)
+        with pytest.raises(ValueError, match="No feature statistics"):
+            get_scaling_params(conn, "Nowhere")
+
+
+    def test_ranges_before_end_exclude_later_rows(self, conn):
+        upsert_weather_data(conn, _make_df(rows=10))
+        data_min, data_max = get_scaling_params(conn, "TestCity", end=datetime(2024, 1, 1, 4))
+        np.testing.assert_allclose(data_min, [10.0, 40.0, 0.0])
+        np.testing.assert_allclose(data_max, [16.0, 43.0, 0.0])
+
+    def test_ranges_before_first_row_raise(self, conn):
+        upsert_weather_data(conn, _make_df(rows=3, start_hour=5))
+        with pytest.raises(ValueError, match="No feature statistics"):
+            get_scaling_params(conn, "TestCity", end=datetime(2024, 1, 1))
+
+
+class TestModelScaling:
+    def test_recorded_per_version_and_feature(self, conn):
+        record_model_scaling(conn, "v1", "TestCity", ["temperature_2m", "precipitation"], [1.0, 0.0], [9.0, 2.0])
+        record_model_scaling(conn, "v1", "TestCity", ["temperature_2m"], [2.0], [8.0])
+        rows = conn.execute(
+            "SELECT feature, min_value, max_value FROM model_scaling WHERE model_version = 'v1' ORDER BY feature"
+        ).fetchall()
+        assert rows == [("precipitation", 0.0, 2.0), ("temperature_2m", 2.0, 8.0)]
+
+
+class TestScaledView:
+    def test_scaled_series_is_min_max_normalized(self, conn):
+        upsert_weather_data(conn, _make_df(rows=5))
+        timestamps, values = get_scaled_series(conn, "TestCity")
+        assert values.dtype == np.float32
+        assert len(timestamps) == 5
+        np.testing.assert_allclose(values[:, 0], [0.0, 0.25, 0.5, 0.75, 1.0])
+        # Constant precipitation keeps unit scale instead of dividing by zero
+        np.testing.assert_allclose(values[:, 2], 0.0)
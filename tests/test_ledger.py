@@ -0,0 +1,63 @@
+import pandas as pd
+from datetime import datetime
+
+from etl.ledger import diff_against_warehouse, last_payload_hash, record_payload
+from etl.load import upsert_weather_data
+from tests.conftest import weather_df
+
+
+def _make_df(rows=10, start_hour=0, offset=0.0):
+    return weather_df(rows=rows, start_hour=start_hour, temperature=10.0 + start_hour + offset)
+
+
+class TestPayloadLedger:
+    def test_keeps_last_payload_per_city(self, conn):
+        record_payload(conn, "TestCity", "abc", _make_df(), 10, 0.3)
+        record_payload(conn, "TestCity", "def", _make_df(), 0)
+        rows = conn.execute(
+            "SELECT payload_hash, rows_loaded, generation_time_ms FROM payload_ledger"
+        ).fetchall()
+        assert rows == [("def", 0, None)]
+
+    def test_last_payload_hash(self, conn):
+        assert last_payload_hash(conn, "TestCity") is None
+        record_payload(conn, "TestCity", "abc", _make_df(), 10)
+        assert last_payload_hash(conn, "TestCity") == "abc"
+        assert last_payload_hash(conn, "OtherCity") is None
+
+
+class TestDiffAgainstWarehouse:
+    def test_empty_warehouse_passes_everything(self, conn):
+        changed, revised = diff_against_warehouse(conn, _make_df())
+        assert len(changed) == 10
+        assert revised == 0
+
+    def test_overlap_keeps_only_new_hours(self, conn):
+        upsert_weather_data(conn, _make_df(rows=10))
+
+        changed, revised = diff_against_warehouse(conn, _make_df(rows=10, start_hour=6))
+
+        assert len(changed) == 6
+        assert changed["timestamp"].min() == pd.Timestamp(datetime(2024, 1, 1, 10))
+        assert revised == 0
+
+    def test_revised_hours_pass_through(self, conn):
+        upsert_weather_data(conn, _make_df(rows=10))
+        batch = _make_df(rows=10, start_hour=6)
+        batch.loc[batch["timestamp"] == datetime(2024, 1, 1, 7), "temperature_2m"] += 0.5
+
+        changed, revised = diff_against_warehouse(conn, batch)
+
+        assert revised == 1
+        assert changed["timestamp"].tolist() == [pd.Timestamp(datetime(2024, 1, 1, 7))] + [
+            pd.Timestamp(datetime(2024, 1, 1, h)) for h in range(10, 16)
+        ]
+
+    def test_unknown_location_passes_everything(self, conn):
+        upsert_weather_data(conn, _make_df(rows=10))
+        other = _make_df(rows=10).assign(city="OtherCity")
+
+        changed, revised = diff_against_warehouse(conn, other)
+
+        assert len(changed) == 10
+        assert revised == 0
@@ -1,32 +1,46 @@
 import pytest
-import duckdb
 import pandas as pd
-from datetime import datetime, timezone
-
-from etl.load import create_weather_table, upsert_weather_data, backfill_city
-
-
-@pytest.fixture
-def conn():
-    """Create an in-memory DuckDB connection for testing."""
-    c = duckdb.connect(":memory:")
-    yield c
-    c.close()
-
-
-def _make_df(city="TestCity", rows=3, start_hour=0):
-    base = datetime(2024, 1, 1, start_hour)
-    return pd.DataFrame(
-        {
-            "timestamp": pd.date_range(base, periods=rows, freq="h"),
-            "temperature_2m": [20.0 + i for i in range(rows)],
-            "relativehumidity_2m": [50.0] * rows,
-            "precipitation": [0.0] * rows,
-            "city": city,
-            "latitude": -26.2,
-            "longitude": 28.0,
-            "load_date": datetime.now(timezone.utc).date(),
-        }
+from functools import partial
+from datetime import datetime
+
+from etl.data_access import (
+    get_data_versions,
+    get_latest_weather,
+    get_revision_history,
+    get_weather_history,
+)
+from etl.feature_engineering import rebuild_weather_features
+from etl.locations import register_locations
+from etl.variables import DEFAULT_VARIABLES, load_variables
+from etl.load import (
+    append_weather_revisions,
+    backfill_city,
+    create_model_tables,
+    create_verification_tables,
+    create_weather_table,
+    upsert_weather_data,
+)
+from tests.conftest import weather_df
+
+
+_make_df = partial(weather_df, rows=3, temperature=20.0)
+
+
+def _create_legacy_table(conn):
+    """weather_hourly as a plain table, the layout before the locations dimension."""
+    conn.execute(
+        """
+        CREATE TABLE weather_hourly (
+            timestamp TIMESTAMP,
+            temperature_2m DOUBLE,
+            relativehumidity_2m DOUBLE,
+            precipitation DOUBLE,
+            city VARCHAR,
+            latitude DOUBLE,
+            longitude DOUBLE,
+            load_date DATE
+        )
+        """
     )
 
 
@@ -69,10 +83,112 @@ class TestUpsert:
         result = conn.execute("SELECT COUNT(*) FROM weather_hourly").fetchone()[0]
         assert result == 6
 
+    def test_keeps_first_value_without_revise(self, conn):
+        upsert_weather_data(conn, _make_df())
+        upsert_weather_data(conn, _make_df().assign(temperature_2m=0.0))
+        assert conn.execute("SELECT MIN(temperature_2m) FROM weather_hourly").fetchone()[0] == 20.0
+
+    def test_revise_overwrites_changed_hours(self, conn):
+        upsert_weather_data(conn, _make_df())
+        revised = _make_df(rows=4)
+        revised.loc[1, "temperature_2m"] = 30.0
+        upsert_weather_data(conn, revised, revise=True)
+
+        temps = conn.execute("SELECT temperature_2m FROM weather_hourly ORDER BY timestamp").fetchall()
+        assert temps == [(20.0,), (30.0,), (22.0,), (23.0,)]
+        n, total, hi = conn.execute(
+            "SELECT n, sum_value, max_value FROM feature_stats WHERE feature = 'temperature_2m'"
+        ).fetchone()
+        assert (n, total, hi) == (4, 20.0 + 30.0 + 22.0 + 23.0, 30.0)
+        feature = conn.execute(
+            "SELECT temperature_2m FROM weather_features WHERE timestamp = '2024-01-01 01:00:00'"
+        ).fetchone()[0]
+        assert feature == 30.0
+        assert get_data_versions(conn) == {"TestCity": 2}
+
+
+class TestLocationKeys:
+    def test_facts_keyed_on_location_id(self, conn):
+        upsert_weather_data(conn, _make_df(city="CityA"))
+        upsert_weather_data(conn, _make_df(city="CityB"))
+        locations = conn.execute("SELECT location_id, city FROM locations ORDER BY city").fetchall()
+        assert [city for _, city in locations] == ["CityA", "CityB"]
+        counts = conn.execute(
+            "SELECT location_id, COUNT(*) FROM weather_hourly_facts GROUP BY location_id ORDER BY location_id"
+        ).fetchall()
+        assert counts == [(locations[0][0], 3), (locations[1][0], 3)]
+
+    def test_view_matches_loaded_rows(self, conn):
+        df = _make_df()
+        upsert_weather_data(conn, df)
+        rows = conn.execute(
+            "SELECT timestamp, temperature_2m, city, latitude, longitude FROM weather_hourly ORDER BY timestamp"
+        ).fetchdf()
+        pd.testing.assert_frame_equal(
+            rows, df[["timestamp", "temperature_2m", "city", "latitude", "longitude"]], check_dtype=False
+        )
+
+    def test_migrates_legacy_table(self, conn):
+        _create_legacy_table(conn)
+        conn.execute(
+            """
+            INSERT INTO weather_hourly VALUES
+                ('2024-01-01 00:00:00', 20.0, 50.0, 0.0, 'CityA', -26.2, 28.0, '2024-01-01'),
+                ('2024-01-01 00:00:00', 25.0, 50.0, 0.0, 'CityA', -26.2, 28.0, '2024-01-02'),
+                ('2024-01-01 01:00:00', 21.0, 50.0, 0.0, 'CityA', -26.2, 28.0, '2024-01-01'),
+                ('2024-01-01 00:00:00', 10.0, 60.0, 0.0, NULL, -34.0, 18.5, '2024-01-01')
+            """
+        )
+        create_weather_table(conn)
+        table_type = conn.execute(
+            "SELECT table_type FROM information_schema.tables WHERE table_name = 'weather_hourly'"
+        ).fetchone()[0]
+        assert table_type == "VIEW"
+        rows = conn.execute(
+            "SELECT city, timestamp, temperature_2m FROM weather_hourly ORDER BY latitude DESC, timestamp"
+        ).fetchall()
+        assert rows == [
+            ("CityA", datetime(2024, 1, 1, 0), 20.0),
+            ("CityA", datetime(2024, 1, 1, 1), 21.0),
+            (None, datetime(2024, 1, 1, 0), 10.0),
+        ]
+        # Loading after the migration keeps deduplicating against migrated rows
+        upsert_weather_data(conn, _make_df(city="CityA", rows=3))
+        assert conn.execute("SELECT COUNT(*) FROM weather_hourly WHERE city = 'CityA'").fetchone()[0] == 3
+
+
+class TestVariableColumns:
+    def test_new_variable_adds_column(self, conn):
+        upsert_weather_data(conn, _make_df(rows=2))
+        variables = load_variables(
+            {"variables": DEFAULT_VARIABLES + [{"name": "windspeed_10m", "min": 0}]}
+        )
+        df = _make_df(rows=4).assign(windspeed_10m=[5.0, 6.0, 7.0, 8.0])
+        upsert_weather_data(conn, df, variables)
+        rows = conn.execute(
+            "SELECT timestamp, temperature_2m, windspeed_10m FROM weather_hourly ORDER BY timestamp"
+        ).fetchall()
+        # Hours loaded before the variable existed read NULL
+        assert [r[2] for r in rows] == [None, None, 7.0, 8.0]
+        assert rows[3][1] == 23.0
+
+    def test_revisions_track_new_variable(self, conn):
+        variables = load_variables(
+            {"variables": DEFAULT_VARIABLES + [{"name": "windspeed_10m", "min": 0}]}
+        )
+        df = _make_df(rows=2).assign(windspeed_10m=[5.0, 6.0])
+        append_weather_revisions(conn, df, datetime(2024, 1, 1), variables)
+        revised = df.assign(windspeed_10m=[5.0, 9.0])
+        assert append_weather_revisions(conn, revised, datetime(2024, 1, 2), variables) == 1
+        latest = conn.execute(
+            "SELECT windspeed_10m, revision_count FROM weather_hourly_latest ORDER BY timestamp"
+        ).fetchall()
+        assert latest == [(5.0, 1), (9.0, 2)]
+
 
 class TestBackfillCity:
     def test_backfills_null_city(self, conn):
-        create_weather_table(conn)
+        _create_legacy_table(conn)
         conn.execute(
             """
             INSERT INTO weather_hourly
@@ -88,3 +204,292 @@ class TestBackfillCity:
             "SELECT city FROM weather_hourly WHERE latitude=-26.2"
         ).fetchone()[0]
         assert city == "Johannesburg"
+        assert get_data_versions(conn) == {"Johannesburg": 1}
+
+    def test_backfills_grid_snapped_coordinates(self, conn):
+        _create_legacy_table(conn)
+        # Open-Meteo serves Cape Town from the -34.0, 18.5 grid point
+        conn.execute(
+            """
+            INSERT INTO weather_hourly
+                (timestamp, temperature_2m, relativehumidity_2m, precipitation,
+                 city, latitude, longitude, load_date)
+            VALUES ('2024-01-01 00:00:00', 20.0, 50.0, 0.0, NULL, -34.0, 18.5, '2024-01-01'),
+                   ('2024-01-01 00:00:00', 20.0, 50.0, 0.0, NULL, 10.0, 10.0, '2024-01-01')
+            """
+        )
+        locations = [
+            {"name": "Cape Town", "latitude": -33.9249, "longitude": 18.4241},
+            {"name": "Johannesburg", "latitude": -26.2041, "longitude": 28.0473},
+        ]
+        assert backfill_city(conn, locations) == 1
+        rows = conn.execute("SELECT latitude, city FROM weather_hourly ORDER BY latitude").fetchall()
+        # Merged into the configured location, with the grid point as its alias
+        assert rows == [(-33.9249, "Cape Town"), (10.0, None)]
+        assert conn.execute(
+            "SELECT grid_latitude, grid_longitude FROM locations WHERE city = 'Cape Town'"
+        ).fetchall() == [(-34.0, 18.5)]
+
+    def test_merges_into_existing_location(self, conn):
+        # Loaded before the city was known, so left unattributed
+        upsert_weather_data(conn, _make_df(city=None, rows=3))
+        upsert_weather_data(conn, _make_df(city="Johannesburg", rows=2))
+        locations = [{"name": "Johannesburg", "latitude": -26.2, "longitude": 28.0}]
+        assert backfill_city(conn, locations) == 3
+        rows = conn.execute("SELECT city, COUNT(*) FROM weather_hourly GROUP BY city").fetchall()
+        assert rows == [("Johannesburg", 3)]
+        assert conn.execute("SELECT COUNT(*) FROM locations WHERE city IS NULL").fetchone()[0] == 0
+
+
+class TestResolveOnLoad:
+    def test_unattributed_rows_take_nearest_city(self, conn):
+        register_locations(conn, [{"name": "Cape Town", "latitude": -33.9249, "longitude": 18.4241}])
+        upsert_weather_data(conn, _make_df(city=None, rows=2, latitude=-34.0, longitude=18.5))
+        upsert_weather_data(conn, _make_df(city=None, rows=2, latitude=10.0, longitude=10.0))
+        rows = conn.execute(
+            "SELECT city, latitude, COUNT(*) FROM weather_hourly GROUP BY ALL ORDER BY latitude"
+        ).fetchall()
+        assert rows == [("Cape Town", -33.9249, 2), (None, 10.0, 2)]
+        assert get_data_versions(conn) == {"Cape Town": 1}
+
+    def _cape_town_rows(self, city):
+        return _make_df(city=city, latitude=-33.9249 if city else -34.0, longitude=18.4241 if city else 18.5)
+
+    def _assert_single_location(self, conn):
+        assert conn.execute(
+            "SELECT latitude, longitude, grid_latitude, grid_longitude FROM locations WHERE city = 'Cape Town'"
+        ).fetchall() == [(-33.9249, 18.4241, -34.0, 18.5)]
+        assert conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT timestamp) FROM weather_hourly WHERE city = 'Cape Town'"
+        ).fetchone() == (3, 3)
+        rebuild_weather_features(conn)
+        assert conn.execute("SELECT COUNT(*) FROM weather_features").fetchone()[0] == 3
+
+    def test_resolved_rows_join_canonical_location(self, conn):
+        locations = [{"name": "Cape Town", "latitude": -33.9249, "longitude": 18.4241}]
+        register_locations(conn, locations)
+        upsert_weather_data(conn, self._cape_town_rows("Cape Town"))
+        # The same hours as served from the grid point, without a city
+        upsert_weather_data(conn, self._cape_town_rows(None))
+        assert backfill_city(conn, locations) == 0
+        self._assert_single_location(conn)
+
+    def test_backfilled_rows_join_canonical_location(self, conn):
+        # Loaded before Cape Town was known, so left unattributed
+        upsert_weather_data(conn, self._cape_town_rows(None))
+        locations = [{"name": "Cape Town", "latitude": -33.9249, "longitude": 18.4241}]
+        register_locations(conn, locations)
+        upsert_weather_data(conn, self._cape_town_rows("Cape Town"))
+        assert backfill_city(conn, locations) == 3
+        self._assert_single_location(conn)
+
+
+class TestDataVersions:
+    def test_empty_before_first_load(self, conn):
+        assert get_data_versions(conn) == {}
+
+    def test_load_bumps_only_loaded_city(self, conn):
+        upsert_weather_data(conn, _make_df(city="CityA"))
+        upsert_weather_data(conn, _make_df(city="CityB"))
+        upsert_weather_data(conn, _make_df(city="CityA", start_hour=3))
+        assert get_data_versions(conn) == {"CityA": 2, "CityB": 1}
+
+    def test_duplicate_batch_does_not_bump(self, conn):
+        upsert_weather_data(conn, _make_df())
+        upsert_weather_data(conn, _make_df())
+        assert get_data_versions(conn) == {"TestCity": 1}
+
+
+class TestForecastTable:
+    def test_unkeyed_table_deduplicated(self, conn):
+        conn.execute(
+            """
+            CREATE TABLE weather_forecasts (
+                city VARCHAR, forecast_timestamp TIMESTAMP, target_timestamp TIMESTAMP,
+                horizon_hours INTEGER, temperature_2m DOUBLE, relativehumidity_2m DOUBLE,
+                precipitation DOUBLE, model_version VARCHAR
+            )
+            """
+        )
+        for temperature in (20.0, 21.0):
+            conn.execute(
+                """
+                INSERT INTO weather_forecasts VALUES
+                ('TestCity', TIMESTAMP '2024-01-01 00:00:00', TIMESTAMP '2024-01-01 01:00:00',
+                 24, ?, 50.0, 0.0, 'v1')
+                """,
+                [temperature],
+            )
+        create_model_tables(conn)
+        assert conn.execute("SELECT temperature_2m FROM weather_forecasts").fetchall() == [(20.0,)]
+        conn.execute(
+            """
+            INSERT INTO weather_forecasts VALUES
+            ('TestCity', TIMESTAMP '2024-01-01 00:00:00', TIMESTAMP '2024-01-01 01:00:00',
+             24, 22.0, 50.0, 0.0, 'v1')
+            ON CONFLICT DO NOTHING
+            """
+        )
+        assert conn.execute("SELECT COUNT(*) FROM weather_forecasts").fetchone()[0] == 1
+
+
+class TestForecastVerification:
+    def _issue_forecast(self, conn, city="TestCity", hours=3, offset=1.0):
+        create_verification_tables(conn)
+        conn.execute(
+            """
+            INSERT INTO weather_forecasts
+            SELECT ?, TIMESTAMP '2023-12-31 23:00:00', ts, 24,
+                   20.0 + i + ?, 50.0, 0.0, 'v1'
+            FROM (
+                SELECT TIMESTAMP '2024-01-01 00:00:00' + INTERVAL (i) HOUR AS ts, i
+                FROM range(?) t(i)
+            )
+            """,
+            [city, offset, hours],
+        )
+
+    def test_scores_new_actuals(self, conn):
+        self._issue_forecast(conn)
+        upsert_weather_data(conn, _make_df())
+        rows = conn.execute(
+            "SELECT lead_hours, error_temperature_2m FROM forecast_verification ORDER BY lead_hours"
+        ).fetchall()
+        assert rows == [(1, 1.0), (2, 1.0), (3, 1.0)]
+
+    def test_skill_accumulates_once_per_actual(self, conn):
+        self._issue_forecast(conn)
+        df = _make_df()
+        upsert_weather_data(conn, df)
+        upsert_weather_data(conn, df)
+        n, sum_abs = conn.execute(
+            "SELECT SUM(n), SUM(sum_abs_temperature_2m) FROM forecast_skill"
+        ).fetchone()
+        assert n == 3
+        assert sum_abs == pytest.approx(3.0)
+
+    def test_revised_actuals_are_rescored(self, conn):
+        self._issue_forecast(conn)
+        upsert_weather_data(conn, _make_df())
+        revised = _make_df()
+        revised.loc[1, "temperature_2m"] = 0.0
+        upsert_weather_data(conn, revised, revise=True)
+
+        rows = conn.execute(
+            "SELECT lead_hours, error_temperature_2m FROM forecast_verification ORDER BY lead_hours"
+        ).fetchall()
+        assert rows == [(1, 1.0), (2, 22.0), (3, 1.0)]
+        n, sum_abs = conn.execute(
+            "SELECT SUM(n), SUM(sum_abs_temperature_2m) FROM forecast_skill"
+        ).fetchone()
+        assert n == 3
+        assert sum_abs == pytest.approx(24.0)
+
+    def test_only_new_batch_is_joined(self, conn):
+        self._issue_forecast(conn, hours=6)
+        upsert_weather_data(conn, _make_df(rows=3))
+        upsert_weather_data(conn, _make_df(rows=3, start_hour=3))
+        n = conn.execute("SELECT COUNT(*) FROM forecast_verification").fetchone()[0]
+        assert n == 6
+        leads = conn.execute(
+            "SELECT lead_hours, n FROM forecast_skill ORDER BY lead_hours"
+        ).fetchall()
+        assert leads == [(i, 1) for i in range(1, 7)]
+
+
+class TestWeatherRevisions:
+    def test_first_issue_appends_every_hour(self, conn):
+        appended = append_weather_revisions(conn, _make_df(), datetime(2024, 1, 1))
+        assert appended == 3
+        latest = conn.execute("SELECT COUNT(*), MAX(revision_count) FROM weather_hourly_latest").fetchone()
+        assert latest == (3, 1)
+
+    def test_unchanged_issue_appends_nothing(self, conn):
+        append_weather_revisions(conn, _make_df(), datetime(2024, 1, 1))
+        appended = append_weather_revisions(conn, _make_df(), datetime(2024, 1, 2))
+        assert appended == 0
+        assert conn.execute("SELECT COUNT(*) FROM weather_revisions").fetchone()[0] == 3
+
+    def test_changed_hours_become_latest(self, conn):
+        append_weather_revisions(conn, _make_df(), datetime(2024, 1, 1))
+        revised = _make_df()
+        revised.loc[1, "temperature_2m"] = 30.0
+        appended = append_weather_revisions(conn, revised, datetime(2024, 1, 2))
+        assert appended == 1
+
+        row = conn.execute(
+            "SELECT temperature_2m, issued_at, revision_count FROM weather_hourly_latest "
+            "WHERE timestamp = '2024-01-01 01:00:00'"
+        ).fetchone()
+        assert row == (30.0, datetime(2024, 1, 2), 2)
+
+        history = get_revision_history(conn, "TestCity", "2024-01-01 01:00:00", "2024-01-01 01:00:00")
+        assert history["temperature_2m"].tolist() == [21.0, 30.0]
+
+    def test_older_issue_does_not_replace_latest(self, conn):
+        append_weather_revisions(conn, _make_df(), datetime(2024, 1, 2))
+        stale = _make_df()
+        stale["temperature_2m"] = 0.0
+        append_weather_revisions(conn, stale, datetime(2024, 1, 1))
+        assert conn.execute("SELECT MIN(temperature_2m) FROM weather_hourly_latest").fetchone()[0] == 20.0
+        assert conn.execute("SELECT COUNT(*) FROM weather_revisions").fetchone()[0] == 6
+
+    def test_weather_hourly_keeps_first_value(self, conn):
+        upsert_weather_data(conn, _make_df())
+        revised = _make_df()
+        revised["temperature_2m"] = 0.0
+        append_weather_revisions(conn, revised)
+        assert conn.execute("SELECT MIN(temperature_2m) FROM weather_hourly").fetchone()[0] == 20.0
+
+    def test_revisions_keyed_on_location_id(self, conn):
+        upsert_weather_data(conn, _make_df())
+        append_weather_revisions(conn, _make_df(), datetime(2024, 1, 1))
+        location_id = conn.execute("SELECT location_id FROM weather_hourly_facts LIMIT 1").fetchone()[0]
+        assert conn.execute("SELECT DISTINCT location_id FROM weather_hourly_latest").fetchall() == [(location_id,)]
+        assert "city" not in conn.execute("SELECT * FROM weather_revisions LIMIT 0").fetchdf().columns
+
+    def test_current_view_reads_latest_revision(self, conn):
+        upsert_weather_data(conn, _make_df())
+        revised = _make_df()
+        revised.loc[1, "temperature_2m"] = 30.0
+        append_weather_revisions(conn, revised, datetime(2024, 1, 2))
+
+        assert get_latest_weather(conn, "TestCity")["temperature_2m"].tolist() == [22.0]
+        history = get_weather_history(conn, "TestCity", "2024-01-01", "2024-01-02")
+        assert history["temperature_2m"].tolist() == [20.0, 30.0, 22.0]
+
+    def test_migrates_location_columns(self, conn):
+        conn.execute(
+            """
+            CREATE TABLE weather_revisions (
+                city VARCHAR, latitude DOUBLE, longitude DOUBLE, timestamp TIMESTAMP,
+                issued_at TIMESTAMP, temperature_2m DOUBLE, relativehumidity_2m DOUBLE,
+                precipitation DOUBLE
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE weather_hourly_latest (
+                city VARCHAR, latitude DOUBLE, longitude DOUBLE, timestamp TIMESTAMP,
+                issued_at TIMESTAMP, temperature_2m DOUBLE, relativehumidity_2m DOUBLE,
+                precipitation DOUBLE, revision_count INTEGER
+            )
+            """
+        )
+        for issued, temperature in (("2024-01-01", 20.0), ("2024-01-02", 25.0)):
+            conn.execute(
+                "INSERT INTO weather_revisions VALUES "
+                "('TestCity', -26.2, 28.0, TIMESTAMP '2024-01-03 00:00:00', ?, ?, 50.0, 0.0)",
+                [issued, temperature],
+            )
+
+        append_weather_revisions(conn, _make_df(rows=1), datetime(2024, 1, 3))
+
+        assert conn.execute("SELECT COUNT(*) FROM weather_revisions").fetchone()[0] == 3
+        latest = conn.execute(
+            "SELECT timestamp, temperature_2m, revision_count FROM weather_hourly_latest ORDER BY timestamp"
+        ).fetchall()
+        assert latest == [(datetime(2024, 1, 1), 20.0, 1), (datetime(2024, 1, 3), 25.0, 2)]
+        history = get_revision_history(conn, "TestCity", "2024-01-03 00:00:00", "2024-01-03 00:00:00")
+        assert history["temperature_2m"].tolist() == [20.0, 25.0]
@@ -0,0 +1,73 @@
+import pytest
+import numpy as np
+
+from etl.locations import (
+    LocationIndex,
+    build_location_index,
+    geohash,
+    record_grid_point,
+    register_locations,
+)
+
+
+LOCATIONS = [
+    {"name": "Johannesburg", "latitude": -26.2041, "longitude": 28.0473},
+    {"name": "Cape Town", "latitude": -33.9249, "longitude": 18.4241},
+]
+
+
+class TestGeohash:
+    def test_known_value(self):
+        assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+    def test_precision_is_prefix(self):
+        assert geohash(-33.9249, 18.4241, 9).startswith(geohash(-33.9249, 18.4241, 5))
+
+
+class TestLocationIndex:
+    def test_nearest(self):
+        index = LocationIndex(["A", "B"], [0.0, 10.0], [0.0, 10.0])
+        name, km = index.nearest(9.0, 9.5)
+        assert name == "B"
+        assert km == pytest.approx(124, abs=2)
+
+    def test_nearest_across_antimeridian(self):
+        index = LocationIndex(["East", "Mid"], [0.0, 0.0], [179.9, 100.0])
+        assert index.nearest(0.0, -179.9)[0] == "East"
+
+    def test_max_distance(self):
+        index = LocationIndex(["A"], [0.0], [0.0])
+        assert index.nearest(1.0, 1.0, max_km=10) is None
+        assert index.nearest_many([0.01, 5.0], [0.01, 5.0], max_km=10) == ["A", None]
+
+    def test_empty(self):
+        index = LocationIndex([], [], [])
+        assert index.nearest(0.0, 0.0) is None
+        assert index.within_bbox(-1, -1, 1, 1) == []
+
+    def test_bbox(self):
+        rng = np.random.default_rng(0)
+        lat = rng.uniform(-60, 60, 20_000)
+        lon = rng.uniform(-180, 180, 20_000)
+        names = [f"p{i}" for i in range(len(lat))]
+        index = LocationIndex(names, lat, lon)
+
+        found = set(index.within_bbox(-10, 20, 10, 40))
+        expected = {names[i] for i in np.flatnonzero((lat >= -10) & (lat <= 10) & (lon >= 20) & (lon <= 40))}
+        assert found == expected
+
+    def test_bbox_across_antimeridian(self):
+        index = LocationIndex(["W", "E", "Mid"], [0.0, 0.0, 0.0], [-179.0, 179.0, 0.0])
+        assert sorted(index.within_bbox(-1, 178, 1, -178)) == ["E", "W"]
+
+
+class TestLocationsTable:
+    def test_index_includes_grid_points(self, conn):
+        register_locations(conn, LOCATIONS)
+        record_grid_point(conn, "Cape Town", {"latitude": -34.0, "longitude": 18.5})
+        index = build_location_index(conn)
+        assert len(index) == 3
+        assert index.nearest(-34.0, 18.5)[1] == pytest.approx(0.0, abs=1e-6)
+
+    def test_missing_table_gives_empty_index(self, conn):
+        assert len(build_location_index(conn)) == 0
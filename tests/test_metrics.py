@@ -0,0 +1,127 @@
+import os
+import pytest
+from datetime import datetime
+
+from etl.metrics import complete_run, end_run, export_metrics, record_run, render_metrics, span, start_run
+
+
+def _finished_run():
+    run = start_run("pipeline")
+    with span(run, "extract", "Cape Town", bytes_downloaded=0) as record:
+        record["bytes_downloaded"] += 2048
+    with span(run, "load", "Cape Town", rows_in=168) as record:
+        record["rows_out"] = 160
+    with span(run, "backfill") as record:
+        record["rows_out"] = 0
+    return end_run(run)
+
+
+class TestSpan:
+    def test_records_timings_and_fields(self):
+        run = start_run("pipeline")
+        with span(run, "transform", "Johannesburg", rows_in=10) as record:
+            sum(range(10000))
+            record["rows_out"] = 9
+
+        (recorded,) = run["spans"]
+        assert (recorded["stage"], recorded["city"], recorded["rows_in"], recorded["rows_out"]) == (
+            "transform", "Johannesburg", 10, 9
+        )
+        assert recorded["status"] == "ok"
+        assert recorded["wall_seconds"] > 0
+        assert recorded["cpu_seconds"] >= 0
+        assert recorded["peak_rss_bytes"] is None or recorded["peak_rss_bytes"] > 0
+
+    def test_failure_recorded_and_raised(self):
+        run = start_run("pipeline")
+        with pytest.raises(ValueError):
+            with span(run, "transform", "Johannesburg"):
+                raise ValueError("Missing 'hourly' section")
+        assert run["spans"][0]["status"] == "failed"
+        assert run["spans"][0]["error"] == "ValueError: Missing 'hourly' section"
+
+    def test_without_run_is_not_kept(self):
+        with span(None, "load") as record:
+            record["rows_out"] = 1
+        assert record["wall_seconds"] >= 0
+
+
+class TestRecordRun:
+    def test_writes_run_and_spans(self, conn):
+        run = _finished_run()
+        record_run(conn, run)
+
+        row = conn.execute("SELECT kind, status, rows_loaded, spans FROM pipeline_runs").fetchone()
+        assert row == ("pipeline", "ok", 160, 3)
+        spans = conn.execute(
+            "SELECT stage, city, rows_in, rows_out, bytes_downloaded FROM pipeline_spans ORDER BY stage"
+        ).fetchall()
+        assert spans == [
+            ("backfill", None, None, 0, None),
+            ("extract", "Cape Town", None, None, 2048),
+            ("load", "Cape Town", 168, 160, None),
+        ]
+        assert conn.execute("SELECT DISTINCT run_id FROM pipeline_spans").fetchall() == [(run["run_id"],)]
+
+    def test_counts_null_outside_scheduler(self, conn):
+        record_run(conn, _finished_run())
+        assert conn.execute("SELECT locations, loaded FROM pipeline_runs").fetchone() == (None, None)
+
+    def test_cycles_table_folded_into_runs(self, conn):
+        conn.execute(
+            """
+            CREATE TABLE pipeline_cycles AS
+            SELECT TIMESTAMP '2024-01-01 00:00:00' AS started_at, 3 AS locations, 2 AS loaded,
+                   1 AS unchanged, 0 AS failed, CAST(10 AS BIGINT) AS rows_loaded,
+                   1.0 AS extract_seconds, 2.0 AS load_seconds, 0.5 AS finish_seconds, 4.0 AS wall_seconds
+            """
+        )
+        record_run(conn, _finished_run())
+        rows = conn.execute(
+            "SELECT kind, finished_at, rows_loaded, loaded FROM pipeline_runs WHERE locations = 3"
+        ).fetchall()
+        assert rows == [("scheduler", datetime(2024, 1, 1, 0, 0, 4), 10, 2)]
+        assert conn.execute("SELECT COUNT(*) FROM pipeline_runs").fetchone()[0] == 2
+        assert conn.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'pipeline_cycles'"
+        ).fetchone()[0] == 0
+
+    def test_complete_run_failure_does_not_raise(self, conn, tmp_path):
+        run = start_run("scheduler")
+        conn.close()
+        complete_run(conn, run, {"metrics": {"export_path": str(tmp_path)}}, status="failed")
+        assert run["status"] == "failed"
+        # The warehouse write failed, so the export after it is skipped too
+        assert os.listdir(tmp_path) == []
+
+
+class TestExport:
+    def test_prometheus_text(self):
+        text = render_metrics(_finished_run())
+        assert "# TYPE weather_etl_stage_wall_seconds gauge" in text
+        assert 'weather_etl_stage_downloaded_bytes{kind="pipeline",stage="extract",city="Cape Town"} 2048' in text
+        assert 'weather_etl_stage_rows_out{kind="pipeline",stage="backfill",city=""} 0' in text
+        assert 'weather_etl_run_rows_loaded{kind="pipeline"} 160' in text
+        assert 'weather_etl_run_success{kind="pipeline"} 1' in text
+        assert "# UNIT" not in text and "# EOF" not in text
+
+    def test_openmetrics(self):
+        text = render_metrics(_finished_run(), "openmetrics")
+        assert "# UNIT weather_etl_run_wall_seconds seconds" in text
+        assert text.endswith("# EOF\n")
+
+    def test_label_values_escaped(self):
+        run = start_run("pipeline")
+        with span(run, "load", 'Quote"d\\City'):
+            pass
+        assert 'city="Quote\\"d\\\\City"' in render_metrics(end_run(run))
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError, match="Unknown metrics format"):
+            render_metrics(_finished_run(), "json")
+
+    def test_file_replaced_per_kind(self, tmp_path):
+        path = export_metrics(_finished_run(), str(tmp_path))
+        export_metrics(_finished_run(), str(tmp_path))
+        assert os.path.basename(path) == "weather_etl_pipeline.prom"
+        assert sorted(os.listdir(tmp_path)) == ["weather_etl_pipeline.prom"]
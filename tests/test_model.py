@@ -0,0 +1,29 @@
+import torch
+
+from forecast.model import GlobalWeatherLSTM, WeatherLSTM
+
+
+class TestWeatherLSTM:
+    def test_output_shape(self):
+        model = WeatherLSTM(num_features=5, hidden_size=8, num_layers=2, horizon=6, num_targets=3)
+        assert model(torch.zeros(4, 12, 5)).shape == (4, 6, 3)
+
+
+class TestGlobalWeatherLSTM:
+    def test_output_shape(self):
+        model = GlobalWeatherLSTM(num_cities=3, hidden_size=8, num_layers=2, horizon=6, embedding_dim=4)
+        out = model(torch.zeros(5, 12, 3), torch.tensor([0, 1, 2, 1, 0]))
+        assert out.shape == (5, 6, 3)
+
+    def test_city_embedding_conditions_output(self):
+        torch.manual_seed(0)
+        model = GlobalWeatherLSTM(num_cities=2, hidden_size=8, num_layers=1, horizon=6).eval()
+        x = torch.rand(1, 12, 3).repeat(2, 1, 1)
+        with torch.no_grad():
+            out = model(x, torch.tensor([0, 1]))
+            # Same input, different city: only the embedding differs
+            assert not torch.allclose(out[0], out[1])
+            # Each row depends on its own index, not its position in the batch
+            swapped = model(x, torch.tensor([1, 0]))
+        torch.testing.assert_close(swapped[0], out[1])
+        torch.testing.assert_close(swapped[1], out[0])
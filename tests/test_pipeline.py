@@ -0,0 +1,67 @@
+import json
+
+import pipeline
+from pipeline import process_location
+
+
+def _raw_file(tmp_path, temperatures):
+    hours = len(temperatures)
+    payload = {
+        "latitude": -26.25,
+        "longitude": 28.0,
+        "generationtime_ms": 0.5,
+        "hourly": {
+            "time": [f"2024-01-01T{h:02d}:00" for h in range(hours)],
+            "temperature_2m": temperatures,
+            "relativehumidity_2m": [50.0] * hours,
+            "precipitation": [0.0] * hours,
+        },
+    }
+    path = tmp_path / "raw.json"
+    path.write_text(json.dumps(payload))
+    return str(path)
+
+
+def _config(tmp_path):
+    return {
+        "paths": {"processed_path": str(tmp_path / "processed")},
+        "dqc": {"severity": {"stale": "off"}},
+    }
+
+
+def _ledger_rows(conn):
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'payload_ledger'"
+    ).fetchone()[0]
+    return conn.execute("SELECT city, rows_loaded FROM payload_ledger").fetchall() if exists else []
+
+
+LOCATION = {"name": "Johannesburg", "latitude": -26.2, "longitude": 28.0}
+
+
+class TestProcessLocation:
+    def test_loaded_payload_is_fingerprinted(self, conn, tmp_path):
+        assert process_location(conn, _config(tmp_path), LOCATION, _raw_file(tmp_path, [20.0, 21.0])) == 2
+        assert _ledger_rows(conn) == [("Johannesburg", 2)]
+
+    def test_fully_quarantined_payload_not_fingerprinted(self, conn, tmp_path):
+        assert process_location(conn, _config(tmp_path), LOCATION, _raw_file(tmp_path, [None, None])) == 0
+        assert conn.execute("SELECT COUNT(*) FROM dq_quarantine").fetchone()[0] == 2
+        # Left out of the ledger so the next run retries it
+        assert _ledger_rows(conn) == []
+
+    def test_identical_payload_skipped_without_cache(self, conn, tmp_path, monkeypatch):
+        raw_file = _raw_file(tmp_path, [20.0, 21.0])
+        assert process_location(conn, _config(tmp_path), LOCATION, raw_file) == 2
+
+        calls = []
+        transform = pipeline.transform_and_validate
+        monkeypatch.setattr(
+            pipeline, "transform_and_validate", lambda **kwargs: calls.append(kwargs) or transform(**kwargs)
+        )
+        # No extract.cache_dir: the ledger fingerprint alone short-circuits the rerun
+        assert process_location(conn, _config(tmp_path), LOCATION, raw_file) == 0
+        assert calls == []
+
+        assert process_location(conn, _config(tmp_path), LOCATION, _raw_file(tmp_path, [20.0, 22.0])) == 1
+        assert len(calls) == 1
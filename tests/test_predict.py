@@ -0,0 +1,205 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+
+from etl.load import upsert_weather_data
+from forecast.predict import (
+    generate_forecasts,
+    latest_checkpoint_mtime,
+    lookback_window,
+    model_checkpoint_mtime,
+    save_forecast,
+)
+from forecast.model import GLOBAL_MODEL_DIR
+from forecast.train import train_global_model
+
+
+def _forecast_df(model_version="v1", hours=3):
+    return pd.DataFrame(
+        {
+            "timestamp": pd.date_range(datetime(2024, 1, 1), periods=hours, freq="h"),
+            "temperature_2m": [21.0] * hours,
+            "relativehumidity_2m": [50.0] * hours,
+            "precipitation": [0.0] * hours,
+            "city": "TestCity",
+            "horizon_hours": 24,
+            "model_version": model_version,
+            "forecast_timestamp": datetime(2023, 12, 31, 23),
+        }
+    )
+
+
+def _load_city(conn, city, rows=400, offset=0.0, latitude=-26.2):
+    hours = np.arange(rows)
+    upsert_weather_data(
+        conn,
+        pd.DataFrame(
+            {
+                "timestamp": pd.date_range(datetime(2024, 1, 1), periods=rows, freq="h"),
+                "temperature_2m": offset + 15 + 5 * np.sin(hours * 2 * np.pi / 24),
+                "relativehumidity_2m": 60 + 10 * np.cos(hours * 2 * np.pi / 24),
+                "precipitation": (hours % 5 == 0).astype(float),
+                "city": city,
+                "latitude": latitude,
+                "longitude": 28.0,
+                "load_date": datetime.now(timezone.utc).date(),
+            }
+        ),
+    )
+
+
+@pytest.fixture
+def global_model(conn, tmp_path, monkeypatch):
+    """A one-epoch global model over two cities with different ranges and end hours."""
+    monkeypatch.chdir(tmp_path)
+    _load_city(conn, "CityA")
+    _load_city(conn, "CityB", rows=410, offset=100.0, latitude=-33.9)
+    train_global_model(
+        ["CityA", "CityB"], conn,
+        lookback=24, horizon=6, epochs=1, hidden_size=8, num_layers=1, embedding_dim=4,
+    )
+    return conn
+
+
+def _hours(rows, skip=()):
+    return np.delete(pd.date_range(datetime(2024, 1, 1), periods=rows, freq="h").values, list(skip))
+
+
+class TestLookbackWindow:
+    def test_consecutive_hours_pass_through(self):
+        ts = _hours(10)
+        values = np.arange(20, dtype=np.float32).reshape(10, 2)
+        window_ts, window = lookback_window("TestCity", ts, values, 6)
+        np.testing.assert_array_equal(window_ts, ts[4:])
+        np.testing.assert_array_equal(window, values[4:])
+
+    def test_short_gap_interpolated(self):
+        ts = _hours(10, skip=[7])
+        values = (np.arange(10, dtype=np.float32) * 2).reshape(10, 1)[np.arange(10) != 7]
+        window_ts, window = lookback_window("TestCity", ts, values, 6, max_gap_hours=1)
+        np.testing.assert_array_equal(window_ts, _hours(10)[4:])
+        np.testing.assert_allclose(window[:, 0], [8, 10, 12, 14, 16, 18])
+
+    def test_gap_longer_than_training_fill_refused(self):
+        ts = _hours(12, skip=[8, 9])
+        values = np.zeros((len(ts), 3), dtype=np.float32)
+        with pytest.raises(ValueError, match="2-hour gap"):
+            lookback_window("TestCity", ts, values, 6, max_gap_hours=1)
+        with pytest.raises(ValueError, match="1-hour gap"):
+            lookback_window("TestCity", _hours(12, skip=[8]), np.zeros((11, 3)), 6)
+
+    def test_gap_before_window_ignored(self):
+        ts = _hours(12, skip=[2, 3])
+        window_ts, _ = lookback_window("TestCity", ts, np.zeros((10, 3)), 6)
+        assert len(window_ts) == 6
+
+    def test_duplicates_averaged(self):
+        ts = np.concatenate([_hours(6), _hours(6)[-1:]])
+        values = np.array([[0.0]] * 6 + [[2.0]], dtype=np.float32)
+        _, window = lookback_window("TestCity", ts, values, 6)
+        assert window[-1, 0] == 1.0
+
+    def test_too_few_hours(self):
+        with pytest.raises(ValueError, match="Need 6 hours of data, only have 4"):
+            lookback_window("TestCity", _hours(4), np.zeros((4, 3)), 6)
+
+
+class TestGenerateForecasts:
+    def test_one_row_per_city_and_lead(self, global_model):
+        forecast = generate_forecasts(["CityA", "CityB"], global_model, horizon=6)
+        assert len(forecast) == 12
+        for city, last_hour in [("CityA", 399), ("CityB", 409)]:
+            rows = forecast[forecast["city"] == city]
+            issued = pd.Timestamp(datetime(2024, 1, 1)) + pd.Timedelta(hours=last_hour)
+            assert (rows["forecast_timestamp"] == issued).all()
+            assert list(rows["timestamp"]) == list(pd.date_range(issued, periods=7, freq="h")[1:])
+
+    def test_cities_keep_their_own_embedding_and_scale(self, global_model):
+        batched = generate_forecasts(["CityB", "CityA"], global_model, horizon=6)
+        for city in ("CityA", "CityB"):
+            alone = generate_forecasts([city], global_model, horizon=6)
+            np.testing.assert_allclose(
+                batched.loc[batched["city"] == city, "temperature_2m"].to_numpy(),
+                alone["temperature_2m"].to_numpy(),
+                rtol=1e-5,
+            )
+        # Unscaled with CityB's range, not CityA's
+        means = batched.groupby("city")["temperature_2m"].mean()
+        assert means["CityB"] > means["CityA"] + 50
+
+    def test_city_with_gap_in_lookback_skipped(self, global_model):
+        global_model.execute(
+            "DELETE FROM weather_hourly_facts WHERE timestamp = TIMESTAMP '2024-01-17 10:00:00' "
+            "AND location_id = (SELECT location_id FROM locations WHERE city = 'CityA')"
+        )
+        forecast = generate_forecasts(["CityA", "CityB"], global_model, horizon=6)
+        assert set(forecast["city"]) == {"CityB"}
+        with pytest.raises(ValueError, match="Not enough recent data"):
+            generate_forecasts(["CityA"], global_model, horizon=6)
+
+    def test_unknown_city(self, global_model):
+        with pytest.raises(ValueError, match="Not part of the global model"):
+            generate_forecasts(["Elsewhere"], global_model, horizon=6)
+
+
+class TestModelCheckpointMtime:
+    def _touch(self, directory, mtime_ns):
+        directory.mkdir(parents=True)
+        path = directory / "lstm_24h.pt"
+        path.write_bytes(b"")
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_city_model_preferred_over_global(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        self._touch(tmp_path / "models" / GLOBAL_MODEL_DIR, 1_000)
+        assert model_checkpoint_mtime("Cape Town", 24) == 1_000
+        self._touch(tmp_path / "models" / "cape_town", 2_000)
+        assert model_checkpoint_mtime("Cape Town", 24) == 2_000
+
+    def test_no_model(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        assert model_checkpoint_mtime("Cape Town", 24) is None
+        assert latest_checkpoint_mtime() is None
+
+    def test_latest_covers_every_model(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        self._touch(tmp_path / "models" / "cape_town", 2_000)
+        self._touch(tmp_path / "models" / GLOBAL_MODEL_DIR, 1_000)
+        assert latest_checkpoint_mtime() == 2_000
+
+
+class TestSaveForecast:
+    def test_reissue_is_not_stored_twice(self, conn):
+        assert save_forecast(conn, _forecast_df()) == 3
+        assert save_forecast(conn, _forecast_df()) == 0
+        assert conn.execute("SELECT COUNT(*) FROM weather_forecasts").fetchone()[0] == 3
+
+    def test_each_model_version_kept(self, conn):
+        save_forecast(conn, _forecast_df("v1"))
+        save_forecast(conn, _forecast_df("v2"))
+        assert conn.execute("SELECT COUNT(*) FROM weather_forecasts").fetchone()[0] == 6
+
+    def test_reissue_verified_once(self, conn):
+        save_forecast(conn, _forecast_df())
+        save_forecast(conn, _forecast_df())
+        upsert_weather_data(
+            conn,
+            pd.DataFrame(
+                {
+                    "timestamp": pd.date_range(datetime(2024, 1, 1), periods=3, freq="h"),
+                    "temperature_2m": [20.0] * 3,
+                    "relativehumidity_2m": [50.0] * 3,
+                    "precipitation": [0.0] * 3,
+                    "city": "TestCity",
+                    "latitude": -26.2,
+                    "longitude": 28.0,
+                    "load_date": datetime.now(timezone.utc).date(),
+                }
+            ),
+        )
+        assert conn.execute("SELECT SUM(n) FROM forecast_skill").fetchone()[0] == 3
+
+    def test_empty_forecast(self, conn):
+        assert save_forecast(conn, _forecast_df().iloc[:0]) == 0
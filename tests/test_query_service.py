@@ -0,0 +1,127 @@
+import threading
+from datetime import datetime
+
+import duckdb
+import numpy as np
+import pytest
+
+from etl import query_service
+from etl.query_service import QueryService, RemoteConnection, create_server
+from etl.snapshot import publish_snapshot
+
+
+@pytest.fixture
+def service(writer, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshots")
+    publish_snapshot(writer, snapshot_dir)
+    return QueryService(snapshot_dir, pool_size=2)
+
+
+@pytest.fixture
+def remote(service):
+    server = create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    conn = RemoteConnection(f"http://127.0.0.1:{server.server_address[1]}")
+    yield conn
+    conn.close()
+    server.shutdown()
+    server.server_close()
+
+
+class TestQueryService:
+    def test_repeated_query_is_cached(self, service):
+        sql = "SELECT COUNT(*) AS n FROM weather_hourly WHERE city = ?"
+        service.execute(sql, ["A"])
+        version, table = service.execute(sql, ["A"])
+        assert version == 1
+        assert table.column("n").to_pylist() == [3]
+        assert (service.hits, service.misses) == (1, 1)
+
+    def test_new_snapshot_invalidates_cache(self, service, writer):
+        sql = "SELECT COUNT(*) AS n FROM weather_hourly"
+        service.execute(sql)
+        writer.execute("INSERT INTO weather_hourly VALUES ('B', TIMESTAMP '2024-01-01', 1.0)")
+        publish_snapshot(writer, service.snapshot_dir, force=True)
+
+        version, table = service.execute(sql)
+        assert version == 2
+        assert table.column("n").to_pylist() == [4]
+        assert service.misses == 2
+
+    def test_pointer_read_only_when_changed(self, service, writer, monkeypatch):
+        service.execute("SELECT 1 AS x")
+        reads = []
+        original = query_service.read_current_snapshot
+        monkeypatch.setattr(
+            query_service, "read_current_snapshot", lambda path: reads.append(path) or original(path)
+        )
+        service.execute("SELECT 2 AS x")
+        assert reads == []
+
+        publish_snapshot(writer, service.snapshot_dir, force=True)
+        assert service.current_version() == 2
+        assert len(reads) == 1
+
+    def test_replaced_connection_closed_when_idle(self, service, writer):
+        service.execute("SELECT 1 AS x")
+        previous = service._snapshot
+        publish_snapshot(writer, service.snapshot_dir, force=True)
+        service.execute("SELECT 1 AS x")
+        with pytest.raises(duckdb.ConnectionException):
+            previous.conn.execute("SELECT 1")
+
+    def test_replaced_connection_waits_for_readers(self, service, writer):
+        service.execute("SELECT 1 AS x")
+        previous = service._snapshot
+        previous.readers += 1  # a query still running on the old snapshot
+        publish_snapshot(writer, service.snapshot_dir, force=True)
+        service.execute("SELECT 1 AS x")
+        assert previous.conn.execute("SELECT COUNT(*) FROM weather_hourly").fetchone()[0] == 3
+
+        service._release(previous)
+        with pytest.raises(duckdb.ConnectionException):
+            previous.conn.execute("SELECT 1")
+
+    def test_cache_is_bounded(self, service):
+        service.cache_max_entries = 2
+        for i in range(3):
+            service.execute(f"SELECT {i} AS x")
+        assert len(service._cache) == 2
+
+
+class TestRemoteConnection:
+    def test_fetch_methods_match_duckdb(self, remote):
+        sql = "SELECT timestamp, temperature_2m FROM weather_hourly WHERE city = ? AND timestamp >= ? ORDER BY timestamp"
+        params = ["A", datetime(2024, 1, 1)]
+
+        assert remote.execute(sql, params).fetchone()[1] == 20.0
+        assert len(remote.execute(sql, params).fetchall()) == 3
+        assert remote.execute(sql, params).fetchdf()["temperature_2m"].isna().sum() == 1
+
+        cols = remote.execute(sql, params).fetchnumpy()
+        filled = np.ma.filled(np.ma.asarray(cols["temperature_2m"], dtype=np.float32), np.nan)
+        assert np.isnan(filled[1]) and filled[2] == 22.0
+        assert remote.version == 1
+
+    def test_errors_are_raised(self, remote):
+        with pytest.raises(Exception, match="400"):
+            remote.execute("SELECT * FROM missing_table")
+
+    def test_external_access_is_rejected(self, remote, tmp_path):
+        csv = tmp_path / "secret.csv"
+        csv.write_text("a\n1\n")
+        for sql in (
+            f"SELECT * FROM read_csv('{csv}')",
+            f"COPY weather_hourly TO '{tmp_path / 'out.csv'}'",
+            f"ATTACH '{tmp_path / 'other.duckdb'}' AS other",
+            "SET enable_external_access = true",
+        ):
+            with pytest.raises(Exception, match="400"):
+                remote.execute(sql)
+        assert not (tmp_path / "out.csv").exists()
+
+    def test_writes_are_rejected(self, remote):
+        with pytest.raises(Exception, match="400"):
+            remote.execute("DELETE FROM weather_hourly")
+        assert remote.execute("SELECT COUNT(*) FROM weather_hourly").fetchone()[0] == 3
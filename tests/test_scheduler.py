@@ -0,0 +1,97 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+import scheduler
+from etl.metrics import complete_run, start_run
+from scheduler import run_cycle, stagger_offsets
+
+
+def _locations(n):
+    return [{"name": f"City{i}", "latitude": float(i), "longitude": 0.0} for i in range(n)]
+
+
+def _run(conn, locations, monkeypatch, results, loaded_rows=5, queue_size=2, run=None, backfill=True):
+    processed = []
+    finished = []
+
+    async def fake_extract(location, raw_path, *args, **kwargs):
+        result = results[location["name"]]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def fake_process(conn, config, location, raw_file, run=None):
+        processed.append(location["name"])
+        return loaded_rows if isinstance(raw_file, str) else 0
+
+    monkeypatch.setattr(scheduler, "extract_location_async", fake_extract)
+    monkeypatch.setattr(scheduler, "process_location", fake_process)
+    def fake_finish(conn, config, locations, run=None, changed=True, backfill=True):
+        finished.append((changed, backfill))
+        return changed
+
+    monkeypatch.setattr(scheduler, "finish_run", fake_finish)
+
+    async def cycle():
+        with ThreadPoolExecutor(1) as fetch_pool, ThreadPoolExecutor(1) as load_pool:
+            return await run_cycle(
+                conn, {"paths": {"raw_path": "unused"}}, locations, None,
+                asyncio.Semaphore(2), fetch_pool, load_pool, 0, queue_size, run, backfill,
+            )
+
+    stats = asyncio.run(cycle())
+    assert len(finished) == 1
+    stats["finished"] = finished[0]
+    return stats, processed
+
+
+class TestStaggerOffsets:
+    def test_spreads_evenly_over_cycle(self):
+        assert stagger_offsets(4, 3600) == [0, 900, 1800, 2700]
+
+    def test_no_locations(self):
+        assert stagger_offsets(0, 3600) == []
+
+
+class TestRunCycle:
+    def test_counts_outcomes(self, conn, monkeypatch):
+        locations = _locations(3)
+        results = {"City0": "raw0.json", "City1": None, "City2": RuntimeError("boom")}
+        stats, processed = _run(conn, locations, monkeypatch, results)
+
+        assert sorted(processed) == ["City0", "City1", "City2"]
+        assert (stats["loaded"], stats["unchanged"], stats["failed"]) == (1, 1, 1)
+        assert stats["rows_loaded"] == 5
+
+    def test_more_locations_than_queue_slots(self, conn, monkeypatch):
+        locations = _locations(10)
+        results = {loc["name"]: f"{loc['name']}.json" for loc in locations}
+        stats, processed = _run(conn, locations, monkeypatch, results, queue_size=1)
+        assert len(processed) == 10
+        assert stats["rows_loaded"] == 50
+
+    def test_finish_steps_follow_loaded_rows(self, conn, monkeypatch):
+        stats, _ = _run(conn, _locations(2), monkeypatch, {"City0": "a.json", "City1": None}, backfill=False)
+        assert stats["finished"] == (True, False)
+        assert stats["changed"]
+
+        stats, _ = _run(conn, _locations(2), monkeypatch, {"City0": None, "City1": None})
+        assert stats["finished"] == (False, True)
+        assert not stats["changed"]
+
+    def test_cycle_counts_recorded_with_run(self, conn, monkeypatch):
+        run = start_run("scheduler")
+        _run(conn, _locations(3), monkeypatch, {"City0": "a.json", "City1": "b.json", "City2": None}, run=run)
+        complete_run(conn, run, {})
+        row = conn.execute("SELECT kind, locations, loaded, unchanged, failed FROM pipeline_runs").fetchone()
+        assert row == ("scheduler", 3, 2, 1, 0)
+
+    def test_extract_spans_recorded(self, conn, monkeypatch):
+        run = start_run("scheduler")
+        results = {"City0": "a.json", "City1": RuntimeError("boom")}
+        _run(conn, _locations(2), monkeypatch, results, run=run)
+        spans = {s["city"]: s for s in run["spans"]}
+        assert [spans[c]["stage"] for c in ("City0", "City1")] == ["extract", "extract"]
+        assert (spans["City0"]["status"], spans["City1"]["status"]) == ("ok", "failed")
+        assert spans["City1"]["error"] == "RuntimeError: boom"
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from etl.load import bump_data_versions
+from etl.snapshot import (
+    open_current_snapshot,
+    prune_snapshots,
+    publish_snapshot,
+    read_current_snapshot,
+)
+
+
+class TestPublishSnapshot:
+    def test_nothing_published(self, tmp_path):
+        assert read_current_snapshot(str(tmp_path / "snapshots")) is None
+        with pytest.raises(FileNotFoundError):
+            open_current_snapshot(str(tmp_path / "snapshots"))
+
+    def test_readable_while_writer_open(self, writer, tmp_path):
+        snapshot_dir = str(tmp_path / "snapshots")
+        entry = publish_snapshot(writer, snapshot_dir)
+        assert entry["version"] == 1
+
+        reader, version = open_current_snapshot(snapshot_dir)
+        assert version == 1
+        assert reader.execute("SELECT COUNT(*) FROM weather_hourly").fetchone()[0] == 3
+        reader.close()
+
+    def test_new_version_sees_new_rows(self, writer, tmp_path):
+        snapshot_dir = str(tmp_path / "snapshots")
+        publish_snapshot(writer, snapshot_dir)
+        old_reader, _ = open_current_snapshot(snapshot_dir)
+
+        writer.execute("INSERT INTO weather_hourly VALUES ('B', TIMESTAMP '2024-01-01', 1.0)")
+        bump_data_versions(writer, "(SELECT 'TestCity' AS city)")
+        publish_snapshot(writer, snapshot_dir)
+        new_reader, version = open_current_snapshot(snapshot_dir)
+
+        assert version == 2
+        assert new_reader.execute("SELECT COUNT(*) FROM weather_hourly").fetchone()[0] == 4
+        # A reader still on the previous snapshot is unaffected
+        assert old_reader.execute("SELECT COUNT(*) FROM weather_hourly").fetchone()[0] == 3
+        old_reader.close()
+        new_reader.close()
+
+    def test_keeps_newest_snapshots(self, writer, tmp_path):
+        snapshot_dir = str(tmp_path / "snapshots")
+        for _ in range(4):
+            publish_snapshot(writer, snapshot_dir, keep=2, force=True)
+        files = sorted(f for f in os.listdir(snapshot_dir) if f.endswith(".duckdb"))
+        assert files == ["weather-000003.duckdb", "weather-000004.duckdb"]
+        assert prune_snapshots(snapshot_dir, keep=2) == 0
+
+    def test_unchanged_data_is_not_republished(self, writer, tmp_path):
+        snapshot_dir = str(tmp_path / "snapshots")
+        bump_data_versions(writer, "(SELECT 'TestCity' AS city)")
+        assert publish_snapshot(writer, snapshot_dir)["data_stamp"] == 1
+        assert publish_snapshot(writer, snapshot_dir) is None
+        assert read_current_snapshot(snapshot_dir)["version"] == 1
+
+        bump_data_versions(writer, "(SELECT 'TestCity' AS city)")
+        assert publish_snapshot(writer, snapshot_dir)["version"] == 2
+
+    def test_quote_in_snapshot_path(self, writer, tmp_path):
+        snapshot_dir = str(tmp_path / "it's snapshots")
+        publish_snapshot(writer, snapshot_dir)
+        reader, version = open_current_snapshot(snapshot_dir)
+        assert reader.execute("SELECT COUNT(*) FROM weather_hourly").fetchone()[0] == 3
+        reader.close()
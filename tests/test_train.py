@@ -0,0 +1,100 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+from datetime import datetime, timezone
+
+from etl.load import upsert_weather_data
+from forecast.model import GLOBAL_MODEL_DIR
+from forecast.train import train_global_model, train_model
+
+
+def _load_city(conn, city, rows=400, offset=0.0, latitude=-26.2):
+    hours = np.arange(rows)
+    upsert_weather_data(
+        conn,
+        pd.DataFrame(
+            {
+                "timestamp": pd.date_range(datetime(2024, 1, 1), periods=rows, freq="h"),
+                "temperature_2m": offset + 15 + 5 * np.sin(hours * 2 * np.pi / 24),
+                "relativehumidity_2m": 60 + 10 * np.cos(hours * 2 * np.pi / 24),
+                "precipitation": (hours % 5 == 0).astype(float),
+                "city": city,
+                "latitude": latitude,
+                "longitude": 28.0,
+                "load_date": datetime.now(timezone.utc).date(),
+            }
+        ),
+    )
+
+
+class TestTrainModel:
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_scaling_fitted_on_training_split(self, conn, tmp_path, monkeypatch, streaming):
+        monkeypatch.chdir(tmp_path)
+        _load_city(conn, "CityA", rows=230)
+        # A warm spell after the training split must not widen its range
+        upsert_weather_data(
+            conn,
+            pd.DataFrame(
+                {
+                    "timestamp": pd.date_range(datetime(2024, 1, 10, 14), periods=70, freq="h"),
+                    "temperature_2m": 40.0,
+                    "relativehumidity_2m": 60.0,
+                    "precipitation": 0.0,
+                    "city": "CityA",
+                    "latitude": -26.2,
+                    "longitude": 28.0,
+                    "load_date": datetime.now(timezone.utc).date(),
+                }
+            ),
+        )
+        assert conn.execute("SELECT max_value FROM feature_stats WHERE feature = 'temperature_2m'").fetchone()[0] == 40.0
+
+        save_dir = train_model(
+            "CityA", conn, lookback=24, horizon=6, epochs=1,
+            hidden_size=8, num_layers=1, streaming=streaming,
+        )
+
+        meta = torch.load(os.path.join(save_dir, "meta_24h.pt"), weights_only=True)
+        assert meta["scale_max"][0] == pytest.approx(20.0, abs=0.01)
+        recorded = conn.execute(
+            "SELECT max_value FROM model_scaling WHERE model_version = ? AND feature = 'temperature_2m'",
+            [meta["model_version"]],
+        ).fetchone()[0]
+        assert recorded == pytest.approx(meta["scale_max"][0])
+
+
+class TestTrainGlobalModel:
+    def test_one_epoch_smoke(self, conn, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        _load_city(conn, "CityA")
+        _load_city(conn, "CityB", offset=100.0, latitude=-33.9)
+        _load_city(conn, "Tiny", rows=50, latitude=-29.0)
+
+        save_dir = train_global_model(
+            ["CityA", "Tiny", "CityB"], conn,
+            lookback=24, horizon=6, epochs=1, hidden_size=8, num_layers=1, embedding_dim=4,
+        )
+
+        assert save_dir == os.path.join("models", GLOBAL_MODEL_DIR)
+        meta = torch.load(os.path.join(save_dir, "meta_24h.pt"), weights_only=True)
+        # Cities too short to train are skipped; indices follow the kept order
+        assert meta["cities"] == ["CityA", "CityB"]
+        assert set(meta["scale_min"]) == set(meta["fit_end"]) == {"CityA", "CityB"}
+        assert meta["scale_min"]["CityB"][0] > meta["scale_max"]["CityA"][0]
+        recorded = conn.execute(
+            "SELECT DISTINCT city FROM model_scaling WHERE model_version = ? ORDER BY city",
+            [meta["model_version"]],
+        ).fetchall()
+        assert recorded == [("CityA",), ("CityB",)]
+
+        state = torch.load(os.path.join(save_dir, "lstm_24h.pt"), weights_only=True)
+        assert state["city_embedding.weight"].shape == (2, 4)
+
+    def test_no_city_with_enough_data(self, conn, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        _load_city(conn, "Tiny", rows=50)
+        with pytest.raises(ValueError, match="No city has enough data"):
+            train_global_model(["Tiny"], conn, lookback=24, horizon=6, epochs=1)
@@ -2,7 +2,8 @@ import pytest
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 
-from etl.transform import transform_weather_data
+from etl.transform import transform_and_validate, transform_weather_data
+from etl.variables import DEFAULT_VARIABLES, load_variables
 
 
 def _make_raw_json(hours=168, temp_range=(10, 30), humidity_range=(40, 80)):
@@ -41,6 +42,25 @@ class TestTransformStructureValidation:
             transform_weather_data(raw, 0.0, 0.0, "Test")
 
 
+class TestTransformVariables:
+    def test_configured_variable_is_required_and_checked(self):
+        variables = load_variables(
+            {"variables": DEFAULT_VARIABLES + [{"name": "windspeed_10m", "label": "Wind speed", "min": 0}]}
+        )
+        raw = _make_raw_json()
+        with pytest.raises(ValueError, match="Missing required field: windspeed_10m"):
+            transform_weather_data(raw, 0.0, 0.0, "Test", variables=variables)
+
+        raw["hourly"]["windspeed_10m"] = [3.0] * 168
+        df = transform_weather_data(raw, 0.0, 0.0, "Test", variables=variables)
+        assert (df["windspeed_10m"] == 3.0).all()
+
+        raw["hourly"]["windspeed_10m"][5] = -1.0
+        valid, quarantined, _ = transform_and_validate(raw, 0.0, 0.0, "Test", variables=variables)
+        assert len(valid) == 167
+        assert quarantined["reasons"].tolist() == [["out_of_range:windspeed_10m"]]
+
+
 class TestTransformDQC:
     def test_valid_data_passes(self):
         raw = _make_raw_json()
@@ -63,29 +83,57 @@ class TestTransformDQC:
         )
         assert len(df) == 48
 
-    def test_temperature_out_of_range_fails(self):
+    def test_temperature_out_of_range_quarantines_row(self):
         raw = _make_raw_json()
         raw["hourly"]["temperature_2m"][0] = 100.0
-        with pytest.raises(ValueError, match="Temperature"):
-            transform_weather_data(raw, 0.0, 0.0, "Test")
+        valid, quarantined, _ = transform_and_validate(raw, 0.0, 0.0, "Test")
+        assert len(valid) == 167
+        assert quarantined["temperature_2m"].tolist() == [100.0]
+        assert quarantined["reasons"].tolist() == [["out_of_range:temperature_2m"]]
 
-    def test_humidity_out_of_range_fails(self):
+    def test_humidity_out_of_range_quarantines_row(self):
         raw = _make_raw_json()
         raw["hourly"]["relativehumidity_2m"][0] = -5.0
-        with pytest.raises(ValueError, match="Humidity"):
-            transform_weather_data(raw, 0.0, 0.0, "Test")
+        valid, quarantined, _ = transform_and_validate(raw, 0.0, 0.0, "Test")
+        assert len(valid) == 167
+        assert quarantined["reasons"].tolist() == [["out_of_range:relativehumidity_2m"]]
 
-    def test_negative_precipitation_fails(self):
+    def test_negative_precipitation_quarantines_row(self):
         raw = _make_raw_json()
         raw["hourly"]["precipitation"][0] = -1.0
-        with pytest.raises(ValueError, match="Negative precipitation"):
-            transform_weather_data(raw, 0.0, 0.0, "Test")
+        assert len(transform_weather_data(raw, 0.0, 0.0, "Test")) == 167
 
-    def test_duplicate_timestamps_fail(self):
+    def test_duplicate_timestamps_keep_first(self):
         raw = _make_raw_json()
         raw["hourly"]["time"][1] = raw["hourly"]["time"][0]
-        with pytest.raises(ValueError, match="Duplicate timestamps"):
-            transform_weather_data(raw, 0.0, 0.0, "Test")
+        valid, quarantined, metrics = transform_and_validate(raw, 0.0, 0.0, "Test")
+        assert len(valid) == 167
+        assert valid["timestamp"].is_unique
+        assert "duplicate_timestamp" in quarantined["reasons"].iloc[0]
+        # The lost hour is only counted
+        counts = dict(zip(metrics["rule"], metrics["rows_failed"]))
+        assert counts["too_few_hours"] == 168
+        assert counts["hour_gap"] == 1
+
+    def test_stale_batch_quarantined(self):
+        raw = _make_raw_json()
+        raw["hourly"]["time"] = [
+            (datetime(2024, 1, 1) + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(168)
+        ]
+        valid, quarantined, _ = transform_and_validate(raw, 0.0, 0.0, "Test")
+        assert valid.empty
+        assert len(quarantined) == 168
+        assert all(reasons == ["stale"] for reasons in quarantined["reasons"])
+
+    def test_severity_override(self):
+        raw = _make_raw_json()
+        raw["hourly"]["temperature_2m"][0] = 100.0
+        valid, quarantined, metrics = transform_and_validate(
+            raw, 0.0, 0.0, "Test", severity={"out_of_range": "warn"}
+        )
+        assert len(valid) == 168 and quarantined.empty
+        row = metrics[metrics["rule"] == "out_of_range:temperature_2m"].iloc[0]
+        assert (row["severity"], row["rows_failed"]) == ("warn", 1)
 
     def test_historical_skips_freshness(self):
         raw = _make_raw_json(hours=720)
@@ -0,0 +1,73 @@
+import threading
+import duckdb
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+
+from etl.load import upsert_weather_data
+from forecast.tune import _should_prune, sample_trials, search_hyperparameters
+
+
+class TestSampleTrials:
+    def test_distinct_configs(self):
+        space = {"a": [1, 2], "b": [3, 4, 5]}
+        trials = sample_trials(space, n_trials=4, seed=1)
+        assert len(trials) == 4
+        assert len({(t["a"], t["b"]) for t in trials}) == 4
+
+    def test_capped_at_grid_size(self):
+        trials = sample_trials({"a": [1, 2], "b": [3]}, n_trials=10)
+        assert len(trials) == 2
+
+
+class TestMedianPruning:
+    def test_prunes_worse_than_median(self):
+        reports, lock = {}, threading.Lock()
+        reports[(0, 3)] = 0.1
+        reports[(1, 3)] = 0.2
+        assert _should_prune(reports, lock, 2, 3, 0.5, warmup_epochs=3, min_peers=2)
+        assert not _should_prune(reports, lock, 3, 3, 0.05, warmup_epochs=3, min_peers=2)
+
+    def test_no_pruning_during_warmup_or_without_peers(self):
+        reports, lock = {(0, 1): 0.1, (1, 1): 0.1}, threading.Lock()
+        assert not _should_prune(reports, lock, 2, 1, 9.0, warmup_epochs=3, min_peers=2)
+        assert not _should_prune({}, lock, 0, 5, 9.0, warmup_epochs=3, min_peers=2)
+
+
+class TestSearchHyperparameters:
+    def test_tiny_search_end_to_end(self):
+        conn = duckdb.connect(":memory:")
+        hours = np.arange(300)
+        upsert_weather_data(
+            conn,
+            pd.DataFrame(
+                {
+                    "timestamp": pd.date_range(datetime(2024, 1, 1), periods=len(hours), freq="h"),
+                    "temperature_2m": 15 + 5 * np.sin(hours * 2 * np.pi / 24),
+                    "relativehumidity_2m": 60 + 10 * np.cos(hours * 2 * np.pi / 24),
+                    "precipitation": (hours % 5 == 0).astype(float),
+                    "city": "TestCity",
+                    "latitude": -26.2,
+                    "longitude": 28.0,
+                    "load_date": datetime.now(timezone.utc).date(),
+                }
+            ),
+        )
+
+        result = search_hyperparameters(
+            "TestCity",
+            conn,
+            horizon=6,
+            lookbacks=[12, 24],
+            space={"hidden_size": [4], "num_layers": [1], "dropout": [0.0], "lr": [0.01]},
+            n_trials=2,
+            max_workers=2,
+            epochs=2,
+            batch_size=64,
+        )
+        conn.close()
+
+        assert result["trials"] == 2
+        assert result["lookback"] in (12, 24)
+        assert result["hidden_size"] == 4
+        assert np.isfinite(result["best_val_loss"])
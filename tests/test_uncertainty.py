@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast.backtest import create_backtest_table
+from forecast.uncertainty import apply_intervals, compute_interval_table, load_intervals
+
+
+def _forecast(hours=3):
+    return pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2024-01-01", periods=hours, freq="h"),
+            "temperature_2m": [20.0] * hours,
+            "relativehumidity_2m": [99.0] * hours,
+            "precipitation": [0.5] * hours,
+        }
+    )
+
+
+class TestComputeIntervals:
+    def test_quantiles_per_lead(self, conn):
+        create_backtest_table(conn)
+        # Lead 1 residuals are 0..99, lead 2 residuals are 0..198
+        conn.execute(
+            """
+            INSERT INTO forecast_backtests
+            SELECT 'A', 24, NULL, NULL, lead,
+                   0.0, 0.0, 0.0,
+                   i * lead, i * lead, i * lead,
+                   NULL
+            FROM range(100) r(i), (VALUES (1), (2)) l(lead)
+            """
+        )
+        assert compute_interval_table(conn, lower=0.1, upper=0.9) == 6
+        intervals = load_intervals(conn, "A", 24)
+        temp = intervals[intervals["feature"] == "temperature_2m"].set_index("lead_hours")
+        assert temp.loc[1, "q_lower"] == pytest.approx(9.9)
+        assert temp.loc[2, "q_upper"] == pytest.approx(178.2)
+
+    def test_sparse_leads_skipped(self, conn):
+        create_backtest_table(conn)
+        conn.execute(
+            """
+            INSERT INTO forecast_backtests
+            SELECT 'A', 24, NULL, NULL, 1, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0, NULL
+            FROM range(5)
+            """
+        )
+        assert compute_interval_table(conn, min_samples=20) == 0
+
+    def test_missing_table_returns_empty(self, conn):
+        assert load_intervals(conn, "A", 24).empty
+
+
+class TestApplyIntervals:
+    def test_adds_bounds_and_clips(self):
+        intervals = pd.DataFrame(
+            {
+                "lead_hours": [1, 2, 1, 2, 1, 2],
+                "feature": ["temperature_2m"] * 2
+                + ["relativehumidity_2m"] * 2
+                + ["precipitation"] * 2,
+                "q_lower": [-1.0, -2.0, -5.0, -5.0, -1.0, -1.0],
+                "q_upper": [1.0, 2.0, 5.0, 5.0, 1.0, 1.0],
+            }
+        )
+        out = apply_intervals(_forecast(), intervals)
+        np.testing.assert_allclose(out["temperature_2m_lower"][:2], [19.0, 18.0])
+        assert out["relativehumidity_2m_upper"].iloc[0] == 100
+        assert out["precipitation_lower"].iloc[0] == 0
+        # No quantiles for lead 3
+        assert np.isnan(out["temperature_2m_upper"].iloc[2])
+
+    def test_no_intervals_leaves_forecast_unchanged(self):
+        df = _forecast()
+        out = apply_intervals(df, pd.DataFrame(columns=["lead_hours", "feature", "q_lower", "q_upper"]))
+        assert list(out.columns) == list(df.columns)
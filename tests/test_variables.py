@@ -0,0 +1,97 @@
+import pytest
+import yaml
+import pandas as pd
+
+from etl.extract import build_weather_url
+from etl.load import create_weather_table
+from etl.variables import (
+    DEFAULT_VARIABLES,
+    add_variable_columns,
+    configured_variables,
+    load_variables,
+    range_violations,
+    table_columns,
+    variable_label,
+    variable_names,
+)
+
+WIND = {"name": "windspeed_10m", "label": "Wind speed", "unit": "km/h", "min": 0, "max": 500}
+
+
+class TestRegistry:
+    def test_defaults_without_config(self):
+        assert variable_names(load_variables()) == [v["name"] for v in DEFAULT_VARIABLES]
+        assert load_variables({"settings": {}}) == load_variables()
+
+    def test_configured_variables_in_order(self):
+        variables = load_variables({"variables": DEFAULT_VARIABLES + [WIND]})
+        assert variable_names(variables)[-1] == "windspeed_10m"
+        assert variables[-1]["max"] == 500
+
+    def test_rejects_unsafe_name(self):
+        with pytest.raises(ValueError, match="Invalid variable name"):
+            load_variables({"variables": DEFAULT_VARIABLES + [{"name": "x; DROP TABLE t"}]})
+
+    def test_rejects_duplicate(self):
+        with pytest.raises(ValueError, match="more than once"):
+            load_variables({"variables": DEFAULT_VARIABLES + [DEFAULT_VARIABLES[0]]})
+
+    def test_forecast_features_required(self):
+        with pytest.raises(ValueError, match="precipitation"):
+            load_variables({"variables": DEFAULT_VARIABLES[:2]})
+
+    def test_label(self):
+        assert variable_label(DEFAULT_VARIABLES, "relativehumidity_2m") == "Humidity (%)"
+        assert variable_label(DEFAULT_VARIABLES, "unknown") == "unknown"
+
+    def test_request_lists_every_variable(self):
+        variables = load_variables({"variables": DEFAULT_VARIABLES + [WIND]})
+        url = build_weather_url(1.0, 2.0, variable_names(variables))
+        assert url.endswith("&hourly=temperature_2m,relativehumidity_2m,precipitation,windspeed_10m")
+
+
+class TestConfiguredDefaults:
+    @pytest.fixture
+    def configured(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "config.yaml").write_text(yaml.safe_dump({"variables": DEFAULT_VARIABLES + [WIND]}))
+
+    def test_defaults_without_config_file(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        assert configured_variables() == load_variables()
+
+    def test_request_defaults_to_configured_variables(self, configured):
+        assert build_weather_url(1.0, 2.0).endswith(",precipitation,windspeed_10m")
+
+    def test_table_defaults_to_configured_variables(self, configured, conn):
+        create_weather_table(conn)
+        assert "windspeed_10m" in table_columns(conn, "weather_hourly_facts")
+
+
+class TestRangeViolations:
+    def test_flags_values_outside_bounds(self):
+        variables = load_variables()
+        df = pd.DataFrame(
+            {
+                "temperature_2m": [20.0, 70.0, None],
+                "relativehumidity_2m": [50.0, 50.0, 101.0],
+                "precipitation": [-0.1, 1e6, 0.0],
+            }
+        )
+        violations = range_violations(df, variables)
+        assert violations.to_numpy().tolist() == [
+            [False, False, True],
+            [True, False, False],
+            [False, True, False],
+        ]
+
+
+class TestSchemaEvolution:
+    def test_adds_only_missing_columns(self, conn):
+        conn.execute("CREATE TABLE t (timestamp TIMESTAMP, temperature_2m DOUBLE, retired DOUBLE)")
+        added = add_variable_columns(conn, "t", load_variables())
+        assert added == ["relativehumidity_2m", "precipitation"]
+        assert table_columns(conn, "t") == [
+            "timestamp", "temperature_2m", "retired", "relativehumidity_2m", "precipitation"
+        ]
+        assert add_variable_columns(conn, "t", load_variables()) == []
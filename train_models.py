@@ -2,59 +2,101 @@
 
 Usage:
     python train_models.py
+    python train_models.py --search
+    python train_models.py --global
+
+With --search, each city/horizon first runs a parallel hyperparameter search
+(settings under `model.search` in config.yaml) and trains the final model
+with the winning configuration, which is recorded in the model's meta.
+With --global (or `model.mode: global`), one city-embedding model per horizon
+is trained on all cities and saved under models/global/.
 """
 
+import argparse
 from datetime import datetime, timezone
 
 from etl.config import load_config
-from etl.load import connect_duckdb, create_weather_table
+from etl.feature_engineering import create_feature_table
+from etl.feature_store import create_feature_store
+from etl.load import connect_duckdb, create_weather_table, create_model_tables
 from etl.logger import get_logger
-from forecast.train import train_model
+from forecast.train import train_global_model, train_model
+from forecast.tune import DEFAULT_SPACE, search_hyperparameters
 from forecast.evaluate import evaluate_model
 
 logger = get_logger()
 
 
-def create_model_tables(conn):
+def record_metrics(conn, city: str, horizon: int, metrics: dict):
+    if not metrics:
+        return
     conn.execute(
         """
-        CREATE TABLE IF NOT EXISTS weather_forecasts (
-            city VARCHAR,
-            forecast_timestamp TIMESTAMP,
-            target_timestamp TIMESTAMP,
-            horizon_hours INTEGER,
-            temperature_2m DOUBLE,
-            relativehumidity_2m DOUBLE,
-            precipitation DOUBLE,
-            model_version VARCHAR
-        )
-        """
-    )
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS model_metrics (
-            city VARCHAR,
-            horizon INTEGER,
-            trained_at TIMESTAMP,
-            mae_temp DOUBLE,
-            rmse_temp DOUBLE,
-            mae_humidity DOUBLE,
-            rmse_humidity DOUBLE,
-            mae_precip DOUBLE,
-            rmse_precip DOUBLE
-        )
-        """
+        INSERT INTO model_metrics
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            city,
+            horizon,
+            datetime.now(timezone.utc),
+            metrics.get("mae_temperature_2m", 0),
+            metrics.get("rmse_temperature_2m", 0),
+            metrics.get("mae_relativehumidity_2m", 0),
+            metrics.get("rmse_relativehumidity_2m", 0),
+            metrics.get("mae_precipitation", 0),
+            metrics.get("rmse_precipitation", 0),
+        ],
     )
 
 
-def main():
+def train_global(conn, cities, horizons, model_cfg: dict, corpus_dir: str = None):
+    """Train one multi-city model per horizon and evaluate it for each city."""
+    for horizon, lookback in horizons:
+        label = "24h" if horizon <= 24 else "7d"
+        logger.info(f"=== Training global {label} model for {len(cities)} cities ===")
+        try:
+            train_global_model(
+                cities=cities,
+                conn=conn,
+                lookback=lookback,
+                horizon=horizon,
+                epochs=model_cfg.get("epochs", 50),
+                lr=model_cfg.get("learning_rate", 0.001),
+                batch_size=model_cfg.get("batch_size", 32),
+                hidden_size=model_cfg.get("hidden_size", 64),
+                num_layers=model_cfg.get("num_layers", 2),
+                dropout=model_cfg.get("dropout", 0.2),
+                embedding_dim=model_cfg.get("embedding_dim", 8),
+                corpus_dir=corpus_dir,
+                max_gap_hours=model_cfg.get("max_gap_hours", 0),
+            )
+        except Exception as e:
+            logger.error(f"Failed to train global {label} model: {e}")
+            continue
+
+        for city in cities:
+            try:
+                record_metrics(
+                    conn, city, horizon, evaluate_model(city, conn, lookback, horizon, corpus_dir)
+                )
+            except Exception as e:
+                logger.error(f"Failed to evaluate global {label} model for {city}: {e}")
+
+        logger.info(f"=== Global {label} model complete ===")
+
+
+def main(search: bool = False, global_model: bool = False):
     config = load_config()
     duckdb_path = config["paths"]["duckdb_path"]
     model_cfg = config.get("model", {})
+    search_cfg = model_cfg.get("search", {})
     locations = config.get("locations", [])
+    corpus_dir = config["paths"].get("corpus_path")
 
     conn = connect_duckdb(duckdb_path)
     create_weather_table(conn)
+    create_feature_store(conn)
+    create_feature_table(conn)
     create_model_tables(conn)
 
     horizons = [
@@ -62,44 +104,72 @@ def main():
         (168, model_cfg.get("lookback_7d", 720)),
     ]
 
+    if global_model or model_cfg.get("mode") == "global":
+        train_global(conn, [loc["name"] for loc in locations], horizons, model_cfg, corpus_dir)
+        logger.info("All model training complete.")
+        return
+
     for location in locations:
         city = location["name"]
         for horizon, lookback in horizons:
             label = "24h" if horizon <= 24 else "7d"
             logger.info(f"=== Training {label} model for {city} ===")
             try:
+                params = {
+                    "lookback": lookback,
+                    "lr": model_cfg.get("learning_rate", 0.001),
+                    "hidden_size": model_cfg.get("hidden_size", 64),
+                    "num_layers": model_cfg.get("num_layers", 2),
+                    "dropout": model_cfg.get("dropout", 0.2),
+                }
+                extra_meta = None
+                if search:
+                    result = search_hyperparameters(
+                        city=city,
+                        conn=conn,
+                        horizon=horizon,
+                        lookbacks=search_cfg.get(f"lookback_{label}", [lookback]),
+                        space={
+                            key: search_cfg.get(key, values)
+                            for key, values in DEFAULT_SPACE.items()
+                        },
+                        n_trials=search_cfg.get("n_trials", 12),
+                        max_workers=search_cfg.get("workers"),
+                        epochs=search_cfg.get("epochs", 20),
+                        batch_size=model_cfg.get("batch_size", 32),
+                        warmup_epochs=search_cfg.get("warmup_epochs", 3),
+                        corpus_dir=corpus_dir,
+                        max_gap_hours=model_cfg.get("max_gap_hours", 0),
+                        start_method=search_cfg.get("start_method", "spawn"),
+                    )
+                    params = {key: result[key] for key in params}
+                    extra_meta = {"search": result}
+                    logger.info(f"Best config for {city} ({label}): {result}")
+
+                lookback = params["lookback"]
                 train_model(
                     city=city,
                     conn=conn,
                     lookback=lookback,
                     horizon=horizon,
                     epochs=model_cfg.get("epochs", 50),
-                    lr=model_cfg.get("learning_rate", 0.001),
+                    lr=params["lr"],
                     batch_size=model_cfg.get("batch_size", 32),
-                    hidden_size=model_cfg.get("hidden_size", 64),
-                    num_layers=model_cfg.get("num_layers", 2),
-                    dropout=model_cfg.get("dropout", 0.2),
+                    hidden_size=params["hidden_size"],
+                    num_layers=params["num_layers"],
+                    dropout=params["dropout"],
+                    extra_meta=extra_meta,
+                    features=model_cfg.get("features"),
+                    corpus_dir=corpus_dir,
+                    streaming=model_cfg.get("streaming", False),
+                    chunk_rows=model_cfg.get("stream_chunk_rows", 50_000),
+                    shuffle_buffer=model_cfg.get("shuffle_buffer", 10_000),
+                    max_gap_hours=model_cfg.get("max_gap_hours", 0),
                 )
 
-                metrics = evaluate_model(city, conn, lookback, horizon)
-                if metrics:
-                    conn.execute(
-                        """
-                        INSERT INTO model_metrics
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """,
-                        [
-                            city,
-                            horizon,
-                            datetime.now(timezone.utc),
-                            metrics.get("mae_temperature_2m", 0),
-                            metrics.get("rmse_temperature_2m", 0),
-                            metrics.get("mae_relativehumidity_2m", 0),
-                            metrics.get("rmse_relativehumidity_2m", 0),
-                            metrics.get("mae_precipitation", 0),
-                            metrics.get("rmse_precipitation", 0),
-                        ],
-                    )
+                record_metrics(
+                    conn, city, horizon, evaluate_model(city, conn, lookback, horizon, corpus_dir)
+                )
 
                 logger.info(f"=== {label} model for {city} complete ===")
             except Exception as e:
@@ -109,4 +179,14 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Train LSTM forecasting models")
+    parser.add_argument(
+        "--search", action="store_true", help="Run a hyperparameter search first"
+    )
+    parser.add_argument(
+        "--global", dest="global_model", action="store_true",
+        help="Train one multi-city model per horizon instead of one per city",
+    )
+    args = parser.parse_args()
+
+    main(search=args.search, global_model=args.global_model)